@@ -1,29 +1,14 @@
-from fastapi import HTTPException, APIRouter
+from fastapi import HTTPException, APIRouter, Response
 from pydantic import BaseModel
 from typing import List, Optional
 from decimal import Decimal
-import psycopg2
-from config import DATABASE_URL
-
-def get_connection():
-    """Função para obter conexão com o banco de dados"""
-    try:
-        # Extrair parâmetros da URL de conexão
-        url_parts = DATABASE_URL.replace("postgresql://", "").split("@")
-        user_pass = url_parts[0].split(":")
-        host_db = url_parts[1].split("/")
-        host_port = host_db[0].split(":")
-        
-        conn = psycopg2.connect(
-            host=host_port[0],
-            port=int(host_port[1]) if len(host_port) > 1 else 5432,
-            database=host_db[1],
-            user=user_pass[0],
-            password=user_pass[1]
-        )
-        return conn
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Erro na conexão com o banco: {str(e)}")
+from database import get_connection, buscar
+from edicao import atualizar_parcial, deletar
+from config import RESPOSTAS_LISTA_RAPIDAS
+from serializacao import resposta_lista
+from cache_relatorios import invalidar_usuario
+from gravacao_agrupada import gravar
+from paginacao import decodificar_cursor, definir_proximo_cursor
 
 # Modelos Pydantic
 class ProdutoBase(BaseModel):
@@ -43,52 +28,59 @@ class ProdutoResponse(ProdutoBase):
     id_produto: int
     id_usuario: int
 
+# Colunas que o PATCH pode alterar (ver edicao.py)
+CAMPOS_EDITAVEIS = {"nome_produto", "preco_custo", "preco_venda"}
+
 # Router
 router = APIRouter(prefix="/produtos", tags=["Produtos"])
 
 # CRUD para Produtos
 @router.post("/", response_model=ProdutoResponse)
 async def criar_produto(produto: ProdutoCreate):
-    conn = get_connection()
-    cur = conn.cursor()
-    
-    try:
-        cur.execute(
+    async def inserir(cur):
+        await cur.execute(
             """INSERT INTO produto (nome_produto, preco_custo, preco_venda, id_usuario) 
                VALUES (%s, %s, %s, %s) RETURNING id_produto""",
             (produto.nome_produto, produto.preco_custo, produto.preco_venda, produto.id_usuario)
         )
-        result = cur.fetchone()
-        conn.commit()
-        cur.close()
-        conn.close()
-        
-        return ProdutoResponse(
-            id_produto=result[0],
-            nome_produto=produto.nome_produto,
-            preco_custo=produto.preco_custo,
-            preco_venda=produto.preco_venda,
-            id_usuario=produto.id_usuario
-        )
-    except Exception as e:
-        conn.rollback()
-        cur.close()
-        conn.close()
-        raise HTTPException(400, f"Erro ao criar produto: {e}")
+        return await cur.fetchone()
+    
+    # Commit próprio ou agrupado com outras gravações, conforme GRAVACAO_AGRUPADA
+    result = await gravar(inserir, "Erro ao criar produto")
+    
+    await invalidar_usuario(produto.id_usuario)
+    return ProdutoResponse(
+        id_produto=result[0],
+        nome_produto=produto.nome_produto,
+        preco_custo=produto.preco_custo,
+        preco_venda=produto.preco_venda,
+        id_usuario=produto.id_usuario
+    )
 
 @router.get("/usuario/{usuario_id}", response_model=List[ProdutoResponse])
-async def listar_produtos_usuario(usuario_id: int, skip: int = 0, limit: int = 100):
-    conn = get_connection()
-    cur = conn.cursor()
-    cur.execute(
-        """SELECT id_produto, nome_produto, preco_custo, preco_venda, id_usuario 
-           FROM produto WHERE id_usuario = %s OFFSET %s LIMIT %s""",
-        (usuario_id, skip, limit)
-    )
-    rows = cur.fetchall()
-    cur.close()
-    conn.close()
+async def listar_produtos_usuario(usuario_id: int, response: Response, skip: int = 0, limit: int = 100,
+                                  cursor: Optional[str] = None):
+    async with get_connection(somente_leitura=True, id_usuario=usuario_id) as conn, conn.cursor() as cur:
+        if cursor:
+            # Paginação por cursor: continua a partir do id_produto da página anterior
+            id_cursor, = decodificar_cursor(cursor, int)
+            await cur.execute(
+                """SELECT id_produto, nome_produto, preco_custo, preco_venda, id_usuario 
+                   FROM produto WHERE id_usuario = %s AND id_produto > %s ORDER BY id_produto LIMIT %s""",
+                (usuario_id, id_cursor, limit)
+            )
+        else:
+            await cur.execute(
+                """SELECT id_produto, nome_produto, preco_custo, preco_venda, id_usuario 
+                   FROM produto WHERE id_usuario = %s ORDER BY id_produto OFFSET %s LIMIT %s""",
+                (usuario_id, skip, limit)
+            )
+        rows = await cur.fetchall()
+        colunas = [c.name for c in cur.description]
     
+    definir_proximo_cursor(response, rows, limit, 0)
+    if RESPOSTAS_LISTA_RAPIDAS:
+        return resposta_lista(ProdutoResponse, colunas, rows, response)
     return [ProdutoResponse(
         id_produto=p[0], nome_produto=p[1], preco_custo=p[2], 
         preco_venda=p[3], id_usuario=p[4]
@@ -96,12 +88,8 @@ async def listar_produtos_usuario(usuario_id: int, skip: int = 0, limit: int = 1
 
 @router.get("/{produto_id}", response_model=ProdutoResponse)
 async def obter_produto(produto_id: int):
-    conn = get_connection()
-    cur = conn.cursor()
-    cur.execute("SELECT id_produto, nome_produto, preco_custo, preco_venda, id_usuario FROM produto WHERE id_produto = %s", (produto_id,))
-    row = cur.fetchone()
-    cur.close()
-    conn.close()
+    # Consulta quente: preparada no servidor já na primeira execução (ver database.py)
+    row = await buscar("SELECT id_produto, nome_produto, preco_custo, preco_venda, id_usuario FROM produto WHERE id_produto = %s", (produto_id,), prepare=True)
     
     if row:
         return ProdutoResponse(
@@ -110,46 +98,19 @@ async def obter_produto(produto_id: int):
         )
     raise HTTPException(404, "Produto não encontrado")
 
-@router.patch("/{produto_id}")
+@router.patch("/{produto_id}", response_model=ProdutoResponse)
 async def atualizar_produto_parcial(produto_id: int, produto: ProdutoUpdate):
-    conn = get_connection()
-    cur = conn.cursor()
-    cur.execute("SELECT id_produto FROM produto WHERE id_produto = %s", (produto_id,))
-    if not cur.fetchone():
-        cur.close()
-        conn.close()
-        raise HTTPException(404, "Produto não encontrado")
-    
-    fields = []
-    values = []
-    for campo, valor in produto.dict(exclude_unset=True).items():
-        fields.append(f"{campo}=%s")
-        values.append(valor)
-    
-    if not fields:
-        cur.close()
-        conn.close()
-        raise HTTPException(400, "Nenhum campo informado para atualização")
-    
-    values.append(produto_id)
-    try:
-        cur.execute(f"UPDATE produto SET {', '.join(fields)} WHERE id_produto=%s", values)
-        conn.commit()
-    except Exception as e:
-        conn.rollback()
-        raise HTTPException(400, f"Erro ao atualizar: {e}")
-    finally:
-        cur.close()
-        conn.close()
+    async with get_connection() as conn:
+        atualizado = await atualizar_parcial(conn, "produto", "id_produto", produto_id,
+                                             produto.dict(exclude_unset=True), CAMPOS_EDITAVEIS,
+                                             ProdutoResponse, "Produto não encontrado")
     
-    return {"msg": "Produto atualizado"}
+    await invalidar_usuario(atualizado["id_usuario"])
+    return ProdutoResponse(**atualizado)
 
 @router.delete("/{produto_id}")
 async def deletar_produto(produto_id: int):
-    conn = get_connection()
-    cur = conn.cursor()
-    cur.execute("DELETE FROM produto WHERE id_produto=%s", (produto_id,))
-    conn.commit()
-    cur.close()
-    conn.close()
+    async with get_connection() as conn:
+        id_usuario = await deletar(conn, "produto", "id_produto", produto_id, "Produto não encontrado")
+    await invalidar_usuario(id_usuario)
     return {"msg": "Produto removido"}
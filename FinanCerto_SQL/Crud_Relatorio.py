@@ -1,124 +1,287 @@
+import asyncio
+from datetime import date
+from typing import List, Literal, Optional
 from fastapi import HTTPException, APIRouter
-import psycopg2
-from config import DATABASE_URL
-
-def get_connection():
-    """Função para obter conexão com o banco de dados"""
-    try:
-        # Extrair parâmetros da URL de conexão
-        url_parts = DATABASE_URL.replace("postgresql://", "").split("@")
-        user_pass = url_parts[0].split(":")
-        host_db = url_parts[1].split("/")
-        host_port = host_db[0].split(":")
-        
-        conn = psycopg2.connect(
-            host=host_port[0],
-            port=int(host_port[1]) if len(host_port) > 1 else 5432,
-            database=host_db[1],
-            user=user_pass[0],
-            password=user_pass[1]
-        )
-        return conn
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Erro na conexão com o banco: {str(e)}")
+from pydantic import BaseModel
+from database import get_connection, escrita_recente
+from cache_relatorios import obter_ou_calcular, obter_ou_calcular_lote, resumo_estatisticas
 
 # Router
 router = APIRouter(prefix="/relatorios", tags=["Relatórios"])
 
+MAX_USUARIOS_LOTE = 1000
+
+# Modelos
+class RelatorioLote(BaseModel):
+    usuarios_ids: List[int]
+    metricas: List[Literal["saldo", "vendas", "lucro"]] = ["saldo", "vendas", "lucro"]
+
+# Formato de cada relatório, compartilhado pelos endpoints individuais e pelo lote
+# (os dois usam as mesmas chaves de cache)
+def _formatar_saldo(row):
+    return {
+        "usuario_id": row[0],
+        "nome_usuario": row[1],
+        "total_entradas": float(row[2]),
+        "total_saidas": float(row[3]),
+        "saldo_atual": float(row[4])
+    }
+
+def _formatar_vendas(usuario_id, total_vendas, valor_total):
+    return {
+        "usuario_id": usuario_id,
+        "total_vendas": total_vendas,
+        "valor_total_vendas": float(valor_total)
+    }
+
+def _formatar_lucro(usuario_id, lucro_total):
+    return {
+        "usuario_id": usuario_id,
+        "lucro_total_vendas": float(lucro_total if lucro_total is not None else 0)
+    }
+
 # Relatórios e estatísticas
+# Todos passam pelo cache (cache_relatorios.py), invalidado pelos CRUDs quando o usuário grava dados
 @router.get("/saldo/{usuario_id}")
 async def obter_saldo_usuario(usuario_id: int):
-    conn = get_connection()
-    cur = conn.cursor()
-    
-    # Usar a view Resumo_Financeiro
-    cur.execute(
-        """SELECT id_usuario, nome_usuario, total_entradas, total_saidas, saldo 
-           FROM resumo_financeiro 
-           WHERE id_usuario = %s""",
-        (usuario_id,)
-    )
-    result = cur.fetchone()
-    
-    cur.close()
-    conn.close()
-    
-    if not result:
-        raise HTTPException(status_code=404, detail="Usuário não encontrado")
+    async def calcular():
+        async with get_connection(somente_leitura=True, id_usuario=usuario_id) as conn, conn.cursor() as cur:
+            # Usar a tabela Saldo_Usuario, mantida por triggers (SaldoUsuario.sql): busca por chave primária
+            await cur.execute(
+                """SELECT u.id_usuario, u.nome_usuario,
+                          COALESCE(s.total_entradas, 0), COALESCE(s.total_saidas, 0),
+                          COALESCE(s.total_entradas, 0) - COALESCE(s.total_saidas, 0)
+                   FROM usuario u
+                   LEFT JOIN saldo_usuario s ON s.id_usuario = u.id_usuario
+                   WHERE u.id_usuario = %s""",
+                (usuario_id,)
+            )
+            result = await cur.fetchone()
+        
+        if not result:
+            raise HTTPException(status_code=404, detail="Usuário não encontrado")
+        
+        return _formatar_saldo(result)
     
-    return {
-        "usuario_id": result[0],
-        "nome_usuario": result[1],
-        "total_entradas": float(result[2]),
-        "total_saidas": float(result[3]),
-        "saldo_atual": float(result[4])
-    }
+    return await obter_ou_calcular(usuario_id, "saldo", calcular)
 
 @router.get("/vendas/{usuario_id}")
 async def relatorio_vendas_usuario(usuario_id: int):
-    conn = get_connection()
-    cur = conn.cursor()
-    cur.execute(
-        """SELECT COUNT(*) as total_vendas, COALESCE(SUM(valor_total_venda), 0) as valor_total 
-           FROM venda WHERE id_usuario = %s""",
-        (usuario_id,)
-    )
-    result = cur.fetchone()
-    cur.close()
-    conn.close()
+    async def calcular():
+        async with get_connection(somente_leitura=True, id_usuario=usuario_id) as conn, conn.cursor() as cur:
+            await cur.execute(
+                """SELECT COUNT(*) as total_vendas, COALESCE(SUM(valor_total_venda), 0) as valor_total 
+                   FROM venda WHERE id_usuario = %s""",
+                (usuario_id,)
+            )
+            result = await cur.fetchone()
+        
+        return _formatar_vendas(usuario_id, result[0], result[1])
     
-    return {
-        "usuario_id": usuario_id,
-        "total_vendas": result[0],
-        "valor_total_vendas": float(result[1])
-    }
+    return await obter_ou_calcular(usuario_id, "vendas", calcular)
 
 @router.get("/lucro/{usuario_id}")
 async def relatorio_lucro_usuario(usuario_id: int):
-    conn = get_connection()
-    cur = conn.cursor()
-    
-    # Usar a view Lucro_Produtos
-    cur.execute(
-        """SELECT SUM(lucro_total) as lucro_total_vendas
-           FROM lucro_produtos 
-           WHERE id_usuario = %s""",
-        (usuario_id,)
-    )
-    result = cur.fetchone()
-    lucro_vendas = result[0] if result[0] is not None else 0
+    async def calcular():
+        async with get_connection(somente_leitura=True, id_usuario=usuario_id) as conn, conn.cursor() as cur:
+            # Usar a view Lucro_Produtos
+            await cur.execute(
+                """SELECT SUM(lucro_total) as lucro_total_vendas
+                   FROM lucro_produtos 
+                   WHERE id_usuario = %s""",
+                (usuario_id,)
+            )
+            result = await cur.fetchone()
+        
+        return _formatar_lucro(usuario_id, result[0])
     
-    cur.close()
-    conn.close()
+    return await obter_ou_calcular(usuario_id, "lucro", calcular)
+
+@router.get("/produtos-mais-vendidos/{usuario_id}")
+async def produtos_mais_vendidos(usuario_id: int, limit: int = 10, dias: Optional[int] = None):
+    if dias is not None and dias < 1:
+        raise HTTPException(400, "Janela deve ter pelo menos 1 dia")
+
+    async def calcular():
+        async with get_connection(somente_leitura=True, id_usuario=usuario_id) as conn, conn.cursor() as cur:
+            # Contadores mantidos por triggers (migração 0005) em vez da view Produtos_Mais_Vendidos:
+            # sem janela, as primeiras linhas do índice (id_usuario, quantidade DESC); com janela,
+            # soma das contagens diárias dos últimos `dias` dias (hoje incluído)
+            if dias is None:
+                await cur.execute(
+                    """SELECT pv.id_produto, p.nome_produto, pv.quantidade
+                       FROM produto_vendas pv
+                       JOIN produto p ON p.id_produto = pv.id_produto
+                       WHERE pv.id_usuario = %s AND pv.quantidade > 0
+                       ORDER BY pv.quantidade DESC, pv.id_produto
+                       LIMIT %s""",
+                    (usuario_id, limit)
+                )
+            else:
+                await cur.execute(
+                    """SELECT d.id_produto, p.nome_produto, d.quantidade
+                       FROM (SELECT id_produto, SUM(quantidade) AS quantidade
+                             FROM produto_vendas_diario
+                             WHERE id_usuario = %s AND dia > current_date - %s AND dia <= current_date
+                             GROUP BY id_produto) d
+                       JOIN produto p ON p.id_produto = d.id_produto
+                       WHERE d.quantidade > 0
+                       ORDER BY d.quantidade DESC, d.id_produto
+                       LIMIT %s""",
+                    (usuario_id, dias, limit)
+                )
+            rows = await cur.fetchall()
+        
+        return [
+            {
+                "id_produto": row[0],
+                "nome_produto": row[1],
+                "total_vendido": row[2]
+            }
+            for row in rows
+        ]
     
+    return await obter_ou_calcular(usuario_id, f"produtos-mais-vendidos:{limit}:{dias}", calcular)
+
+# Tela inicial: os quatro relatórios em uma resposta. As consultas rodam em paralelo,
+# cada uma com sua conexão do pool (e seu cache), então a latência fica perto da mais lenta
+@router.get("/dashboard/{usuario_id}")
+async def dashboard_usuario(usuario_id: int, limit: int = 10, dias: Optional[int] = None):
+    saldo, vendas, lucro, produtos = await asyncio.gather(
+        obter_saldo_usuario(usuario_id),
+        relatorio_vendas_usuario(usuario_id),
+        relatorio_lucro_usuario(usuario_id),
+        produtos_mais_vendidos(usuario_id, limit, dias)
+    )
     return {
         "usuario_id": usuario_id,
-        "lucro_total_vendas": float(lucro_vendas)
+        "saldo": saldo,
+        "vendas": vendas,
+        "lucro": lucro,
+        "produtos_mais_vendidos": produtos
     }
 
-@router.get("/produtos-mais-vendidos/{usuario_id}")
-async def produtos_mais_vendidos(usuario_id: int, limit: int = 10):
-    conn = get_connection()
-    cur = conn.cursor()
-    
-    # Usar a view Produtos_Mais_Vendidos
-    cur.execute(
-        """SELECT id_produto, nome_produto, total_vendido
-           FROM produtos_mais_vendidos
-           WHERE id_usuario = %s
-           ORDER BY total_vendido DESC
-           LIMIT %s""",
-        (usuario_id, limit)
-    )
-    rows = cur.fetchall()
-    cur.close()
-    conn.close()
-    
-    return [
-        {
-            "id_produto": row[0],
-            "nome_produto": row[1],
-            "total_vendido": row[2]
+# Relatórios de vários usuários de uma vez (tela do contador): uma consulta agrupada
+# por métrica com id_usuario = ANY(...), em vez de uma requisição por usuário e métrica
+@router.post("/lote")
+async def relatorio_lote(lote: RelatorioLote):
+    usuarios_ids = list(dict.fromkeys(lote.usuarios_ids))
+    if not usuarios_ids:
+        raise HTTPException(400, "Nenhum usuário informado")
+    if len(usuarios_ids) > MAX_USUARIOS_LOTE:
+        raise HTTPException(400, f"Máximo de {MAX_USUARIOS_LOTE} usuários por lote")
+
+    # Lote inteiro no primário se algum dos usuários escreveu há pouco
+    em_replica = not escrita_recente(*usuarios_ids)
+    async with get_connection(somente_leitura=em_replica) as conn, conn.cursor() as cur:
+        await cur.execute("SELECT id_usuario FROM usuario WHERE id_usuario = ANY(%s)", (usuarios_ids,))
+        existentes = {row[0] for row in await cur.fetchall()}
+    encontrados = [u for u in usuarios_ids if u in existentes]
+
+    async def calcular_saldo(ids):
+        async with get_connection(somente_leitura=em_replica) as conn, conn.cursor() as cur:
+            await cur.execute(
+                """SELECT u.id_usuario, u.nome_usuario,
+                          COALESCE(s.total_entradas, 0), COALESCE(s.total_saidas, 0),
+                          COALESCE(s.total_entradas, 0) - COALESCE(s.total_saidas, 0)
+                   FROM usuario u
+                   LEFT JOIN saldo_usuario s ON s.id_usuario = u.id_usuario
+                   WHERE u.id_usuario = ANY(%s)""",
+                (ids,)
+            )
+            return {row[0]: _formatar_saldo(row) for row in await cur.fetchall()}
+
+    async def calcular_vendas(ids):
+        async with get_connection(somente_leitura=em_replica) as conn, conn.cursor() as cur:
+            await cur.execute(
+                """SELECT id_usuario, COUNT(*), COALESCE(SUM(valor_total_venda), 0)
+                   FROM venda WHERE id_usuario = ANY(%s)
+                   GROUP BY id_usuario""",
+                (ids,)
+            )
+            totais = {row[0]: row[1:] for row in await cur.fetchall()}
+        # Usuários sem vendas não aparecem no GROUP BY
+        return {u: _formatar_vendas(u, *totais.get(u, (0, 0))) for u in ids}
+
+    async def calcular_lucro(ids):
+        async with get_connection(somente_leitura=em_replica) as conn, conn.cursor() as cur:
+            await cur.execute(
+                """SELECT id_usuario, SUM(lucro_total)
+                   FROM lucro_produtos WHERE id_usuario = ANY(%s)
+                   GROUP BY id_usuario""",
+                (ids,)
+            )
+            totais = dict(await cur.fetchall())
+        return {u: _formatar_lucro(u, totais.get(u)) for u in ids}
+
+    calculos = {"saldo": calcular_saldo, "vendas": calcular_vendas, "lucro": calcular_lucro}
+    resultados = {}
+    if encontrados:
+        for metrica in dict.fromkeys(lote.metricas):
+            resultados[metrica] = await obter_ou_calcular_lote(encontrados, metrica, calculos[metrica])
+
+    return {
+        "usuarios": [
+            {"usuario_id": u, **{metrica: valores.get(u) for metrica, valores in resultados.items()}}
+            for u in encontrados
+        ],
+        "nao_encontrados": [u for u in usuarios_ids if u not in existentes]
+    }
+
+GRANULARIDADES = {"dia": "day", "semana": "week", "mes": "month", "ano": "year"}
+
+@router.get("/fluxo-caixa/{usuario_id}")
+async def fluxo_caixa(usuario_id: int, de: Optional[date] = None, ate: Optional[date] = None,
+                      granularidade: Literal["dia", "semana", "mes", "ano"] = "mes"):
+    if de and ate and de > ate:
+        raise HTTPException(400, "Data inicial maior que a final")
+
+    async def calcular():
+        async with get_connection(somente_leitura=True, id_usuario=usuario_id) as conn, conn.cursor() as cur:
+            # Lê a tabela Fluxo_Caixa_Diario (migração 0003), mantida por triggers:
+            # o custo depende do número de dias no período, não do número de transações.
+            # Sem de/ate, o período vai do primeiro ao último dia com movimento; períodos vazios saem zerados
+            await cur.execute(
+                """WITH limites AS (
+                       SELECT date_trunc(%(g)s, COALESCE(%(de)s::date, MIN(dia)))::date AS inicio,
+                              COALESCE(%(ate)s::date, MAX(dia)) AS fim
+                       FROM fluxo_caixa_diario
+                       WHERE id_usuario = %(u)s
+                   ),
+                   totais AS (
+                       SELECT date_trunc(%(g)s, f.dia)::date AS periodo,
+                              SUM(f.total) FILTER (WHERE f.tipo_categoria = 'Entrada') AS entradas,
+                              SUM(f.total) FILTER (WHERE f.tipo_categoria = 'Saida') AS saidas
+                       FROM fluxo_caixa_diario f, limites l
+                       WHERE f.id_usuario = %(u)s
+                         AND f.dia BETWEEN COALESCE(%(de)s::date, l.inicio) AND l.fim
+                       GROUP BY 1
+                   )
+                   SELECT p.periodo::date, COALESCE(t.entradas, 0), COALESCE(t.saidas, 0)
+                   FROM limites l
+                   CROSS JOIN generate_series(l.inicio, l.fim, ('1 ' || %(g)s)::interval) AS p(periodo)
+                   LEFT JOIN totais t ON t.periodo = p.periodo::date
+                   ORDER BY p.periodo""",
+                {"u": usuario_id, "de": de, "ate": ate, "g": GRANULARIDADES[granularidade]}
+            )
+            rows = await cur.fetchall()
+
+        return {
+            "usuario_id": usuario_id,
+            "granularidade": granularidade,
+            "periodos": [
+                {
+                    "periodo": row[0].isoformat(),
+                    "entradas": float(row[1]),
+                    "saidas": float(row[2]),
+                    "saldo": float(row[1] - row[2])
+                }
+                for row in rows
+            ]
         }
-        for row in rows
-    ]
+
+    return await obter_ou_calcular(usuario_id, f"fluxo-caixa:{de}:{ate}:{granularidade}", calcular)
+
+@router.get("/cache/estatisticas")
+async def estatisticas_cache():
+    return resumo_estatisticas()
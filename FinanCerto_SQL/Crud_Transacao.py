@@ -1,30 +1,17 @@
-from fastapi import HTTPException, APIRouter
+from fastapi import HTTPException, APIRouter, Response
 from pydantic import BaseModel
-from typing import List, Optional
+from typing import List, Literal, Optional
 from datetime import date
 from decimal import Decimal
-import psycopg2
-from config import DATABASE_URL
-
-def get_connection():
-    """Função para obter conexão com o banco de dados"""
-    try:
-        # Extrair parâmetros da URL de conexão
-        url_parts = DATABASE_URL.replace("postgresql://", "").split("@")
-        user_pass = url_parts[0].split(":")
-        host_db = url_parts[1].split("/")
-        host_port = host_db[0].split(":")
-        
-        conn = psycopg2.connect(
-            host=host_port[0],
-            port=int(host_port[1]) if len(host_port) > 1 else 5432,
-            database=host_db[1],
-            user=user_pass[0],
-            password=user_pass[1]
-        )
-        return conn
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Erro na conexão com o banco: {str(e)}")
+from database import get_connection, buscar
+from edicao import atualizar_parcial, deletar
+from config import RESPOSTAS_LISTA_RAPIDAS
+from serializacao import resposta_lista
+from cache_relatorios import invalidar_usuario
+from gravacao_agrupada import gravar
+from cache_categorias import obter_categorias, erro_categoria, validar_categoria
+from paginacao import decodificar_cursor, definir_proximo_cursor
+from exportacao import consultar_em_streaming, resposta_exportacao, filtro_periodo
 
 # Modelos Pydantic
 class TransacaoBase(BaseModel):
@@ -47,74 +34,164 @@ class TransacaoResponse(TransacaoBase):
     id_usuario: int
     id_categoria: int
 
+class TransacaoLote(BaseModel):
+    transacoes: List[TransacaoCreate]
+    # 'tudo_ou_nada': qualquer item inválido rejeita o lote inteiro e nada é gravado
+    # 'parcial': itens inválidos são reportados em `erros` e os válidos são gravados
+    modo: Literal["tudo_ou_nada", "parcial"] = "tudo_ou_nada"
+
+class ErroLote(BaseModel):
+    indice: int
+    erro: str
+
+class TransacaoLoteResponse(BaseModel):
+    # Mesma ordem/tamanho de `transacoes`; None nos itens não gravados
+    ids: List[Optional[int]]
+    total_inseridas: int
+    erros: List[ErroLote]
+
+# Colunas que o PATCH pode alterar (ver edicao.py)
+CAMPOS_EDITAVEIS = {"data_transacao", "descricao", "valor", "id_categoria"}
+
 # Router
 router = APIRouter(prefix="/transacoes", tags=["Transações"])
 
 # CRUD para Transações
 @router.post("/", response_model=TransacaoResponse)
 async def criar_transacao(transacao: TransacaoCreate):
-    conn = get_connection()
-    cur = conn.cursor()
-    
-    # Verificar se categoria existe
-    cur.execute("SELECT id_categoria FROM categoriatransacao WHERE id_categoria = %s", (transacao.id_categoria,))
-    if not cur.fetchone():
-        cur.close()
-        conn.close()
-        raise HTTPException(404, "Categoria não encontrada")
-    
-    try:
-        cur.execute(
+    async def inserir(cur):
+        # Existência, dono e tipo da categoria conferidos no índice em memória
+        await validar_categoria(cur, transacao.id_categoria, transacao.id_usuario)
+        await cur.execute(
             """INSERT INTO transacao (data_transacao, descricao, valor, id_usuario, id_categoria) 
                VALUES (%s, %s, %s, %s, %s) RETURNING id_transacao""",
             (transacao.data_transacao, transacao.descricao, transacao.valor, 
              transacao.id_usuario, transacao.id_categoria)
         )
-        result = cur.fetchone()
-        conn.commit()
-        cur.close()
-        conn.close()
+        return await cur.fetchone()
+    
+    # Commit próprio ou agrupado com outras gravações, conforme GRAVACAO_AGRUPADA
+    result = await gravar(inserir, "Erro ao criar transação")
+    
+    await invalidar_usuario(transacao.id_usuario)
+    return TransacaoResponse(
+        id_transacao=result[0],
+        data_transacao=transacao.data_transacao,
+        descricao=transacao.descricao,
+        valor=transacao.valor,
+        id_usuario=transacao.id_usuario,
+        id_categoria=transacao.id_categoria
+    )
+
+@router.post("/lote", response_model=TransacaoLoteResponse)
+async def criar_transacoes_lote(lote: TransacaoLote):
+    """Grava milhares de transações com uma validação e um INSERT set-based, em uma única transação"""
+    transacoes = lote.transacoes
+    async with get_connection() as conn, conn.cursor() as cur:
+        # Validar todos os usuários e categorias referenciados de uma vez
+        await cur.execute("SELECT id_usuario FROM usuario WHERE id_usuario = ANY(%s)",
+                          (list({t.id_usuario for t in transacoes}),))
+        usuarios = {row[0] for row in await cur.fetchall()}
+        categorias = await obter_categorias(cur, {t.id_categoria for t in transacoes})
         
-        return TransacaoResponse(
-            id_transacao=result[0],
-            data_transacao=transacao.data_transacao,
-            descricao=transacao.descricao,
-            valor=transacao.valor,
-            id_usuario=transacao.id_usuario,
-            id_categoria=transacao.id_categoria
-        )
-    except Exception as e:
-        conn.rollback()
-        cur.close()
-        conn.close()
-        raise HTTPException(400, f"Erro ao criar transação: {e}")
+        erros = []
+        validos = []
+        for indice, t in enumerate(transacoes):
+            erro_cat = erro_categoria(categorias, t.id_categoria, t.id_usuario)
+            if t.id_usuario not in usuarios:
+                erros.append(ErroLote(indice=indice, erro="Usuário não encontrado"))
+            elif erro_cat:
+                erros.append(ErroLote(indice=indice, erro=erro_cat[1]))
+            else:
+                validos.append(indice)
+        
+        if erros and lote.modo == "tudo_ou_nada":
+            raise HTTPException(400, {"msg": "Lote rejeitado, nenhuma transação gravada",
+                                      "erros": [e.dict() for e in erros]})
+        
+        ids = [None] * len(transacoes)
+        if validos:
+            try:
+                # INSERT multi-linha via unnest: um único comando para o lote inteiro, retornando os ids
+                await cur.execute(
+                    """INSERT INTO transacao (data_transacao, descricao, valor, id_usuario, id_categoria)
+                       SELECT data_transacao, descricao, valor, id_usuario, id_categoria
+                       FROM unnest(%s::date[], %s::varchar[], %s::numeric[], %s::int[], %s::int[])
+                            WITH ORDINALITY AS t(data_transacao, descricao, valor, id_usuario, id_categoria, ordem)
+                       ORDER BY ordem
+                       RETURNING id_transacao""",
+                    ([transacoes[i].data_transacao for i in validos],
+                     [transacoes[i].descricao for i in validos],
+                     [transacoes[i].valor for i in validos],
+                     [transacoes[i].id_usuario for i in validos],
+                     [transacoes[i].id_categoria for i in validos])
+                )
+                for indice, row in zip(validos, await cur.fetchall()):
+                    ids[indice] = row[0]
+                await conn.commit()
+            except Exception as e:
+                await conn.rollback()
+                raise HTTPException(400, f"Erro ao criar transações em lote: {e}")
+    
+    await invalidar_usuario(*(transacoes[i].id_usuario for i in validos))
+    return TransacaoLoteResponse(ids=ids, total_inseridas=len(validos), erros=erros)
 
 @router.get("/usuario/{usuario_id}", response_model=List[TransacaoResponse])
-async def listar_transacoes_usuario(usuario_id: int, skip: int = 0, limit: int = 100):
-    conn = get_connection()
-    cur = conn.cursor()
-    cur.execute(
-        """SELECT id_transacao, data_transacao, descricao, valor, id_usuario, id_categoria 
-           FROM transacao WHERE id_usuario = %s ORDER BY data_transacao DESC OFFSET %s LIMIT %s""",
-        (usuario_id, skip, limit)
-    )
-    rows = cur.fetchall()
-    cur.close()
-    conn.close()
+async def listar_transacoes_usuario(usuario_id: int, response: Response, skip: int = 0, limit: int = 100,
+                                    cursor: Optional[str] = None, de: Optional[date] = None, ate: Optional[date] = None):
+    # de/ate filtram direto na coluna da partição: só as partições dos anos do intervalo são lidas
+    periodo, params_periodo = filtro_periodo("data_transacao", de, ate)
+    async with get_connection(somente_leitura=True, id_usuario=usuario_id) as conn, conn.cursor() as cur:
+        if cursor:
+            # Paginação por cursor: continua a partir de (data_transacao, id_transacao) da página anterior
+            # (o data_transacao <= repetido permite descartar as partições de anos posteriores ao cursor)
+            data_cursor, id_cursor = decodificar_cursor(cursor, date.fromisoformat, int)
+            await cur.execute(
+                f"""SELECT id_transacao, data_transacao, descricao, valor, id_usuario, id_categoria 
+                   FROM transacao WHERE id_usuario = %s{periodo} AND data_transacao <= %s AND (data_transacao, id_transacao) < (%s, %s)
+                   ORDER BY data_transacao DESC, id_transacao DESC LIMIT %s""",
+                (usuario_id, *params_periodo, data_cursor, data_cursor, id_cursor, limit)
+            )
+        else:
+            await cur.execute(
+                f"""SELECT id_transacao, data_transacao, descricao, valor, id_usuario, id_categoria 
+                   FROM transacao WHERE id_usuario = %s{periodo} ORDER BY data_transacao DESC, id_transacao DESC OFFSET %s LIMIT %s""",
+                (usuario_id, *params_periodo, skip, limit)
+            )
+        rows = await cur.fetchall()
+        colunas = [c.name for c in cur.description]
     
+    definir_proximo_cursor(response, rows, limit, 1, 0)
+    if RESPOSTAS_LISTA_RAPIDAS:
+        return resposta_lista(TransacaoResponse, colunas, rows, response)
     return [TransacaoResponse(
         id_transacao=t[0], data_transacao=t[1], descricao=t[2], 
         valor=t[3], id_usuario=t[4], id_categoria=t[5]
     ) for t in rows]
 
+@router.get("/usuario/{usuario_id}/exportar")
+async def exportar_transacoes_usuario(usuario_id: int, formato: str = "csv",
+                                      de: Optional[date] = None, ate: Optional[date] = None):
+    """Exporta o extrato completo do usuário em streaming (CSV ou NDJSON), em ordem cronológica"""
+    colunas = ["id_transacao", "data_transacao", "descricao", "valor", "id_usuario", "id_categoria"]
+    periodo, params_periodo = filtro_periodo("data_transacao", de, ate)
+    
+    async def registros():
+        async for row in consultar_em_streaming(
+            f"""SELECT id_transacao, data_transacao, descricao, valor, id_usuario, id_categoria
+                FROM transacao WHERE id_usuario = %s{periodo}
+                ORDER BY data_transacao, id_transacao""",
+            [usuario_id, *params_periodo],
+            id_usuario=usuario_id
+        ):
+            yield dict(zip(colunas, row))
+    
+    return resposta_exportacao(formato, f"transacoes_usuario_{usuario_id}", colunas, registros())
+
 @router.get("/{transacao_id}", response_model=TransacaoResponse)
 async def obter_transacao(transacao_id: int):
-    conn = get_connection()
-    cur = conn.cursor()
-    cur.execute("SELECT id_transacao, data_transacao, descricao, valor, id_usuario, id_categoria FROM transacao WHERE id_transacao = %s", (transacao_id,))
-    row = cur.fetchone()
-    cur.close()
-    conn.close()
+    # Consulta quente: preparada no servidor já na primeira execução (ver database.py)
+    row = await buscar("SELECT id_transacao, data_transacao, descricao, valor, id_usuario, id_categoria FROM transacao WHERE id_transacao = %s", (transacao_id,), prepare=True)
     
     if row:
         return TransacaoResponse(
@@ -123,53 +200,35 @@ async def obter_transacao(transacao_id: int):
         )
     raise HTTPException(404, "Transação não encontrada")
 
-@router.patch("/{transacao_id}")
+@router.patch("/{transacao_id}", response_model=TransacaoResponse)
 async def atualizar_transacao_parcial(transacao_id: int, transacao: TransacaoUpdate):
-    conn = get_connection()
-    cur = conn.cursor()
-    cur.execute("SELECT id_transacao FROM transacao WHERE id_transacao = %s", (transacao_id,))
-    if not cur.fetchone():
-        cur.close()
-        conn.close()
-        raise HTTPException(404, "Transação não encontrada")
-    
-    fields = []
-    values = []
-    for campo, valor in transacao.dict(exclude_unset=True).items():
-        # Verificar se categoria existe quando atualizar categoria
-        if campo == "id_categoria":
-            cur.execute("SELECT id_categoria FROM categoriatransacao WHERE id_categoria = %s", (valor,))
-            if not cur.fetchone():
-                cur.close()
-                conn.close()
+    valores = transacao.dict(exclude_unset=True)
+    async with get_connection() as conn:
+        restricoes = None
+        if valores.get("id_categoria") is not None:
+            # Categoria vem do índice; o dono dela tem que ser o da transação, conferido no próprio UPDATE
+            async with conn.cursor() as cur:
+                categorias = await obter_categorias(cur, [valores["id_categoria"]])
+            if valores["id_categoria"] not in categorias:
                 raise HTTPException(404, "Categoria não encontrada")
-        fields.append(f"{campo}=%s")
-        values.append(valor)
-    
-    if not fields:
-        cur.close()
-        conn.close()
-        raise HTTPException(400, "Nenhum campo informado para atualização")
-    
-    values.append(transacao_id)
-    try:
-        cur.execute(f"UPDATE transacao SET {', '.join(fields)} WHERE id_transacao=%s", values)
-        conn.commit()
-    except Exception as e:
-        conn.rollback()
-        raise HTTPException(400, f"Erro ao atualizar: {e}")
-    finally:
-        cur.close()
-        conn.close()
+            dono, _ = categorias[valores["id_categoria"]]
+            erro = erro_categoria(categorias, valores["id_categoria"], dono)
+            if erro:
+                raise HTTPException(*erro)
+            restricoes = {"id_usuario": (dono, "Categoria não pertence ao usuário da transação")}
+        atualizada = await atualizar_parcial(
+            conn, "transacao", "id_transacao", transacao_id,
+            valores, CAMPOS_EDITAVEIS,
+            TransacaoResponse, "Transação não encontrada",
+            restricoes=restricoes
+        )
     
-    return {"msg": "Transação atualizada"}
+    await invalidar_usuario(atualizada["id_usuario"])
+    return TransacaoResponse(**atualizada)
 
 @router.delete("/{transacao_id}")
 async def deletar_transacao(transacao_id: int):
-    conn = get_connection()
-    cur = conn.cursor()
-    cur.execute("DELETE FROM transacao WHERE id_transacao=%s", (transacao_id,))
-    conn.commit()
-    cur.close()
-    conn.close()
+    async with get_connection() as conn:
+        id_usuario = await deletar(conn, "transacao", "id_transacao", transacao_id, "Transação não encontrada")
+    await invalidar_usuario(id_usuario)
     return {"msg": "Transação removida"}
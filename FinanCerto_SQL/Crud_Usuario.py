@@ -1,28 +1,12 @@
-from fastapi import HTTPException, APIRouter
+from fastapi import HTTPException, APIRouter, Response
 from pydantic import BaseModel
 from typing import List, Optional
-import psycopg2
-from config import DATABASE_URL
-
-def get_connection():
-    """Função para obter conexão com o banco de dados"""
-    try:
-        # Extrair parâmetros da URL de conexão
-        url_parts = DATABASE_URL.replace("postgresql://", "").split("@")
-        user_pass = url_parts[0].split(":")
-        host_db = url_parts[1].split("/")
-        host_port = host_db[0].split(":")
-        
-        conn = psycopg2.connect(
-            host=host_port[0],
-            port=int(host_port[1]) if len(host_port) > 1 else 5432,
-            database=host_db[1],
-            user=user_pass[0],
-            password=user_pass[1]
-        )
-        return conn
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Erro na conexão com o banco: {str(e)}")
+from database import get_connection, registrar_escrita, buscar
+from cache_relatorios import invalidar_usuario
+from edicao import atualizar_parcial, deletar
+from config import RESPOSTAS_LISTA_RAPIDAS
+from serializacao import resposta_lista
+from paginacao import decodificar_cursor, definir_proximo_cursor
 
 # Modelos Pydantic
 class UsuarioBase(BaseModel):
@@ -40,101 +24,71 @@ class UsuarioUpdate(BaseModel):
 class UsuarioResponse(UsuarioBase):
     id_usuario: int
 
+# Colunas que o PATCH pode alterar (ver edicao.py)
+CAMPOS_EDITAVEIS = {"nome_usuario", "email", "senha"}
+
 # Router
 router = APIRouter(prefix="/usuarios", tags=["Usuários"])
 
 # CRUD para Usuários
 @router.post("/", response_model=UsuarioResponse)
 async def criar_usuario(usuario: UsuarioCreate):
-    conn = get_connection()
-    cur = conn.cursor()
-    
-    # Verificar se email já existe
-    cur.execute("SELECT id_usuario FROM usuario WHERE email = %s", (usuario.email,))
-    if cur.fetchone():
-        cur.close()
-        conn.close()
-        raise HTTPException(400, "Email já cadastrado")
-    
-    try:
-        cur.execute("INSERT INTO usuario (nome_usuario, email, senha) VALUES (%s, %s, %s) RETURNING id_usuario",
-                   (usuario.nome_usuario, usuario.email, usuario.senha))
-        result = cur.fetchone()
-        conn.commit()
-        cur.close()
-        conn.close()
+    async with get_connection() as conn, conn.cursor() as cur:
+        # Verificar se email já existe
+        await cur.execute("SELECT id_usuario FROM usuario WHERE email = %s", (usuario.email,))
+        if await cur.fetchone():
+            raise HTTPException(400, "Email já cadastrado")
         
-        return UsuarioResponse(id_usuario=result[0], nome_usuario=usuario.nome_usuario, email=usuario.email)
-    except Exception as e:
-        conn.rollback()
-        cur.close()
-        conn.close()
-        raise HTTPException(400, f"Erro ao criar usuário: {e}")
+        try:
+            await cur.execute("INSERT INTO usuario (nome_usuario, email, senha) VALUES (%s, %s, %s) RETURNING id_usuario",
+                       (usuario.nome_usuario, usuario.email, usuario.senha))
+            result = await cur.fetchone()
+            await conn.commit()
+        except Exception as e:
+            await conn.rollback()
+            raise HTTPException(400, f"Erro ao criar usuário: {e}")
+    
+    registrar_escrita(result[0])
+    return UsuarioResponse(id_usuario=result[0], nome_usuario=usuario.nome_usuario, email=usuario.email)
 
 @router.get("/", response_model=List[UsuarioResponse])
-async def listar_usuarios(skip: int = 0, limit: int = 100):
-    conn = get_connection()
-    cur = conn.cursor()
-    cur.execute("SELECT id_usuario, nome_usuario, email FROM usuario ORDER BY id_usuario OFFSET %s LIMIT %s", (skip, limit))
-    rows = cur.fetchall()
-    cur.close()
-    conn.close()
+async def listar_usuarios(response: Response, skip: int = 0, limit: int = 100, cursor: Optional[str] = None):
+    async with get_connection(somente_leitura=True) as conn, conn.cursor() as cur:
+        if cursor:
+            # Paginação por cursor: continua a partir do id_usuario da página anterior
+            id_cursor, = decodificar_cursor(cursor, int)
+            await cur.execute("SELECT id_usuario, nome_usuario, email FROM usuario WHERE id_usuario > %s ORDER BY id_usuario LIMIT %s", (id_cursor, limit))
+        else:
+            await cur.execute("SELECT id_usuario, nome_usuario, email FROM usuario ORDER BY id_usuario OFFSET %s LIMIT %s", (skip, limit))
+        rows = await cur.fetchall()
+        colunas = [c.name for c in cur.description]
     
+    definir_proximo_cursor(response, rows, limit, 0)
+    if RESPOSTAS_LISTA_RAPIDAS:
+        return resposta_lista(UsuarioResponse, colunas, rows, response)
     return [UsuarioResponse(id_usuario=u[0], nome_usuario=u[1], email=u[2]) for u in rows]
 
 @router.get("/{usuario_id}", response_model=UsuarioResponse)
 async def obter_usuario(usuario_id: int):
-    conn = get_connection()
-    cur = conn.cursor()
-    cur.execute("SELECT id_usuario, nome_usuario, email FROM usuario WHERE id_usuario = %s", (usuario_id,))
-    row = cur.fetchone()
-    cur.close()
-    conn.close()
-    
+    # Consulta quente: preparada no servidor já na primeira execução (ver database.py)
+    row = await buscar("SELECT id_usuario, nome_usuario, email FROM usuario WHERE id_usuario = %s", (usuario_id,), prepare=True)
     if row:
         return UsuarioResponse(id_usuario=row[0], nome_usuario=row[1], email=row[2])
     raise HTTPException(404, "Usuário não encontrado")
 
-@router.patch("/{usuario_id}")
+@router.patch("/{usuario_id}", response_model=UsuarioResponse)
 async def atualizar_usuario_parcial(usuario_id: int, usuario: UsuarioUpdate):
-    conn = get_connection()
-    cur = conn.cursor()
-    cur.execute("SELECT id_usuario FROM usuario WHERE id_usuario = %s", (usuario_id,))
-    if not cur.fetchone():
-        cur.close()
-        conn.close()
-        raise HTTPException(404, "Usuário não encontrado")
-    
-    fields = []
-    values = []
-    for campo, valor in usuario.dict(exclude_unset=True).items():
-        fields.append(f"{campo}=%s")
-        values.append(valor)
-    
-    if not fields:
-        cur.close()
-        conn.close()
-        raise HTTPException(400, "Nenhum campo informado para atualização")
-    
-    values.append(usuario_id)
-    try:
-        cur.execute(f"UPDATE usuario SET {', '.join(fields)} WHERE id_usuario=%s", values)
-        conn.commit()
-    except Exception as e:
-        conn.rollback()
-        raise HTTPException(400, f"Erro ao atualizar: {e}")
-    finally:
-        cur.close()
-        conn.close()
-    
-    return {"msg": "Usuário atualizado"}
+    async with get_connection() as conn:
+        atualizado = await atualizar_parcial(conn, "usuario", "id_usuario", usuario_id,
+                                             usuario.dict(exclude_unset=True), CAMPOS_EDITAVEIS,
+                                             UsuarioResponse, "Usuário não encontrado")
+    # nome_usuario aparece nos relatórios de saldo (e no lote) guardados em cache
+    await invalidar_usuario(usuario_id)
+    return UsuarioResponse(**atualizado)
 
 @router.delete("/{usuario_id}")
 async def deletar_usuario(usuario_id: int):
-    conn = get_connection()
-    cur = conn.cursor()
-    cur.execute("DELETE FROM usuario WHERE id_usuario=%s", (usuario_id,))
-    conn.commit()
-    cur.close()
-    conn.close()
+    async with get_connection() as conn:
+        await deletar(conn, "usuario", "id_usuario", usuario_id, "Usuário não encontrado")
+    await invalidar_usuario(usuario_id)
     return {"msg": "Usuário removido"}
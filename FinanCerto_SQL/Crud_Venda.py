@@ -1,30 +1,16 @@
-from fastapi import HTTPException, APIRouter
+from fastapi import HTTPException, APIRouter, Response
 from pydantic import BaseModel
-from typing import List, Optional
+from typing import List, Literal, Optional
 from datetime import date
-from decimal import Decimal
-import psycopg2
-from config import DATABASE_URL
-
-def get_connection():
-    """Função para obter conexão com o banco de dados"""
-    try:
-        # Extrair parâmetros da URL de conexão
-        url_parts = DATABASE_URL.replace("postgresql://", "").split("@")
-        user_pass = url_parts[0].split(":")
-        host_db = url_parts[1].split("/")
-        host_port = host_db[0].split(":")
-        
-        conn = psycopg2.connect(
-            host=host_port[0],
-            port=int(host_port[1]) if len(host_port) > 1 else 5432,
-            database=host_db[1],
-            user=user_pass[0],
-            password=user_pass[1]
-        )
-        return conn
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Erro na conexão com o banco: {str(e)}")
+from decimal import Decimal, ROUND_HALF_UP
+from database import get_connection, buscar
+from edicao import atualizar_parcial, deletar
+from config import RESPOSTAS_LISTA_RAPIDAS
+from serializacao import resposta_lista
+from cache_relatorios import invalidar_usuario
+from gravacao_agrupada import gravar
+from paginacao import decodificar_cursor, definir_proximo_cursor
+from exportacao import consultar_em_streaming, resposta_exportacao, filtro_periodo
 
 # Modelos Pydantic
 class VendaProdutoBase(BaseModel):
@@ -53,79 +39,223 @@ class VendaResponse(VendaBase):
 class VendaProdutoResponse(VendaProdutoBase):
     id_venda: int
 
+class VendaLoteItem(BaseModel):
+    data_venda: date
+    # Opcional no lote: se omitido é calculado a partir dos itens, se informado é conferido
+    valor_total_venda: Optional[Decimal] = None
+    metodo_pagamento: Optional[str] = None
+    id_usuario: int
+    produtos: List[VendaProdutoBase]
+
+class VendaLote(BaseModel):
+    vendas: List[VendaLoteItem]
+    # 'tudo_ou_nada': qualquer venda inválida rejeita o lote inteiro e nada é gravado
+    # 'parcial': vendas inválidas são reportadas em `erros` e as válidas são gravadas
+    modo: Literal["tudo_ou_nada", "parcial"] = "tudo_ou_nada"
+
+class ErroLote(BaseModel):
+    indice: int
+    erro: str
+
+class VendaLoteResponse(BaseModel):
+    # Mesma ordem/tamanho de `vendas`; None nas vendas não gravadas
+    ids: List[Optional[int]]
+    total_inseridas: int
+    erros: List[ErroLote]
+
+# Colunas que o PATCH pode alterar (ver edicao.py)
+CAMPOS_EDITAVEIS = {"data_venda", "valor_total_venda", "metodo_pagamento"}
+
 # Router
 router = APIRouter(prefix="/vendas", tags=["Vendas"])
 
+async def _inserir_itens_venda(cur, ids_venda, listas_produtos):
+    """Grava os itens de várias vendas com um único INSERT, independente do número de itens"""
+    id_venda, id_produto, quantidade, preco = [], [], [], []
+    for venda_id, produtos in zip(ids_venda, listas_produtos):
+        for produto_venda in produtos:
+            id_venda.append(venda_id)
+            id_produto.append(produto_venda.id_produto)
+            quantidade.append(produto_venda.quantidade)
+            preco.append(produto_venda.preco_unitario_venda)
+    if id_venda:
+        await cur.execute(
+            """INSERT INTO venda_produto (id_venda, id_produto, quantidade, preco_unitario_venda)
+               SELECT * FROM unnest(%s::int[], %s::int[], %s::int[], %s::numeric[])""",
+            (id_venda, id_produto, quantidade, preco)
+        )
+
 # CRUD para Vendas
 @router.post("/", response_model=VendaResponse)
 async def criar_venda(venda: VendaCreate):
-    conn = get_connection()
-    cur = conn.cursor()
-    
-    try:
-        # Iniciar transação
-        cur.execute("BEGIN")
-        
+    async def inserir(cur):
         # Criar a venda
-        cur.execute(
+        await cur.execute(
             """INSERT INTO venda (data_venda, valor_total_venda, metodo_pagamento, id_usuario) 
                VALUES (%s, %s, %s, %s) RETURNING id_venda""",
             (venda.data_venda, venda.valor_total_venda, venda.metodo_pagamento, venda.id_usuario)
         )
-        venda_result = cur.fetchone()
-        id_venda = venda_result[0]
+        id_venda = (await cur.fetchone())[0]
         
         # Adicionar produtos à venda
-        for produto_venda in venda.produtos:
-            cur.execute(
-                """INSERT INTO venda_produto (id_venda, id_produto, quantidade, preco_unitario_venda) 
-                   VALUES (%s, %s, %s, %s)""",
-                (id_venda, produto_venda.id_produto, produto_venda.quantidade, produto_venda.preco_unitario_venda)
-            )
+        await _inserir_itens_venda(cur, [id_venda], [venda.produtos])
+        return id_venda
+    
+    # Commit próprio ou agrupado com outras gravações, conforme GRAVACAO_AGRUPADA
+    id_venda = await gravar(inserir, "Erro ao criar venda")
+    
+    await invalidar_usuario(venda.id_usuario)
+    return VendaResponse(
+        id_venda=id_venda,
+        data_venda=venda.data_venda,
+        valor_total_venda=venda.valor_total_venda,
+        metodo_pagamento=venda.metodo_pagamento,
+        id_usuario=venda.id_usuario
+    )
+
+@router.post("/lote", response_model=VendaLoteResponse)
+async def criar_vendas_lote(lote: VendaLote):
+    """Grava muitas vendas e todos os seus itens com poucos comandos set-based, em uma única transação"""
+    vendas = lote.vendas
+    async with get_connection() as conn, conn.cursor() as cur:
+        # Validar todos os usuários e produtos referenciados de uma vez
+        await cur.execute("SELECT id_usuario FROM usuario WHERE id_usuario = ANY(%s)",
+                          (list({v.id_usuario for v in vendas}),))
+        usuarios = {row[0] for row in await cur.fetchall()}
+        await cur.execute("SELECT id_produto FROM produto WHERE id_produto = ANY(%s)",
+                          (list({p.id_produto for v in vendas for p in v.produtos}),))
+        produtos = {row[0] for row in await cur.fetchall()}
         
-        conn.commit()
-        cur.close()
-        conn.close()
+        erros = []
+        validos = []
+        totais = []
+        for indice, v in enumerate(vendas):
+            ids_produto = [p.id_produto for p in v.produtos]
+            # Arredondado para centavos como o Postgres arredonda valor_total_venda (NUMERIC(10,2))
+            total = sum((p.quantidade * p.preco_unitario_venda for p in v.produtos), Decimal("0")).quantize(Decimal("0.01"), ROUND_HALF_UP)
+            if v.id_usuario not in usuarios:
+                erros.append(ErroLote(indice=indice, erro="Usuário não encontrado"))
+            elif not v.produtos:
+                erros.append(ErroLote(indice=indice, erro="Venda sem produtos"))
+            elif any(p not in produtos for p in ids_produto):
+                erros.append(ErroLote(indice=indice, erro="Produto não encontrado"))
+            elif len(set(ids_produto)) != len(ids_produto):
+                erros.append(ErroLote(indice=indice, erro="Produto repetido na mesma venda"))
+            elif any(p.quantidade <= 0 for p in v.produtos):
+                erros.append(ErroLote(indice=indice, erro="Quantidade deve ser positiva"))
+            elif v.valor_total_venda is not None and v.valor_total_venda != total:
+                erros.append(ErroLote(indice=indice, erro=f"valor_total_venda difere da soma dos itens ({total})"))
+            else:
+                validos.append(indice)
+                totais.append(total)
         
-        return VendaResponse(
-            id_venda=id_venda,
-            data_venda=venda.data_venda,
-            valor_total_venda=venda.valor_total_venda,
-            metodo_pagamento=venda.metodo_pagamento,
-            id_usuario=venda.id_usuario
-        )
-    except Exception as e:
-        conn.rollback()
-        cur.close()
-        conn.close()
-        raise HTTPException(400, f"Erro ao criar venda: {e}")
+        if erros and lote.modo == "tudo_ou_nada":
+            raise HTTPException(400, {"msg": "Lote rejeitado, nenhuma venda gravada",
+                                      "erros": [e.dict() for e in erros]})
+        
+        ids = [None] * len(vendas)
+        if validos:
+            try:
+                await cur.execute(
+                    """INSERT INTO venda (data_venda, valor_total_venda, metodo_pagamento, id_usuario)
+                       SELECT data_venda, valor_total_venda, metodo_pagamento, id_usuario
+                       FROM unnest(%s::date[], %s::numeric[], %s::varchar[], %s::int[])
+                            WITH ORDINALITY AS v(data_venda, valor_total_venda, metodo_pagamento, id_usuario, ordem)
+                       ORDER BY ordem
+                       RETURNING id_venda""",
+                    ([vendas[i].data_venda for i in validos],
+                     totais,
+                     [vendas[i].metodo_pagamento for i in validos],
+                     [vendas[i].id_usuario for i in validos])
+                )
+                ids_venda = [row[0] for row in await cur.fetchall()]
+                await _inserir_itens_venda(cur, ids_venda, [vendas[i].produtos for i in validos])
+                await conn.commit()
+            except Exception as e:
+                await conn.rollback()
+                raise HTTPException(400, f"Erro ao criar vendas em lote: {e}")
+            for indice, id_venda in zip(validos, ids_venda):
+                ids[indice] = id_venda
+    
+    await invalidar_usuario(*(vendas[i].id_usuario for i in validos))
+    return VendaLoteResponse(ids=ids, total_inseridas=len(validos), erros=erros)
 
 @router.get("/usuario/{usuario_id}", response_model=List[VendaResponse])
-async def listar_vendas_usuario(usuario_id: int, skip: int = 0, limit: int = 100):
-    conn = get_connection()
-    cur = conn.cursor()
-    cur.execute(
-        """SELECT id_venda, data_venda, valor_total_venda, metodo_pagamento, id_usuario 
-           FROM venda WHERE id_usuario = %s ORDER BY data_venda DESC OFFSET %s LIMIT %s""",
-        (usuario_id, skip, limit)
-    )
-    rows = cur.fetchall()
-    cur.close()
-    conn.close()
+async def listar_vendas_usuario(usuario_id: int, response: Response, skip: int = 0, limit: int = 100,
+                                cursor: Optional[str] = None, de: Optional[date] = None, ate: Optional[date] = None):
+    # de/ate filtram direto na coluna da partição: só as partições dos anos do intervalo são lidas
+    periodo, params_periodo = filtro_periodo("data_venda", de, ate)
+    async with get_connection(somente_leitura=True, id_usuario=usuario_id) as conn, conn.cursor() as cur:
+        if cursor:
+            # Paginação por cursor: continua a partir de (data_venda, id_venda) da página anterior
+            # (o data_venda <= repetido permite descartar as partições de anos posteriores ao cursor)
+            data_cursor, id_cursor = decodificar_cursor(cursor, date.fromisoformat, int)
+            await cur.execute(
+                f"""SELECT id_venda, data_venda, valor_total_venda, metodo_pagamento, id_usuario 
+                   FROM venda WHERE id_usuario = %s{periodo} AND data_venda <= %s AND (data_venda, id_venda) < (%s, %s)
+                   ORDER BY data_venda DESC, id_venda DESC LIMIT %s""",
+                (usuario_id, *params_periodo, data_cursor, data_cursor, id_cursor, limit)
+            )
+        else:
+            await cur.execute(
+                f"""SELECT id_venda, data_venda, valor_total_venda, metodo_pagamento, id_usuario 
+                   FROM venda WHERE id_usuario = %s{periodo} ORDER BY data_venda DESC, id_venda DESC OFFSET %s LIMIT %s""",
+                (usuario_id, *params_periodo, skip, limit)
+            )
+        rows = await cur.fetchall()
+        colunas = [c.name for c in cur.description]
     
+    definir_proximo_cursor(response, rows, limit, 1, 0)
+    if RESPOSTAS_LISTA_RAPIDAS:
+        return resposta_lista(VendaResponse, colunas, rows, response)
     return [VendaResponse(
         id_venda=v[0], data_venda=v[1], valor_total_venda=v[2],
         metodo_pagamento=v[3], id_usuario=v[4]
     ) for v in rows]
 
+@router.get("/usuario/{usuario_id}/exportar")
+async def exportar_vendas_usuario(usuario_id: int, formato: str = "csv",
+                                  de: Optional[date] = None, ate: Optional[date] = None):
+    """Exporta as vendas do usuário com seus itens em streaming.
+    CSV: uma linha por item (dados da venda repetidos). NDJSON: uma linha por venda com a lista de produtos."""
+    colunas_venda = ["id_venda", "data_venda", "valor_total_venda", "metodo_pagamento", "id_usuario"]
+    colunas_item = ["id_produto", "quantidade", "preco_unitario_venda"]
+    periodo, params_periodo = filtro_periodo("v.data_venda", de, ate)
+    
+    async def linhas():
+        async for row in consultar_em_streaming(
+            f"""SELECT v.id_venda, v.data_venda, v.valor_total_venda, v.metodo_pagamento, v.id_usuario,
+                       vp.id_produto, vp.quantidade, vp.preco_unitario_venda
+                FROM venda v
+                LEFT JOIN venda_produto vp ON vp.id_venda = v.id_venda
+                WHERE v.id_usuario = %s{periodo}
+                ORDER BY v.data_venda, v.id_venda, vp.id_produto""",
+            [usuario_id, *params_periodo],
+            id_usuario=usuario_id
+        ):
+            yield dict(zip(colunas_venda + colunas_item, row))
+    
+    async def vendas_agrupadas():
+        # As linhas chegam ordenadas por venda: agrupa os itens consecutivos da mesma venda
+        atual = None
+        async for linha in linhas():
+            if atual is None or atual["id_venda"] != linha["id_venda"]:
+                if atual is not None:
+                    yield atual
+                atual = {c: linha[c] for c in colunas_venda}
+                atual["produtos"] = []
+            if linha["id_produto"] is not None:
+                atual["produtos"].append({c: linha[c] for c in colunas_item})
+        if atual is not None:
+            yield atual
+    
+    registros = linhas() if formato == "csv" else vendas_agrupadas()
+    return resposta_exportacao(formato, f"vendas_usuario_{usuario_id}", colunas_venda + colunas_item, registros)
+
 @router.get("/{venda_id}", response_model=VendaResponse)
 async def obter_venda(venda_id: int):
-    conn = get_connection()
-    cur = conn.cursor()
-    cur.execute("SELECT id_venda, data_venda, valor_total_venda, metodo_pagamento, id_usuario FROM venda WHERE id_venda = %s", (venda_id,))
-    row = cur.fetchone()
-    cur.close()
-    conn.close()
+    # Consulta quente: preparada no servidor já na primeira execução (ver database.py)
+    row = await buscar("SELECT id_venda, data_venda, valor_total_venda, metodo_pagamento, id_usuario FROM venda WHERE id_venda = %s", (venda_id,), prepare=True)
     
     if row:
         return VendaResponse(
@@ -136,72 +266,32 @@ async def obter_venda(venda_id: int):
 
 @router.get("/{venda_id}/produtos", response_model=List[VendaProdutoResponse])
 async def listar_produtos_venda(venda_id: int):
-    conn = get_connection()
-    cur = conn.cursor()
-    cur.execute("SELECT id_venda, id_produto, quantidade, preco_unitario_venda FROM venda_produto WHERE id_venda = %s", (venda_id,))
-    rows = cur.fetchall()
-    cur.close()
-    conn.close()
+    # Consulta quente: preparada no servidor já na primeira execução (ver database.py)
+    rows = await buscar("SELECT id_venda, id_produto, quantidade, preco_unitario_venda FROM venda_produto WHERE id_venda = %s", (venda_id,), prepare=True, todos=True)
+    colunas = ["id_venda", "id_produto", "quantidade", "preco_unitario_venda"]
     
+    if RESPOSTAS_LISTA_RAPIDAS:
+        return resposta_lista(VendaProdutoResponse, colunas, rows)
     return [VendaProdutoResponse(
         id_venda=vp[0], id_produto=vp[1], quantidade=vp[2], preco_unitario_venda=vp[3]
     ) for vp in rows]
 
-@router.patch("/{venda_id}")
+@router.patch("/{venda_id}", response_model=VendaResponse)
 async def atualizar_venda_parcial(venda_id: int, venda: VendaUpdate):
-    conn = get_connection()
-    cur = conn.cursor()
-    cur.execute("SELECT id_venda FROM venda WHERE id_venda = %s", (venda_id,))
-    if not cur.fetchone():
-        cur.close()
-        conn.close()
-        raise HTTPException(404, "Venda não encontrada")
-    
-    fields = []
-    values = []
-    for campo, valor in venda.dict(exclude_unset=True).items():
-        fields.append(f"{campo}=%s")
-        values.append(valor)
-    
-    if not fields:
-        cur.close()
-        conn.close()
-        raise HTTPException(400, "Nenhum campo informado para atualização")
-    
-    values.append(venda_id)
-    try:
-        cur.execute(f"UPDATE venda SET {', '.join(fields)} WHERE id_venda=%s", values)
-        conn.commit()
-    except Exception as e:
-        conn.rollback()
-        raise HTTPException(400, f"Erro ao atualizar: {e}")
-    finally:
-        cur.close()
-        conn.close()
+    async with get_connection() as conn:
+        atualizada = await atualizar_parcial(conn, "venda", "id_venda", venda_id,
+                                             venda.dict(exclude_unset=True), CAMPOS_EDITAVEIS,
+                                             VendaResponse, "Venda não encontrada")
     
-    return {"msg": "Venda atualizada"}
+    await invalidar_usuario(atualizada["id_usuario"])
+    return VendaResponse(**atualizada)
 
 @router.delete("/{venda_id}")
 async def deletar_venda(venda_id: int):
-    conn = get_connection()
-    cur = conn.cursor()
-    
-    try:
-        # Iniciar transação
-        cur.execute("BEGIN")
-        
-        # Deletar produtos da venda primeiro
-        cur.execute("DELETE FROM venda_produto WHERE id_venda=%s", (venda_id,))
-        
-        # Deletar a venda
-        cur.execute("DELETE FROM venda WHERE id_venda=%s", (venda_id,))
-        
-        conn.commit()
-        cur.close()
-        conn.close()
-        return {"msg": "Venda removida"}
-    except Exception as e:
-        conn.rollback()
-        cur.close()
-        conn.close()
-        raise HTTPException(400, f"Erro ao deletar venda: {e}")
+    async with get_connection() as conn:
+        # Itens removidos antes da venda, em outro comando da mesma transação: os contadores de
+        # produtos vendidos (migração 0005) ainda enxergam a data dela
+        id_usuario = await deletar(conn, "venda", "id_venda", venda_id, "Venda não encontrada",
+                                   dependentes=[("venda_produto", "id_venda")])
+    await invalidar_usuario(id_usuario)
+    return {"msg": "Venda removida"}
@@ -0,0 +1,116 @@
+-- Saldo por usuário mantido incrementalmente
+-- Substitui a leitura da view Resumo_Financeiro no endpoint /relatorios/saldo:
+-- em vez de agrupar todo o histórico a cada chamada, os totais são atualizados
+-- por triggers sempre que uma transação ou o tipo de uma categoria muda.
+-- Conferência/reconstrução contra a view: python resumo_saldo.py verificar | reconstruir
+
+CREATE TABLE IF NOT EXISTS Saldo_Usuario (
+    ID_Usuario INT PRIMARY KEY,
+    Total_Entradas NUMERIC NOT NULL DEFAULT 0,
+    Total_Saidas NUMERIC NOT NULL DEFAULT 0,
+    FOREIGN KEY (ID_Usuario) REFERENCES Usuario(ID_Usuario) ON DELETE CASCADE
+);
+
+-- Aplica as diferenças de um comando inteiro em Transacao (triggers por comando,
+-- então um lote de milhares de linhas gera um único UPSERT agrupado por usuário)
+CREATE OR REPLACE FUNCTION fn_Saldo_Usuario_Transacao() RETURNS TRIGGER AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        INSERT INTO Saldo_Usuario (ID_Usuario, Total_Entradas, Total_Saidas)
+        SELECT t.ID_Usuario,
+               SUM(CASE WHEN c.Tipo_Categoria = 'Entrada' THEN t.Valor ELSE 0 END),
+               SUM(CASE WHEN c.Tipo_Categoria = 'Saida' THEN t.Valor ELSE 0 END)
+        FROM Novas t
+        JOIN CategoriaTransacao c ON c.ID_Categoria = t.ID_Categoria
+        WHERE t.ID_Usuario IS NOT NULL
+        GROUP BY t.ID_Usuario
+        ON CONFLICT (ID_Usuario) DO UPDATE
+        SET Total_Entradas = Saldo_Usuario.Total_Entradas + EXCLUDED.Total_Entradas,
+            Total_Saidas = Saldo_Usuario.Total_Saidas + EXCLUDED.Total_Saidas;
+    ELSIF TG_OP = 'DELETE' THEN
+        INSERT INTO Saldo_Usuario (ID_Usuario, Total_Entradas, Total_Saidas)
+        SELECT t.ID_Usuario,
+               -SUM(CASE WHEN c.Tipo_Categoria = 'Entrada' THEN t.Valor ELSE 0 END),
+               -SUM(CASE WHEN c.Tipo_Categoria = 'Saida' THEN t.Valor ELSE 0 END)
+        FROM Antigas t
+        JOIN CategoriaTransacao c ON c.ID_Categoria = t.ID_Categoria
+        WHERE t.ID_Usuario IS NOT NULL
+        GROUP BY t.ID_Usuario
+        ON CONFLICT (ID_Usuario) DO UPDATE
+        SET Total_Entradas = Saldo_Usuario.Total_Entradas + EXCLUDED.Total_Entradas,
+            Total_Saidas = Saldo_Usuario.Total_Saidas + EXCLUDED.Total_Saidas;
+    ELSE
+        -- UPDATE: retira a versão antiga da linha e soma a nova (cobre troca de valor e de categoria)
+        INSERT INTO Saldo_Usuario (ID_Usuario, Total_Entradas, Total_Saidas)
+        SELECT d.ID_Usuario,
+               SUM(CASE WHEN c.Tipo_Categoria = 'Entrada' THEN d.Valor ELSE 0 END),
+               SUM(CASE WHEN c.Tipo_Categoria = 'Saida' THEN d.Valor ELSE 0 END)
+        FROM (
+            SELECT ID_Usuario, ID_Categoria, Valor FROM Novas
+            UNION ALL
+            SELECT ID_Usuario, ID_Categoria, -Valor FROM Antigas
+        ) d
+        JOIN CategoriaTransacao c ON c.ID_Categoria = d.ID_Categoria
+        WHERE d.ID_Usuario IS NOT NULL
+        GROUP BY d.ID_Usuario
+        ON CONFLICT (ID_Usuario) DO UPDATE
+        SET Total_Entradas = Saldo_Usuario.Total_Entradas + EXCLUDED.Total_Entradas,
+            Total_Saidas = Saldo_Usuario.Total_Saidas + EXCLUDED.Total_Saidas;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Quando o tipo de uma categoria muda, os valores de suas transações trocam de coluna
+CREATE OR REPLACE FUNCTION fn_Saldo_Usuario_Categoria() RETURNS TRIGGER AS $$
+BEGIN
+    INSERT INTO Saldo_Usuario (ID_Usuario, Total_Entradas, Total_Saidas)
+    SELECT t.ID_Usuario,
+           SUM(CASE WHEN n.Tipo_Categoria = 'Entrada' THEN t.Valor ELSE 0 END)
+         - SUM(CASE WHEN a.Tipo_Categoria = 'Entrada' THEN t.Valor ELSE 0 END),
+           SUM(CASE WHEN n.Tipo_Categoria = 'Saida' THEN t.Valor ELSE 0 END)
+         - SUM(CASE WHEN a.Tipo_Categoria = 'Saida' THEN t.Valor ELSE 0 END)
+    FROM Antigas a
+    JOIN Novas n ON n.ID_Categoria = a.ID_Categoria
+    JOIN Transacao t ON t.ID_Categoria = n.ID_Categoria
+    WHERE a.Tipo_Categoria IS DISTINCT FROM n.Tipo_Categoria
+      AND t.ID_Usuario IS NOT NULL
+    GROUP BY t.ID_Usuario
+    ON CONFLICT (ID_Usuario) DO UPDATE
+    SET Total_Entradas = Saldo_Usuario.Total_Entradas + EXCLUDED.Total_Entradas,
+        Total_Saidas = Saldo_Usuario.Total_Saidas + EXCLUDED.Total_Saidas;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_Saldo_Usuario_Insert ON Transacao;
+CREATE TRIGGER trg_Saldo_Usuario_Insert
+    AFTER INSERT ON Transacao
+    REFERENCING NEW TABLE AS Novas
+    FOR EACH STATEMENT EXECUTE FUNCTION fn_Saldo_Usuario_Transacao();
+
+DROP TRIGGER IF EXISTS trg_Saldo_Usuario_Update ON Transacao;
+CREATE TRIGGER trg_Saldo_Usuario_Update
+    AFTER UPDATE ON Transacao
+    REFERENCING OLD TABLE AS Antigas NEW TABLE AS Novas
+    FOR EACH STATEMENT EXECUTE FUNCTION fn_Saldo_Usuario_Transacao();
+
+DROP TRIGGER IF EXISTS trg_Saldo_Usuario_Delete ON Transacao;
+CREATE TRIGGER trg_Saldo_Usuario_Delete
+    AFTER DELETE ON Transacao
+    REFERENCING OLD TABLE AS Antigas
+    FOR EACH STATEMENT EXECUTE FUNCTION fn_Saldo_Usuario_Transacao();
+
+DROP TRIGGER IF EXISTS trg_Saldo_Usuario_Categoria ON CategoriaTransacao;
+CREATE TRIGGER trg_Saldo_Usuario_Categoria
+    AFTER UPDATE ON CategoriaTransacao
+    REFERENCING OLD TABLE AS Antigas NEW TABLE AS Novas
+    FOR EACH STATEMENT EXECUTE FUNCTION fn_Saldo_Usuario_Categoria();
+
+-- Carga inicial a partir do histórico existente
+INSERT INTO Saldo_Usuario (ID_Usuario, Total_Entradas, Total_Saidas)
+SELECT ID_Usuario, Total_Entradas, Total_Saidas
+FROM Resumo_Financeiro
+ON CONFLICT (ID_Usuario) DO UPDATE
+SET Total_Entradas = EXCLUDED.Total_Entradas,
+    Total_Saidas = EXCLUDED.Total_Saidas;
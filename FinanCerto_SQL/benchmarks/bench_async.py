@@ -0,0 +1,128 @@
+# Benchmark: caminho bloqueante (psycopg2 dentro de async def) x caminho assíncrono (database.py)
+#
+# Simula um único worker uvicorn (um event loop) recebendo requisições concorrentes,
+# onde uma fração delas executa uma consulta lenta de relatório (pg_sleep + resumo_financeiro).
+# No caminho bloqueante a consulta lenta congela o event loop e atrasa todas as outras;
+# no caminho assíncrono as demais requisições continuam sendo atendidas.
+#
+# Uso (a partir de FinanCerto_SQL/):
+#     python benchmarks/bench_async.py --requisicoes 400 --concorrencia 50 --fracao-lenta 0.1 --lento 0.2
+#
+# Requer httpx e um banco criado com FinanCerto.sql + PovoandoSistema.sql + Views.
+
+import argparse
+import asyncio
+import random
+import statistics
+import time
+
+from comum import percentil
+import httpx
+import psycopg2
+from fastapi import FastAPI
+
+from config import DATABASE_URL
+from database import get_connection, iniciar_pool, fechar_pool
+
+CONSULTA_RAPIDA = "SELECT id_usuario, nome_usuario, email FROM usuario WHERE id_usuario = %s"
+CONSULTA_LENTA = "SELECT pg_sleep(%s), saldo FROM resumo_financeiro WHERE id_usuario = %s"
+
+def criar_app_bloqueante(lento):
+    """Reproduz o caminho antigo: psycopg2 síncrono chamado de dentro de um handler async"""
+    app = FastAPI()
+
+    def executar(sql, params):
+        conn = psycopg2.connect(DATABASE_URL)
+        cur = conn.cursor()
+        cur.execute(sql, params)
+        row = cur.fetchone()
+        cur.close()
+        conn.close()
+        return row
+
+    @app.get("/rapido/{usuario_id}")
+    async def rapido(usuario_id: int):
+        return {"row": str(executar(CONSULTA_RAPIDA, (usuario_id,)))}
+
+    @app.get("/lento/{usuario_id}")
+    async def lento_(usuario_id: int):
+        return {"row": str(executar(CONSULTA_LENTA, (lento, usuario_id)))}
+
+    return app
+
+def criar_app_assincrono(lento):
+    """Caminho atual: pool assíncrono compartilhado de database.py"""
+    app = FastAPI()
+
+    async def executar(sql, params):
+        async with get_connection() as conn, conn.cursor() as cur:
+            await cur.execute(sql, params)
+            return await cur.fetchone()
+
+    @app.get("/rapido/{usuario_id}")
+    async def rapido(usuario_id: int):
+        return {"row": str(await executar(CONSULTA_RAPIDA, (usuario_id,)))}
+
+    @app.get("/lento/{usuario_id}")
+    async def lento_(usuario_id: int):
+        return {"row": str(await executar(CONSULTA_LENTA, (lento, usuario_id)))}
+
+    return app
+
+async def disparar(app, rotas, concorrencia):
+    """Executa as rotas com no máximo `concorrencia` requisições simultâneas"""
+    latencias = {"rapido": [], "lento": []}
+    semaforo = asyncio.Semaphore(concorrencia)
+    transport = httpx.ASGITransport(app=app)
+
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        async def uma(rota):
+            async with semaforo:
+                inicio = time.perf_counter()
+                resp = await client.get(rota)
+                resp.raise_for_status()
+                latencias[rota.split("/")[1]].append(time.perf_counter() - inicio)
+
+        inicio = time.perf_counter()
+        await asyncio.gather(*(uma(rota) for rota in rotas))
+        total = time.perf_counter() - inicio
+
+    return total, latencias
+
+def imprimir(nome, total, latencias, n):
+    rapidas = latencias["rapido"]
+    print(f"{nome:<12} {n / total:>9.1f} req/s   "
+          f"rápidas p50={percentil(rapidas, 50) * 1000:7.1f}ms "
+          f"p95={percentil(rapidas, 95) * 1000:7.1f}ms   "
+          f"lentas média={statistics.mean(latencias['lento'] or [0]) * 1000:7.1f}ms")
+
+async def main():
+    parser = argparse.ArgumentParser(description="Bloqueante x assíncrono com consultas lentas")
+    parser.add_argument("--requisicoes", type=int, default=400)
+    parser.add_argument("--concorrencia", type=int, default=50)
+    parser.add_argument("--fracao-lenta", type=float, default=0.1)
+    parser.add_argument("--lento", type=float, default=0.2, help="duração da consulta lenta em segundos")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    rotas = [
+        f"/lento/{rng.randint(1, 10)}" if rng.random() < args.fracao_lenta else f"/rapido/{rng.randint(1, 10)}"
+        for _ in range(args.requisicoes)
+    ]
+
+    print(f"{args.requisicoes} requisições, concorrência {args.concorrencia}, "
+          f"{args.fracao_lenta:.0%} lentas de {args.lento}s")
+
+    total, latencias = await disparar(criar_app_bloqueante(args.lento), rotas, args.concorrencia)
+    imprimir("bloqueante", total, latencias, args.requisicoes)
+
+    await iniciar_pool()
+    try:
+        total, latencias = await disparar(criar_app_assincrono(args.lento), rotas, args.concorrencia)
+        imprimir("assíncrono", total, latencias, args.requisicoes)
+    finally:
+        await fechar_pool()
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,95 @@
+# Benchmark: POST /transacoes/ com commit por requisição x gravação agrupada (gravacao_agrupada.py)
+#
+# Dispara requisições concorrentes contra a API no mesmo processo (um event loop, como um worker
+# uvicorn), primeiro com o commit próprio de cada handler e depois com a fila de group commit.
+# Além da vazão e das latências, mostra quantos COMMITs e flushes do WAL o servidor fez
+# (pg_stat_database / pg_stat_wal) para gravar as mesmas transações.
+#
+# Uso (a partir de FinanCerto_SQL/):
+#     python benchmarks/bench_gravacao_agrupada.py --requisicoes 2000 --concorrencia 100
+#
+# As transações criadas são marcadas na descrição e apagadas no final.
+
+import argparse
+import asyncio
+import time
+
+from comum import resumir_latencias
+import httpx
+import psycopg
+
+from config import DATABASE_URL
+import gravacao_agrupada
+import main as api
+
+MARCA = "bench_gravacao_agrupada"
+
+async def contadores_servidor(conn):
+    """(COMMITs do banco, flushes do WAL) acumulados no servidor"""
+    cur = await conn.execute("SELECT xact_commit FROM pg_stat_database WHERE datname = current_database()")
+    commits = (await cur.fetchone())[0]
+    cur = await conn.execute("SELECT wal_sync FROM pg_stat_wal")
+    flushes = (await cur.fetchone())[0]
+    return commits, flushes
+
+async def disparar(cliente, corpos, concorrencia):
+    semaforo = asyncio.Semaphore(concorrencia)
+    latencias = []
+    falhas = 0
+
+    async def enviar(corpo):
+        nonlocal falhas
+        async with semaforo:
+            inicio = time.perf_counter()
+            resposta = await cliente.post("/transacoes/", json=corpo)
+            latencias.append(time.perf_counter() - inicio)
+            if resposta.status_code != 200:
+                falhas += 1
+
+    inicio = time.perf_counter()
+    await asyncio.gather(*(enviar(c) for c in corpos))
+    return time.perf_counter() - inicio, latencias, falhas
+
+async def main():
+    parser = argparse.ArgumentParser(description="Commit por requisição x gravação agrupada")
+    parser.add_argument("--requisicoes", type=int, default=2000)
+    parser.add_argument("--concorrencia", type=int, default=100)
+    args = parser.parse_args()
+
+    async with await psycopg.AsyncConnection.connect(DATABASE_URL, autocommit=True) as conn:
+        cur = await conn.execute(
+            "SELECT id_usuario, id_categoria FROM categoriatransacao WHERE tipo_categoria = 'Entrada' LIMIT 1")
+        row = await cur.fetchone()
+        if row is None:
+            print("sem categorias no banco")
+            return
+        id_usuario, id_categoria = row
+        corpos = [{"data_transacao": "2024-01-01", "descricao": MARCA, "valor": "1.00",
+                   "id_usuario": id_usuario, "id_categoria": id_categoria}] * args.requisicoes
+
+        print(f"{'modo':<12} {'req/s':>8} {'p50':>9} {'p99':>9} {'commits':>8} {'flushes':>8} {'falhas':>7}")
+        async with api.lifespan(api.app):
+            transporte = httpx.ASGITransport(app=api.app)
+            async with httpx.AsyncClient(transport=transporte, base_url="http://bench") as cliente:
+                # Aquecimento (pool, cache de categorias, prepared statements)
+                await disparar(cliente, corpos[:50], args.concorrencia)
+                # Com GRAVACAO_AGRUPADA ligado o lifespan já iniciou a fila: a linha de base precisa
+                # do commit por requisição, então a fila só volta na fase "agrupada"
+                await gravacao_agrupada.parar()
+                for chave in gravacao_agrupada.estatisticas:
+                    gravacao_agrupada.estatisticas[chave] = 0
+                for modo in ("commit", "agrupada"):
+                    if modo == "agrupada":
+                        await gravacao_agrupada.iniciar()
+                    antes = await contadores_servidor(conn)
+                    duracao, latencias, falhas = await disparar(cliente, corpos, args.concorrencia)
+                    depois = await contadores_servidor(conn)
+                    resumo = resumir_latencias(latencias)
+                    print(f"{modo:<12} {len(corpos) / duracao:>8.0f} {resumo['p50_ms']:>7.2f}ms "
+                          f"{resumo['p99_ms']:>7.2f}ms {depois[0] - antes[0]:>8} {depois[1] - antes[1]:>8} {falhas:>7}")
+        print(f"lotes: {gravacao_agrupada.estatisticas['lotes']}, operações: {gravacao_agrupada.estatisticas['operacoes']}")
+
+        await conn.execute("DELETE FROM transacao WHERE descricao = %s", (MARCA,))
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,88 @@
+# Micro-benchmark: consultas pontuais dos CRUDs com e sem prepared statement
+#
+# Para cada consulta quente (obter_usuario, obter_produto, obter_transacao, obter_venda,
+# listar_produtos_venda) executa a mesma sequência de ids em uma única conexão, primeiro
+# enviando o texto SQL a cada vez (parse + plan no servidor) e depois preparado uma vez só.
+# Mostra também o "Planning Time" que o servidor gasta por execução sem preparo.
+#
+# Uso (a partir de FinanCerto_SQL/):
+#     python benchmarks/bench_preparados.py --execucoes 5000
+#
+# Requer um banco povoado (PovoandoSistema.sql ou gerar_dados.py).
+
+import argparse
+import asyncio
+import random
+import re
+import time
+
+from comum import resumir_latencias
+import psycopg
+
+from config import DATABASE_URL
+
+# (nome do handler, consulta exatamente como no Crud, tabela/coluna de onde sortear os ids)
+CONSULTAS = [
+    ("obter_usuario", "SELECT id_usuario, nome_usuario, email FROM usuario WHERE id_usuario = %s",
+     "SELECT id_usuario FROM usuario"),
+    ("obter_produto", "SELECT id_produto, nome_produto, preco_custo, preco_venda, id_usuario FROM produto WHERE id_produto = %s",
+     "SELECT id_produto FROM produto"),
+    ("obter_transacao", "SELECT id_transacao, data_transacao, descricao, valor, id_usuario, id_categoria FROM transacao WHERE id_transacao = %s",
+     "SELECT id_transacao FROM transacao"),
+    ("obter_venda", "SELECT id_venda, data_venda, valor_total_venda, metodo_pagamento, id_usuario FROM venda WHERE id_venda = %s",
+     "SELECT id_venda FROM venda"),
+    ("listar_produtos_venda", "SELECT id_venda, id_produto, quantidade, preco_unitario_venda FROM venda_produto WHERE id_venda = %s",
+     "SELECT id_venda FROM venda"),
+]
+
+async def sortear_ids(conn, consulta_ids, n, rng):
+    cur = await conn.execute(consulta_ids + " ORDER BY 1 LIMIT 100000")
+    ids = [row[0] for row in await cur.fetchall()]
+    return [rng.choice(ids) for _ in range(n)] if ids else []
+
+async def medir(conn, sql, ids, preparar):
+    latencias = []
+    async with conn.cursor() as cur:
+        for valor in ids:
+            inicio = time.perf_counter()
+            await cur.execute(sql, (valor,), prepare=preparar)
+            await cur.fetchall()
+            latencias.append(time.perf_counter() - inicio)
+    return latencias
+
+async def tempo_planejamento(conn, sql, valor):
+    """Planning Time (ms) informado pelo servidor para uma execução sem preparo"""
+    cur = await conn.execute("EXPLAIN (ANALYZE, SUMMARY) " + sql, (valor,), prepare=False)
+    plano = "\n".join(row[0] for row in await cur.fetchall())
+    achado = re.search(r"Planning Time: ([\d.]+) ms", plano)
+    return float(achado.group(1)) if achado else 0.0
+
+async def main():
+    parser = argparse.ArgumentParser(description="Consultas pontuais com e sem prepared statement")
+    parser.add_argument("--execucoes", type=int, default=5000, help="execuções por consulta e modo")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    # autocommit: cada execução é isolada, como um handler que termina a transação logo depois
+    async with await psycopg.AsyncConnection.connect(DATABASE_URL, autocommit=True) as conn:
+        print(f"{'consulta':<22} {'plan(ms)':>9} {'texto p50':>10} {'prep. p50':>10} "
+              f"{'texto média':>12} {'prep. média':>12} {'ganho':>7}")
+        for nome, sql, consulta_ids in CONSULTAS:
+            ids = await sortear_ids(conn, consulta_ids, args.execucoes, rng)
+            if not ids:
+                print(f"{nome:<22} sem dados")
+                continue
+            planejamento = await tempo_planejamento(conn, sql, ids[0])
+            # Aquecimento dos dois caminhos (cache do servidor e do driver)
+            await medir(conn, sql, ids[:200], False)
+            await medir(conn, sql, ids[:200], True)
+
+            texto = resumir_latencias(await medir(conn, sql, ids, False))
+            preparado = resumir_latencias(await medir(conn, sql, ids, True))
+            ganho = 1 - preparado["media_ms"] / texto["media_ms"] if texto["media_ms"] else 0.0
+            print(f"{nome:<22} {planejamento:>9.3f} {texto['p50_ms']:>9.3f}ms {preparado['p50_ms']:>9.3f}ms "
+                  f"{texto['media_ms']:>11.3f}ms {preparado['media_ms']:>11.3f}ms {ganho:>7.1%}")
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,76 @@
+# Benchmark: listagens grandes com serialização padrão (Pydantic + encoder do FastAPI)
+# x caminho rápido de serializacao.py (linhas direto para JSON)
+#
+# Pede páginas de 10 mil linhas de /transacoes/usuario/{id} e /vendas/usuario/{id} nos dois modos,
+# confere que o corpo e o cabeçalho do cursor são idênticos e compara as latências.
+#
+# Uso (a partir de FinanCerto_SQL/):
+#     python benchmarks/bench_serializacao.py --linhas 10000 --repeticoes 20
+#
+# Requer httpx e um usuário com muitas linhas (ex.: python gerar_dados.py --transacoes-media 5000).
+
+import argparse
+import asyncio
+import time
+
+from comum import resumir_latencias
+import httpx
+
+import Crud_CategoriaTransacao, Crud_Produto, Crud_Transacao, Crud_Usuario, Crud_Venda
+from database import get_connection
+from main import app
+from serializacao import orjson
+
+MODULOS_LISTAGEM = [Crud_CategoriaTransacao, Crud_Produto, Crud_Transacao, Crud_Usuario, Crud_Venda]
+
+def definir_modo(rapido):
+    for modulo in MODULOS_LISTAGEM:
+        modulo.RESPOSTAS_LISTA_RAPIDAS = rapido
+
+async def usuario_com_mais_linhas(tabela):
+    async with get_connection() as conn, conn.cursor() as cur:
+        await cur.execute(f"SELECT id_usuario, COUNT(*) FROM {tabela} GROUP BY id_usuario ORDER BY 2 DESC LIMIT 1")
+        return await cur.fetchone()
+
+async def medir(client, rota, repeticoes):
+    latencias = []
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        resp = await client.get(rota)
+        resp.raise_for_status()
+        latencias.append(time.perf_counter() - inicio)
+    return latencias, resp
+
+async def main():
+    parser = argparse.ArgumentParser(description="Serialização padrão x rápida em listagens grandes")
+    parser.add_argument("--linhas", type=int, default=10000, help="limit das listagens")
+    parser.add_argument("--repeticoes", type=int, default=20)
+    args = parser.parse_args()
+
+    print(f"JSON: {'orjson' if orjson is not None else 'json (orjson não instalado)'}")
+    transport = httpx.ASGITransport(app=app)
+    async with app.router.lifespan_context(app), \
+            httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        for tabela, prefixo in (("transacao", "/transacoes"), ("venda", "/vendas")):
+            usuario_id, total = await usuario_com_mais_linhas(tabela)
+            rota = f"{prefixo}/usuario/{usuario_id}?limit={args.linhas}"
+
+            definir_modo(False)
+            await medir(client, rota, 2)
+            padrao, resp_padrao = await medir(client, rota, args.repeticoes)
+            definir_modo(True)
+            await medir(client, rota, 2)
+            rapido, resp_rapido = await medir(client, rota, args.repeticoes)
+            definir_modo(False)
+
+            identico = (resp_padrao.content == resp_rapido.content and
+                        resp_padrao.headers.get("x-proximo-cursor") == resp_rapido.headers.get("x-proximo-cursor"))
+            p, r = resumir_latencias(padrao), resumir_latencias(rapido)
+            print(f"{rota} ({min(total, args.linhas)} linhas, {len(resp_rapido.content) / 1024:.0f} KiB) "
+                  f"corpo idêntico: {'sim' if identico else 'NÃO'}")
+            print(f"    padrão  p50={p['p50_ms']:8.1f}ms  p95={p['p95_ms']:8.1f}ms  média={p['media_ms']:8.1f}ms")
+            print(f"    rápido  p50={r['p50_ms']:8.1f}ms  p95={r['p95_ms']:8.1f}ms  média={r['media_ms']:8.1f}ms  "
+                  f"({p['media_ms'] / r['media_ms']:.1f}x)")
+
+if __name__ == "__main__":
+    asyncio.run(main())
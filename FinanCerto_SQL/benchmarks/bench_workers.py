@@ -0,0 +1,104 @@
+# Benchmark: vazão da API com 1 worker até um por núcleo (servidor.py)
+#
+# Para cada quantidade de workers sobe `python servidor.py --workers N` em uma porta própria,
+# espera a API responder, dispara a mistura do teste de carga (carga.py) por HTTP e encerra o
+# servidor com SIGTERM (o mesmo caminho de shutdown da produção).
+# O gerador de carga também usa CPU: ele roda em --clientes processos separados para não ser
+# o gargalo; a vazão é a soma dos clientes e a latência p99 é a do pior cliente.
+#
+# Uso (a partir de FinanCerto_SQL/):
+#     python benchmarks/bench_workers.py --workers 1,2,4,8 --concorrencia 64 --duracao 20
+#
+# Por padrão só leituras e relatórios (nada é gravado no banco); --mix aceita o formato do carga.py.
+
+import argparse
+import asyncio
+import os
+import signal
+import subprocess
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from comum import PASTA_API
+import httpx
+
+from carga import carregar_ids, interpretar_mix, rodar_nivel
+
+def esperar_api(url, processo, limite=60):
+    """Espera a API responder (todos os workers fazem o startup antes de aceitar conexões)"""
+    fim = time.monotonic() + limite
+    while time.monotonic() < fim:
+        if processo.poll() is not None:
+            raise SystemExit(f"servidor.py terminou com código {processo.returncode}")
+        try:
+            if httpx.get(url + "/", timeout=1).status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.2)
+    raise SystemExit("API não respondeu a tempo")
+
+def cliente_carga(url, ids, mix, concorrencia, duracao, seed):
+    """Um processo gerador de carga; devolve o resultado de rodar_nivel"""
+    async def rodar():
+        limites = httpx.Limits(max_connections=concorrencia, max_keepalive_connections=concorrencia)
+        async with httpx.AsyncClient(base_url=url, timeout=60, limits=limites) as client:
+            return await rodar_nivel(client, ids, mix, concorrencia, duracao, seed)
+    return asyncio.run(rodar())
+
+def medir(url, ids, mix, concorrencia, duracao, clientes, seed):
+    por_cliente = max(1, concorrencia // clientes)
+    with ProcessPoolExecutor(clientes) as executor:
+        resultados = list(executor.map(cliente_carga, [url] * clientes, [ids] * clientes, [mix] * clientes,
+                                       [por_cliente] * clientes, [duracao] * clientes,
+                                       [seed + i for i in range(clientes)]))
+    totais = [r["total"] for r in resultados]
+    return {
+        "requisicoes": sum(t["requisicoes"] for t in totais),
+        "erros": sum(t["erros"] for t in totais),
+        "vazao_rps": sum(t["vazao_rps"] for t in totais),
+        "p50_ms": max(t["p50_ms"] for t in totais),
+        "p99_ms": max(t["p99_ms"] for t in totais)
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Escala da API de 1 worker até todos os núcleos")
+    nucleos = os.cpu_count() or 1
+    padrao = sorted({1, 2, 4, 8, 16, 32, 64, nucleos} & set(range(1, nucleos + 1)))
+    parser.add_argument("--workers", default=",".join(map(str, padrao)), help="quantidades separadas por vírgula")
+    parser.add_argument("--concorrencia", type=int, default=64, help="clientes simultâneos no total")
+    parser.add_argument("--duracao", type=float, default=20, help="segundos por medição")
+    parser.add_argument("--aquecimento", type=float, default=3)
+    parser.add_argument("--clientes", type=int, default=max(1, nucleos // 4), help="processos geradores de carga")
+    parser.add_argument("--mix", default="leitura=80,relatorio=20")
+    parser.add_argument("--porta", type=int, default=8101)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    mix = interpretar_mix(args.mix)
+    ids = carregar_ids()
+    url = f"http://127.0.0.1:{args.porta}"
+
+    print(f"{nucleos} núcleo(s), {args.clientes} processo(s) de carga, concorrência {args.concorrencia}")
+    print(f"{'workers':>7} {'req/s':>9} {'escala':>7} {'p50':>9} {'p99':>9} {'erros':>6}")
+    base = None
+    for workers in [int(w) for w in args.workers.split(",")]:
+        servidor = subprocess.Popen(
+            [sys.executable, "servidor.py", "--workers", str(workers), "--host", "127.0.0.1", "--porta", str(args.porta)],
+            cwd=PASTA_API, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+        )
+        try:
+            esperar_api(url, servidor)
+            if args.aquecimento:
+                medir(url, ids, mix, args.concorrencia, args.aquecimento, args.clientes, args.seed)
+            r = medir(url, ids, mix, args.concorrencia, args.duracao, args.clientes, args.seed)
+        finally:
+            servidor.send_signal(signal.SIGTERM)
+            servidor.wait()
+        base = base or r["vazao_rps"]
+        print(f"{workers:>7} {r['vazao_rps']:>9.1f} {r['vazao_rps'] / base:>6.2f}x "
+              f"{r['p50_ms']:>7.1f}ms {r['p99_ms']:>7.1f}ms {r['erros']:>6}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,246 @@
+# Teste de carga da API FinanCerto
+#
+# Dispara uma mistura configurável de leituras, escritas e relatórios contra main.app
+# (em processo, via ASGI) ou contra um servidor já rodando (--url), em cada nível de
+# concorrência pedido, e mede vazão e latência p50/p95/p99 por rota.
+# Os resultados são gravados em JSON para comparar execuções e detectar regressões.
+#
+# Uso (a partir de FinanCerto_SQL/):
+#     python benchmarks/carga.py executar --concorrencia 1,10,50 --duracao 20 \
+#         --mix leitura=70,escrita=10,relatorio=20 --saida resultados/antes.json
+#     python benchmarks/carga.py comparar resultados/antes.json resultados/depois.json --tolerancia 0.10
+#
+# Atenção: as escritas gravam transações e vendas reais no banco apontado por config.py.
+# Requer httpx.
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import sys
+import time
+from datetime import date, datetime, timedelta
+
+from comum import resumir_latencias
+import httpx
+import psycopg
+
+from config import DATABASE_URL
+
+def carregar_ids():
+    """Lê do banco os ids válidos usados para montar as requisições"""
+    with psycopg.connect(DATABASE_URL) as conn:
+        usuarios = [r[0] for r in conn.execute("SELECT id_usuario FROM usuario").fetchall()]
+        categorias = conn.execute("SELECT id_usuario, id_categoria FROM categoriatransacao WHERE id_usuario IS NOT NULL").fetchall()
+        produtos = conn.execute("SELECT id_usuario, id_produto, preco_venda FROM produto WHERE id_usuario IS NOT NULL").fetchall()
+        transacoes = [r[0] for r in conn.execute("SELECT id_transacao FROM transacao ORDER BY random() LIMIT 10000").fetchall()]
+        vendas = [r[0] for r in conn.execute("SELECT id_venda FROM venda ORDER BY random() LIMIT 10000").fetchall()]
+    if not usuarios:
+        raise SystemExit("Banco sem usuários: rode o povoamento antes do teste de carga")
+
+    categorias_por_usuario, produtos_por_usuario = {}, {}
+    for id_usuario, id_categoria in categorias:
+        categorias_por_usuario.setdefault(id_usuario, []).append(id_categoria)
+    for id_usuario, id_produto, preco in produtos:
+        produtos_por_usuario.setdefault(id_usuario, []).append((id_produto, str(preco)))
+    return {
+        "usuarios": usuarios,
+        "categorias": categorias_por_usuario,
+        "produtos": produtos_por_usuario,
+        "transacoes": transacoes or [1],
+        "vendas": vendas or [1]
+    }
+
+# Cada operação devolve (rota agregada, método, caminho, corpo json ou None)
+def op_leitura(rng, ids):
+    u = rng.choice(ids["usuarios"])
+    return rng.choice([
+        ("GET /usuarios/{id}", "GET", f"/usuarios/{u}", None),
+        ("GET /transacoes/usuario/{id}", "GET", f"/transacoes/usuario/{u}?limit=50", None),
+        ("GET /transacoes/{id}", "GET", f"/transacoes/{rng.choice(ids['transacoes'])}", None),
+        ("GET /vendas/usuario/{id}", "GET", f"/vendas/usuario/{u}?limit=50", None),
+        ("GET /vendas/{id}/produtos", "GET", f"/vendas/{rng.choice(ids['vendas'])}/produtos", None),
+        ("GET /produtos/usuario/{id}", "GET", f"/produtos/usuario/{u}", None),
+        ("GET /categorias/usuario/{id}", "GET", f"/categorias/usuario/{u}", None),
+    ])
+
+def op_escrita(rng, ids):
+    data = (date.today() - timedelta(days=rng.randint(0, 365))).isoformat()
+    usuarios_com_produtos = list(ids["produtos"])
+    if usuarios_com_produtos and rng.random() < 0.3:
+        u = rng.choice(usuarios_com_produtos)
+        itens = rng.sample(ids["produtos"][u], min(len(ids["produtos"][u]), rng.randint(1, 3)))
+        produtos = [{"id_produto": p, "quantidade": rng.randint(1, 5), "preco_unitario_venda": preco} for p, preco in itens]
+        total = sum(float(p["preco_unitario_venda"]) * p["quantidade"] for p in produtos)
+        return ("POST /vendas/", "POST", "/vendas/", {
+            "data_venda": data, "valor_total_venda": f"{total:.2f}", "metodo_pagamento": "Pix",
+            "id_usuario": u, "produtos": produtos
+        })
+    u = rng.choice(list(ids["categorias"]))
+    return ("POST /transacoes/", "POST", "/transacoes/", {
+        "data_transacao": data, "descricao": "carga", "valor": f"{rng.uniform(1, 500):.2f}",
+        "id_usuario": u, "id_categoria": rng.choice(ids["categorias"][u])
+    })
+
+def op_relatorio(rng, ids):
+    u = rng.choice(ids["usuarios"])
+    return rng.choice([
+        ("GET /relatorios/saldo/{id}", "GET", f"/relatorios/saldo/{u}", None),
+        ("GET /relatorios/vendas/{id}", "GET", f"/relatorios/vendas/{u}", None),
+        ("GET /relatorios/lucro/{id}", "GET", f"/relatorios/lucro/{u}", None),
+        ("GET /relatorios/produtos-mais-vendidos/{id}", "GET", f"/relatorios/produtos-mais-vendidos/{u}", None),
+    ])
+
+OPERACOES = {"leitura": op_leitura, "escrita": op_escrita, "relatorio": op_relatorio}
+
+def interpretar_mix(texto):
+    mix = {}
+    for parte in texto.split(","):
+        nome, peso = parte.split("=")
+        if nome not in OPERACOES:
+            raise SystemExit(f"Tipo de operação desconhecido no mix: {nome}")
+        mix[nome] = float(peso)
+    return mix
+
+async def rodar_nivel(client, ids, mix, concorrencia, duracao, seed):
+    """Roda `concorrencia` clientes em laço fechado durante `duracao` segundos"""
+    amostras = {}   # rota -> {"latencias": [...], "erros": n}
+    nomes, pesos = list(mix), list(mix.values())
+    fim = time.perf_counter() + duracao
+
+    async def cliente(n):
+        rng = random.Random(seed * 1000 + n)
+        while time.perf_counter() < fim:
+            rota, metodo, caminho, corpo = OPERACOES[rng.choices(nomes, pesos)[0]](rng, ids)
+            inicio = time.perf_counter()
+            try:
+                resp = await client.request(metodo, caminho, json=corpo)
+                erro = resp.status_code >= 400
+            except httpx.HTTPError:
+                erro = True
+            amostra = amostras.setdefault(rota, {"latencias": [], "erros": 0})
+            amostra["latencias"].append(time.perf_counter() - inicio)
+            amostra["erros"] += erro
+
+    inicio = time.perf_counter()
+    await asyncio.gather(*(cliente(n) for n in range(concorrencia)))
+    decorrido = time.perf_counter() - inicio
+
+    rotas = {}
+    for rota, amostra in sorted(amostras.items()):
+        rotas[rota] = {
+            "requisicoes": len(amostra["latencias"]),
+            "erros": amostra["erros"],
+            "vazao_rps": len(amostra["latencias"]) / decorrido,
+            **resumir_latencias(amostra["latencias"])
+        }
+    todas = [l for a in amostras.values() for l in a["latencias"]]
+    total = {
+        "requisicoes": len(todas),
+        "erros": sum(a["erros"] for a in amostras.values()),
+        "vazao_rps": len(todas) / decorrido,
+        **resumir_latencias(todas)
+    }
+    return {"concorrencia": concorrencia, "duracao_s": decorrido, "total": total, "rotas": rotas}
+
+def imprimir_nivel(nivel):
+    print(f"\nconcorrência {nivel['concorrencia']}  ({nivel['duracao_s']:.1f}s)")
+    print(f"  {'rota':<46} {'req':>7} {'erros':>6} {'req/s':>8} {'p50':>8} {'p95':>8} {'p99':>8}")
+    for rota, r in list(nivel["rotas"].items()) + [("TOTAL", nivel["total"])]:
+        print(f"  {rota:<46} {r['requisicoes']:>7} {r['erros']:>6} {r['vazao_rps']:>8.1f} "
+              f"{r['p50_ms']:>7.1f}ms {r['p95_ms']:>7.1f}ms {r['p99_ms']:>7.1f}ms")
+
+async def executar(args):
+    mix = interpretar_mix(args.mix)
+    ids = carregar_ids()
+    niveis = [int(c) for c in args.concorrencia.split(",")]
+
+    if args.url:
+        client = httpx.AsyncClient(base_url=args.url, timeout=60)
+    else:
+        from main import app
+        from database import iniciar_pool
+        await iniciar_pool()
+        client = httpx.AsyncClient(transport=httpx.ASGITransport(app=app, raise_app_exceptions=False), base_url="http://carga", timeout=60)
+
+    resultados = []
+    async with client:
+        if args.aquecimento:
+            await rodar_nivel(client, ids, mix, niveis[0], args.aquecimento, args.seed)
+        for concorrencia in niveis:
+            nivel = await rodar_nivel(client, ids, mix, concorrencia, args.duracao, args.seed)
+            imprimir_nivel(nivel)
+            resultados.append(nivel)
+
+    if not args.url:
+        from database import fechar_pool
+        await fechar_pool()
+
+    saida = {
+        "executado_em": datetime.now().isoformat(timespec="seconds"),
+        "alvo": args.url or "main.app (ASGI em processo)",
+        "mix": mix,
+        "duracao_s": args.duracao,
+        "seed": args.seed,
+        "maquina": {"python": platform.python_version(), "cpus": os.cpu_count(), "sistema": platform.platform()},
+        "niveis": resultados
+    }
+    pasta = os.path.dirname(args.saida)
+    if pasta:
+        os.makedirs(pasta, exist_ok=True)
+    with open(args.saida, "w", encoding="utf-8") as f:
+        json.dump(saida, f, indent=2, ensure_ascii=False)
+    print(f"\nresultados gravados em {args.saida}")
+    return 0
+
+def comparar(args):
+    """Compara p95 e vazão por (concorrência, rota); exit 1 se piorou além da tolerância"""
+    with open(args.base, encoding="utf-8") as f:
+        base = {n["concorrencia"]: n for n in json.load(f)["niveis"]}
+    with open(args.atual, encoding="utf-8") as f:
+        atual = {n["concorrencia"]: n for n in json.load(f)["niveis"]}
+
+    regressoes = 0
+    for concorrencia in sorted(set(base) & set(atual)):
+        print(f"\nconcorrência {concorrencia}")
+        rotas_base = dict(base[concorrencia]["rotas"], TOTAL=base[concorrencia]["total"])
+        rotas_atual = dict(atual[concorrencia]["rotas"], TOTAL=atual[concorrencia]["total"])
+        for rota in sorted(set(rotas_base) & set(rotas_atual)):
+            b, a = rotas_base[rota], rotas_atual[rota]
+            var_p95 = (a["p95_ms"] - b["p95_ms"]) / b["p95_ms"] if b["p95_ms"] else 0.0
+            var_rps = (a["vazao_rps"] - b["vazao_rps"]) / b["vazao_rps"] if b["vazao_rps"] else 0.0
+            piorou = var_p95 > args.tolerancia or var_rps < -args.tolerancia
+            regressoes += piorou
+            print(f"  {'REGRESSÃO' if piorou else 'ok':<10} {rota:<46} "
+                  f"p95 {b['p95_ms']:7.1f} -> {a['p95_ms']:7.1f}ms ({var_p95:+.0%})   "
+                  f"req/s {b['vazao_rps']:7.1f} -> {a['vazao_rps']:7.1f} ({var_rps:+.0%})")
+    print(f"\n{regressoes} regressão(ões) acima de {args.tolerancia:.0%}")
+    return 1 if regressoes else 0
+
+def main():
+    parser = argparse.ArgumentParser(description="Teste de carga e comparação de latência da API FinanCerto")
+    sub = parser.add_subparsers(dest="comando", required=True)
+
+    p_exec = sub.add_parser("executar", help="roda o teste de carga")
+    p_exec.add_argument("--url", default=None, help="servidor já rodando (padrão: main.app em processo)")
+    p_exec.add_argument("--concorrencia", default="1,10,50", help="níveis separados por vírgula")
+    p_exec.add_argument("--duracao", type=float, default=20, help="segundos por nível")
+    p_exec.add_argument("--aquecimento", type=float, default=3, help="segundos de aquecimento (0 desliga)")
+    p_exec.add_argument("--mix", default="leitura=70,escrita=10,relatorio=20")
+    p_exec.add_argument("--seed", type=int, default=42)
+    p_exec.add_argument("--saida", default=f"resultados/carga_{datetime.now():%Y%m%d_%H%M%S}.json")
+
+    p_comp = sub.add_parser("comparar", help="compara dois resultados")
+    p_comp.add_argument("base")
+    p_comp.add_argument("atual")
+    p_comp.add_argument("--tolerancia", type=float, default=0.10, help="piora relativa aceita (0.10 = 10%%)")
+
+    args = parser.parse_args()
+    if args.comando == "executar":
+        return asyncio.run(executar(args))
+    return comparar(args)
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,25 @@
+# Utilitários compartilhados pelos benchmarks
+
+import os
+import sys
+
+# Os benchmarks rodam como scripts a partir de FinanCerto_SQL/; garante que os módulos da API sejam importáveis
+PASTA_API = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if PASTA_API not in sys.path:
+    sys.path.insert(0, PASTA_API)
+
+def percentil(valores, p):
+    """Percentil por posição mais próxima; `valores` não precisa estar ordenado"""
+    if not valores:
+        return 0.0
+    valores = sorted(valores)
+    return valores[min(len(valores) - 1, int(round(p / 100 * (len(valores) - 1))))]
+
+def resumir_latencias(latencias):
+    """p50/p95/p99/média em milissegundos a partir de latências em segundos"""
+    return {
+        "p50_ms": percentil(latencias, 50) * 1000,
+        "p95_ms": percentil(latencias, 95) * 1000,
+        "p99_ms": percentil(latencias, 99) * 1000,
+        "media_ms": (sum(latencias) / len(latencias) * 1000) if latencias else 0.0
+    }
@@ -0,0 +1,91 @@
+# Índice em memória das categorias (id -> dono e tipo), usado pelo Crud_Transacao para validar
+# existência, dono e tipo da categoria sem ir ao banco a cada gravação.
+# Carregado sob demanda: uma categoria desconhecida traz junto todas as categorias do mesmo usuário,
+# então as próximas gravações dele já encontram tudo no índice. Limitado por LRU e TTL e invalidado
+# pelos handlers do Crud_CategoriaTransacao. É por processo: em outro worker a mudança aparece no
+# máximo após o TTL, e a chave estrangeira do banco continua barrando categorias removidas.
+
+import time
+from collections import OrderedDict
+from fastapi import HTTPException
+from config import CACHE_CATEGORIAS_TTL, CACHE_CATEGORIAS_MAX_ITENS
+
+TIPOS_VALIDOS = ("Entrada", "Saida")
+
+_por_id = OrderedDict()   # id_categoria -> (expira_em, id_usuario, tipo_categoria)
+estatisticas = {"acertos": 0, "falhas": 0, "invalidacoes": 0}
+
+def _guardar(id_categoria, id_usuario, tipo_categoria, expira_em):
+    _remover(id_categoria)
+    _por_id[id_categoria] = (expira_em, id_usuario, tipo_categoria)
+    while len(_por_id) > CACHE_CATEGORIAS_MAX_ITENS:
+        _remover(next(iter(_por_id)))
+
+def _remover(id_categoria):
+    _por_id.pop(id_categoria, None)
+
+def _consultar(id_categoria):
+    item = _por_id.get(id_categoria)
+    if item is None:
+        return None
+    if item[0] < time.monotonic():
+        _remover(id_categoria)
+        return None
+    _por_id.move_to_end(id_categoria)
+    return item[1], item[2]
+
+async def obter_categorias(cur, ids_categorias):
+    """{id_categoria: (id_usuario, tipo_categoria)} das categorias existentes entre `ids_categorias`.
+    Só vai ao banco (uma consulta) se alguma não estiver no índice."""
+    encontradas = {}
+    faltantes = set()
+    for id_categoria in set(ids_categorias):
+        item = _consultar(id_categoria)
+        if item is None:
+            faltantes.add(id_categoria)
+        else:
+            encontradas[id_categoria] = item
+    estatisticas["acertos"] += len(encontradas)
+    estatisticas["falhas"] += len(faltantes)
+
+    if faltantes:
+        await cur.execute(
+            # As pedidas sempre vêm, mesmo sem dono (id_usuario NULL), para o erro ser de dono e não 404
+            """SELECT id_categoria, id_usuario, tipo_categoria FROM categoriatransacao
+               WHERE id_categoria = ANY(%s)
+                  OR id_usuario IN (SELECT id_usuario FROM categoriatransacao WHERE id_categoria = ANY(%s))""",
+            (list(faltantes), list(faltantes))
+        )
+        expira_em = time.monotonic() + CACHE_CATEGORIAS_TTL
+        for id_categoria, id_usuario, tipo_categoria in await cur.fetchall():
+            _guardar(id_categoria, id_usuario, tipo_categoria, expira_em)
+            if id_categoria in faltantes:
+                encontradas[id_categoria] = (id_usuario, tipo_categoria)
+    return encontradas
+
+def erro_categoria(categorias, id_categoria, id_usuario):
+    """Mensagem de erro (status, texto) para usar a categoria em uma transação do usuário, ou None"""
+    item = categorias.get(id_categoria)
+    if item is None:
+        return 404, "Categoria não encontrada"
+    dono, tipo = item
+    if dono != id_usuario:
+        return 400, "Categoria não pertence ao usuário da transação"
+    if tipo not in TIPOS_VALIDOS:
+        return 400, "Categoria sem tipo 'Entrada' ou 'Saida'"
+    return None
+
+async def validar_categoria(cur, id_categoria, id_usuario):
+    """Valida a categoria de uma transação; HTTPException se não existir, for de outro usuário ou sem tipo"""
+    erro = erro_categoria(await obter_categorias(cur, [id_categoria]), id_categoria, id_usuario)
+    if erro:
+        raise HTTPException(*erro)
+
+def registrar_categoria(id_categoria, id_usuario, tipo_categoria):
+    """Categoria recém-criada entra direto no índice"""
+    _guardar(id_categoria, id_usuario, tipo_categoria, time.monotonic() + CACHE_CATEGORIAS_TTL)
+
+def invalidar_categoria(*ids_categorias):
+    for id_categoria in ids_categorias:
+        estatisticas["invalidacoes"] += 1
+        _remover(id_categoria)
@@ -0,0 +1,183 @@
+# Cache read-through dos relatórios (Crud_Relatorio)
+# Os relatórios são agregados por usuário: cada entrada é guardada sob o id do usuário e
+# todas as entradas dele são invalidadas quando os CRUDs gravam dados desse usuário.
+# Backend em memória (por processo, TTL + LRU) ou Redis (compartilhado entre workers),
+# escolhido por CACHE_RELATORIOS_REDIS_URL no config.py.
+#
+# Uma leitura que começou antes de uma escrita pode gravar um valor já desatualizado;
+# nesse caso ele vale no máximo até o fim do TTL.
+
+import json
+import time
+from collections import OrderedDict
+from config import CACHE_RELATORIOS_TTL, CACHE_RELATORIOS_MAX_ITENS, CACHE_RELATORIOS_REDIS_URL
+from database import registrar_escrita
+
+try:
+    import redis.asyncio as redis
+except ImportError:
+    redis = None
+
+class CacheMemoria:
+    """Cache local do processo, com expiração por TTL e descarte LRU acima de max_itens"""
+
+    def __init__(self, ttl, max_itens):
+        self.ttl = ttl
+        self.max_itens = max_itens
+        self._itens = OrderedDict()   # (usuario_id, chave) -> (expira_em, valor)
+        self._por_usuario = {}        # usuario_id -> {chave}
+        self.descartes = 0
+
+    async def obter(self, usuario_id, chave):
+        item = self._itens.get((usuario_id, chave))
+        if item is None:
+            return None
+        expira_em, valor = item
+        if expira_em < time.monotonic():
+            self._remover((usuario_id, chave))
+            return None
+        self._itens.move_to_end((usuario_id, chave))
+        return valor
+
+    async def guardar(self, usuario_id, chave, valor):
+        self._itens[(usuario_id, chave)] = (time.monotonic() + self.ttl, valor)
+        self._itens.move_to_end((usuario_id, chave))
+        self._por_usuario.setdefault(usuario_id, set()).add(chave)
+        while len(self._itens) > self.max_itens:
+            self._remover(next(iter(self._itens)))
+            self.descartes += 1
+
+    async def obter_varios(self, itens):
+        return [await self.obter(usuario_id, chave) for usuario_id, chave in itens]
+
+    async def guardar_varios(self, valores):
+        for (usuario_id, chave), valor in valores.items():
+            await self.guardar(usuario_id, chave, valor)
+
+    async def invalidar_usuario(self, usuario_id):
+        for chave in self._por_usuario.pop(usuario_id, ()):
+            self._itens.pop((usuario_id, chave), None)
+
+    def _remover(self, item):
+        usuario_id, chave = item
+        self._itens.pop(item, None)
+        chaves = self._por_usuario.get(usuario_id)
+        if chaves is not None:
+            chaves.discard(chave)
+            if not chaves:
+                del self._por_usuario[usuario_id]
+
+    def tamanho(self):
+        return len(self._itens)
+
+class CacheRedis:
+    """Cache compartilhado: um hash por usuário, apagado inteiro na invalidação.
+    O limite de tamanho fica a cargo do maxmemory/allkeys-lru do próprio Redis."""
+
+    def __init__(self, url, ttl, prefixo="financerto:relatorios"):
+        if redis is None:
+            raise RuntimeError("CACHE_RELATORIOS_REDIS_URL configurado, mas o pacote redis não está instalado")
+        self.cliente = redis.from_url(url)
+        self.ttl = ttl
+        self.prefixo = prefixo
+        self.descartes = 0
+
+    def _chave_usuario(self, usuario_id):
+        return f"{self.prefixo}:{usuario_id}"
+
+    async def obter(self, usuario_id, chave):
+        bruto = await self.cliente.hget(self._chave_usuario(usuario_id), chave)
+        if bruto is None:
+            return None
+        expira_em, valor = json.loads(bruto)
+        return valor if expira_em >= time.time() else None
+
+    async def guardar(self, usuario_id, chave, valor):
+        chave_usuario = self._chave_usuario(usuario_id)
+        async with self.cliente.pipeline(transaction=False) as pipe:
+            pipe.hset(chave_usuario, chave, json.dumps([time.time() + self.ttl, valor]))
+            pipe.expire(chave_usuario, self.ttl)
+            await pipe.execute()
+
+    async def obter_varios(self, itens):
+        # Um único round trip para todos os pares (usuário, relatório)
+        async with self.cliente.pipeline(transaction=False) as pipe:
+            for usuario_id, chave in itens:
+                pipe.hget(self._chave_usuario(usuario_id), chave)
+            brutos = await pipe.execute()
+        agora = time.time()
+        valores = []
+        for bruto in brutos:
+            if bruto is None:
+                valores.append(None)
+                continue
+            expira_em, valor = json.loads(bruto)
+            valores.append(valor if expira_em >= agora else None)
+        return valores
+
+    async def guardar_varios(self, valores):
+        async with self.cliente.pipeline(transaction=False) as pipe:
+            for (usuario_id, chave), valor in valores.items():
+                chave_usuario = self._chave_usuario(usuario_id)
+                pipe.hset(chave_usuario, chave, json.dumps([time.time() + self.ttl, valor]))
+                pipe.expire(chave_usuario, self.ttl)
+            await pipe.execute()
+
+    async def invalidar_usuario(self, usuario_id):
+        await self.cliente.delete(self._chave_usuario(usuario_id))
+
+    def tamanho(self):
+        return None
+
+if CACHE_RELATORIOS_REDIS_URL:
+    backend = CacheRedis(CACHE_RELATORIOS_REDIS_URL, CACHE_RELATORIOS_TTL)
+else:
+    backend = CacheMemoria(CACHE_RELATORIOS_TTL, CACHE_RELATORIOS_MAX_ITENS)
+
+# Contadores do processo atual
+estatisticas = {"acertos": 0, "falhas": 0, "invalidacoes": 0}
+
+async def obter_ou_calcular(usuario_id, chave, calcular):
+    """Retorna o relatório do cache ou executa `calcular()` e guarda o resultado"""
+    valor = await backend.obter(usuario_id, chave)
+    if valor is not None:
+        estatisticas["acertos"] += 1
+        return valor
+    estatisticas["falhas"] += 1
+    valor = await calcular()
+    await backend.guardar(usuario_id, chave, valor)
+    return valor
+
+async def obter_ou_calcular_lote(usuarios_ids, chave, calcular):
+    """Versão em lote: `calcular(ids)` recebe só os usuários fora do cache e devolve {id: valor}.
+    Usa as mesmas chaves dos relatórios individuais, então um aproveita o cache do outro."""
+    valores = await backend.obter_varios([(usuario_id, chave) for usuario_id in usuarios_ids])
+    resultado = {u: v for u, v in zip(usuarios_ids, valores) if v is not None}
+    faltantes = [u for u in usuarios_ids if u not in resultado]
+    estatisticas["acertos"] += len(resultado)
+    estatisticas["falhas"] += len(faltantes)
+    if faltantes:
+        calculados = await calcular(faltantes)
+        await backend.guardar_varios({(u, chave): v for u, v in calculados.items()})
+        resultado.update(calculados)
+    return resultado
+
+async def invalidar_usuario(*usuarios_ids):
+    """Descarta os relatórios em cache dos usuários que tiveram dados alterados"""
+    # Toda escrita de dados do usuário passa por aqui: as leituras dele ficam no primário por um tempo
+    registrar_escrita(*usuarios_ids)
+    for usuario_id in set(usuarios_ids):
+        if usuario_id is not None:
+            estatisticas["invalidacoes"] += 1
+            await backend.invalidar_usuario(usuario_id)
+
+def resumo_estatisticas():
+    total = estatisticas["acertos"] + estatisticas["falhas"]
+    return {
+        "backend": type(backend).__name__,
+        **estatisticas,
+        "descartes": backend.descartes,
+        "taxa_acerto": estatisticas["acertos"] / total if total else 0.0,
+        "itens": backend.tamanho(),
+        "ttl_segundos": backend.ttl
+    }
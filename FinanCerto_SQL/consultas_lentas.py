@@ -0,0 +1,166 @@
+# Log de consultas lentas
+# A camada de dados (database.py) chama registrar() para todo comando que passou de
+# CONSULTAS_LENTAS_LIMITE_MS. Cada registro vai como uma linha JSON para um arquivo rotativo com
+# a rota que executou o comando, os parâmetros (colunas sensíveis mascaradas) e, por amostragem,
+# o plano de execução. Um resumo dos piores comandos fica em memória para o endpoint de admin.
+
+import json
+import logging
+import os
+import random
+import re
+import time
+from datetime import datetime
+from logging.handlers import RotatingFileHandler
+
+import psycopg
+from psycopg import sql
+
+from config import (
+    CONSULTAS_LENTAS_LIMITE_MS, CONSULTAS_LENTAS_AMOSTRA_EXPLAIN, CONSULTAS_LENTAS_ARQUIVO,
+    CONSULTAS_LENTAS_ARQUIVO_MAX_BYTES, CONSULTAS_LENTAS_ARQUIVO_BACKUPS
+)
+
+LIMITE_SEGUNDOS = CONSULTAS_LENTAS_LIMITE_MS / 1000
+COLUNAS_SENSIVEIS = {"senha", "cpf"}
+MASCARA = "***"
+MAX_COMANDOS_RESUMO = 500
+
+_logger = None
+_resumo = {}   # comando normalizado -> estatísticas agregadas
+
+def _obter_logger():
+    global _logger
+    if _logger is None:
+        caminho = CONSULTAS_LENTAS_ARQUIVO
+        if not os.path.isabs(caminho):
+            caminho = os.path.join(os.path.dirname(os.path.abspath(__file__)), caminho)
+        os.makedirs(os.path.dirname(caminho), exist_ok=True)
+        handler = RotatingFileHandler(caminho, maxBytes=CONSULTAS_LENTAS_ARQUIVO_MAX_BYTES,
+                                      backupCount=CONSULTAS_LENTAS_ARQUIVO_BACKUPS, encoding="utf-8")
+        handler.setFormatter(logging.Formatter("%(message)s"))
+        _logger = logging.getLogger("financerto.consultas_lentas")
+        _logger.setLevel(logging.INFO)
+        _logger.propagate = False
+        _logger.addHandler(handler)
+    return _logger
+
+def normalizar(texto):
+    """Remove espaços e quebras de linha extras para agrupar o mesmo comando"""
+    return re.sub(r"\s+", " ", texto).strip()
+
+_RE_PLACEHOLDER = re.compile(r"%\((\w+)\)s|%s")
+_RE_COLUNA_ANTES = re.compile(r"(\w+)\s*(?:=|<>|!=|<=|>=|<|>|\bLIKE|\bILIKE)\s*(?:ANY\s*\(\s*)?$", re.IGNORECASE)
+_RE_INSERT = re.compile(r"INSERT\s+INTO\s+\w+\s*\(([^)]*)\)\s*VALUES\s*\(", re.IGNORECASE)
+
+def _colunas_dos_parametros(texto):
+    """Para cada placeholder posicional, a coluna a que ele se refere (None se não der para saber)"""
+    colunas = []
+    insert = _RE_INSERT.search(texto)
+    colunas_insert = [c.strip().lower() for c in insert.group(1).split(",")] if insert else []
+    for m in _RE_PLACEHOLDER.finditer(texto):
+        if m.group(1):
+            continue
+        if insert and m.start() > insert.end() - 1 and len(colunas) < len(colunas_insert):
+            colunas.append(colunas_insert[len(colunas)])
+            continue
+        anterior = _RE_COLUNA_ANTES.search(texto[:m.start()])
+        colunas.append(anterior.group(1).lower() if anterior else None)
+    return colunas
+
+def mascarar_parametros(texto, params):
+    """Parâmetros prontos para o log, com senha/cpf substituídos por ***"""
+    if params is None:
+        return None
+    if isinstance(params, dict):
+        return {k: MASCARA if k.lower() in COLUNAS_SENSIVEIS else _serializavel(v) for k, v in params.items()}
+    # Sem saber a coluna de um parâmetro, um comando que cita coluna sensível é mascarado por inteiro
+    cita_sensivel = any(re.search(rf"\b{c}\b", texto, re.IGNORECASE) for c in COLUNAS_SENSIVEIS)
+    colunas = _colunas_dos_parametros(texto)
+    resultado = []
+    for i, valor in enumerate(params):
+        coluna = colunas[i] if i < len(colunas) else None
+        if coluna in COLUNAS_SENSIVEIS or (coluna is None and cita_sensivel):
+            resultado.append(MASCARA)
+        else:
+            resultado.append(_serializavel(valor))
+    return resultado
+
+def _serializavel(valor):
+    if valor is None or isinstance(valor, (bool, int, float, str)):
+        return valor
+    if isinstance(valor, (list, tuple)):
+        # Arrays de lote podem ter milhares de itens: o log guarda só o começo
+        return [_serializavel(v) for v in valor[:20]] + (["..."] if len(valor) > 20 else [])
+    return str(valor)
+
+async def _capturar_plano(conn, query, params):
+    """EXPLAIN do comando no mesmo contexto de transação, isolado em um savepoint"""
+    texto = query.as_string(conn) if isinstance(query, sql.Composable) else query
+    comando = texto.split(None, 1)[0].upper() if texto.strip() else ""
+    if comando not in ("SELECT", "WITH", "INSERT", "UPDATE", "DELETE"):
+        return None
+    # Comandos de escrita não são reexecutados: para eles só o plano estimado
+    somente_leitura = comando == "SELECT" or (
+        comando == "WITH" and not re.search(r"\b(INSERT|UPDATE|DELETE)\b", texto, re.IGNORECASE))
+    prefixo = "EXPLAIN (ANALYZE, BUFFERS) " if somente_leitura else "EXPLAIN "
+    explain = sql.SQL(prefixo) + query if isinstance(query, sql.Composable) else prefixo + query
+    try:
+        async with conn.transaction():
+            # Cursor base (não instrumentado) para não medir nem registrar o próprio EXPLAIN
+            async with psycopg.AsyncCursor(conn) as cur:
+                await cur.execute(explain, params)
+                return "\n".join(linha[0] for linha in await cur.fetchall())
+    except psycopg.Error as e:
+        return f"(plano indisponível: {e})"
+
+async def registrar(conn, query, params, duracao, linhas, rota):
+    """Registra um comando lento no arquivo de log e no resumo em memória"""
+    texto = normalizar(query.as_string(conn) if isinstance(query, sql.Composable) else query)
+    plano = None
+    if random.random() < CONSULTAS_LENTAS_AMOSTRA_EXPLAIN:
+        plano = await _capturar_plano(conn, query, params)
+
+    registro = {
+        "momento": datetime.now().isoformat(timespec="milliseconds"),
+        "rota": rota,
+        "duracao_ms": round(duracao * 1000, 2),
+        "linhas": linhas,
+        "sql": texto,
+        "parametros": mascarar_parametros(texto, params),
+        "plano": plano
+    }
+    _obter_logger().info(json.dumps(registro, ensure_ascii=False))
+    _acumular(texto, rota, duracao, plano)
+
+def _acumular(texto, rota, duracao, plano):
+    item = _resumo.get(texto)
+    if item is None:
+        if len(_resumo) >= MAX_COMANDOS_RESUMO:
+            # Descarta o comando com menor tempo total para manter o resumo limitado
+            menor = min(_resumo, key=lambda k: _resumo[k]["tempo_total"])
+            del _resumo[menor]
+        item = _resumo[texto] = {"sql": texto, "ocorrencias": 0, "tempo_total": 0.0, "tempo_max": 0.0,
+                                 "rotas": set(), "ultimo_plano": None, "ultima_ocorrencia": None}
+    item["ocorrencias"] += 1
+    item["tempo_total"] += duracao
+    item["tempo_max"] = max(item["tempo_max"], duracao)
+    # Comandos disparados fora de uma requisição (ex.: gravador da gravação agrupada) ficam sem rota
+    item["rotas"].add(rota if rota is not None else "(fora de requisição)")
+    item["ultima_ocorrencia"] = time.time()
+    if plano is not None:
+        item["ultimo_plano"] = plano
+
+def piores_comandos(limite=10, ordenar_por="tempo_total"):
+    """Comandos lentos agregados, do pior para o melhor"""
+    itens = sorted(_resumo.values(), key=lambda i: i[ordenar_por], reverse=True)[:limite]
+    return [{
+        "sql": i["sql"],
+        "ocorrencias": i["ocorrencias"],
+        "tempo_total_ms": round(i["tempo_total"] * 1000, 2),
+        "tempo_medio_ms": round(i["tempo_total"] / i["ocorrencias"] * 1000, 2),
+        "tempo_max_ms": round(i["tempo_max"] * 1000, 2),
+        "rotas": sorted(i["rotas"]),
+        "ultima_ocorrencia": datetime.fromtimestamp(i["ultima_ocorrencia"]).isoformat(timespec="seconds"),
+        "ultimo_plano": i["ultimo_plano"]
+    } for i in itens]
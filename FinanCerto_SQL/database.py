@@ -0,0 +1,285 @@
+# Camada de acesso ao banco de dados
+# Pool de conexões assíncrono (psycopg 3) compartilhado por todos os CRUDs,
+# criado na inicialização da API (main.py)
+#
+# Réplicas de leitura (DATABASE_REPLICAS_URLS): cada uma ganha um pool próprio e os handlers
+# só de leitura pedem get_connection(somente_leitura=True, id_usuario=...). A leitura vai para o
+# primário quando nenhuma réplica está com atraso abaixo de REPLICA_ATRASO_MAX_SEGUNDOS ou quando
+# o mesmo usuário escreveu há pouco (registrar_escrita), para ele sempre ler o que acabou de gravar.
+# As escritas recentes ficam na memória do processo: com vários workers a garantia vale para as
+# requisições atendidas pelo mesmo worker, e nos demais o limite de atraso continua valendo.
+
+import asyncio
+import itertools
+import time
+from contextlib import asynccontextmanager
+from fastapi import HTTPException
+import psycopg
+from psycopg.pq import TransactionStatus
+from psycopg_pool import AsyncConnectionPool
+from config import (DATABASE_URL, DB_POOL_MIN, DB_POOL_MAX, DB_PREPARE_THRESHOLD, DB_PREPARED_MAX,
+                    DATABASE_REPLICAS_URLS, REPLICA_ATRASO_MAX_SEGUNDOS, REPLICA_VERIFICACAO_SEGUNDOS,
+                    REPLICA_TIMEOUT_CONEXAO, PARTICOES_ANOS_FUTUROS)
+from metricas import registrar_consulta, registrar_espera_conexao, rota_atual
+import consultas_lentas
+
+_pool = None
+_replicas = []             # pools das réplicas, na ordem de DATABASE_REPLICAS_URLS
+_atraso_replicas = []      # último atraso medido de cada réplica em segundos (None = fora do ar)
+_escritas_recentes = {}    # id_usuario -> time.monotonic() da última escrita
+_proxima_replica = itertools.count()
+_monitor = None
+# Depois de escrever, o usuário lê do primário até a escrita com certeza estar em uma réplica aceita
+JANELA_LEITURA_PROPRIA = REPLICA_ATRASO_MAX_SEGUNDOS + REPLICA_VERIFICACAO_SEGUNDOS
+estatisticas_leituras = {"replica": 0, "primario": 0}
+
+class CursorInstrumentado(psycopg.AsyncCursor):
+    """Cursor que informa às métricas o tempo e as linhas de cada comando SQL e registra os lentos"""
+
+    async def execute(self, query, params=None, **kwargs):
+        # Comando vazio é o health-check do pool: já entra no tempo de espera por conexão
+        if query == "":
+            return await super().execute(query, params, **kwargs)
+        inicio = time.perf_counter()
+        inicio_transacao = self.connection.info.transaction_status == TransactionStatus.IDLE
+        try:
+            try:
+                await super().execute(query, params, **kwargs)
+            except psycopg.errors.FeatureNotSupported as e:
+                # Esquema alterado por outro processo (ex.: migrar.py) mudou o resultado de um
+                # prepared statement. O rollback limpa o cache da conexão; se o comando abria a
+                # transação nada se perde e ele é repetido, senão o erro segue para o handler
+                if "cached plan must not change result type" not in str(e):
+                    raise
+                await self.connection.rollback()
+                if not inicio_transacao:
+                    raise
+                await super().execute(query, params, **kwargs)
+        finally:
+            duracao = time.perf_counter() - inicio
+            registrar_consulta(duracao, self.rowcount)
+        if duracao >= consultas_lentas.LIMITE_SEGUNDOS:
+            await consultas_lentas.registrar(self.connection, query, params, duracao, self.rowcount, rota_atual())
+        return self
+
+    async def executemany(self, query, params_seq, **kwargs):
+        inicio = time.perf_counter()
+        try:
+            return await super().executemany(query, params_seq, **kwargs)
+        finally:
+            registrar_consulta(time.perf_counter() - inicio, self.rowcount)
+
+class CursorServidorInstrumentado(psycopg.AsyncServerCursor):
+    """Cursor nomeado (exportações): mede só o DECLARE, as linhas chegam aos poucos"""
+
+    async def execute(self, query, params=None, **kwargs):
+        inicio = time.perf_counter()
+        try:
+            return await super().execute(query, params, **kwargs)
+        finally:
+            registrar_consulta(time.perf_counter() - inicio, 0)
+
+async def _configurar_conexao(conn):
+    # Cache de prepared statements por conexão (psycopg 3): um comando é preparado no servidor
+    # depois de DB_PREPARE_THRESHOLD execuções com o mesmo texto, ou já na primeira com prepare=True
+    conn.prepare_threshold = DB_PREPARE_THRESHOLD
+    conn.prepared_max = DB_PREPARED_MAX
+    conn.cursor_factory = CursorInstrumentado
+    conn.server_cursor_factory = CursorServidorInstrumentado
+
+async def _configurar_conexao_replica(conn):
+    await _configurar_conexao(conn)
+    # Também identifica a conexão como de réplica (ver buscar)
+    await conn.set_read_only(True)
+
+def _criar_pool(url, configurar):
+    return AsyncConnectionPool(
+        url,
+        min_size=DB_POOL_MIN,
+        max_size=DB_POOL_MAX,
+        # Health-check a cada retirada: conexões quebradas são descartadas e substituídas
+        check=AsyncConnectionPool.check_connection,
+        configure=configurar,
+        open=False
+    )
+
+async def iniciar_pool():
+    """Cria e abre o pool de conexões (chamado uma única vez no startup da API)"""
+    global _pool, _monitor
+    if _pool is None:
+        _pool = _criar_pool(DATABASE_URL, _configurar_conexao)
+        await _pool.open(wait=True)
+        if DATABASE_REPLICAS_URLS:
+            # Réplica fora do ar não impede o startup: só recebe leituras depois de medida
+            _replicas.extend(_criar_pool(url, _configurar_conexao_replica) for url in DATABASE_REPLICAS_URLS)
+            _atraso_replicas.extend(None for _ in _replicas)
+            for pool in _replicas:
+                await pool.open(wait=False)
+            await _medir_atrasos()
+            _monitor = asyncio.create_task(_monitorar_replicas())
+    return _pool
+
+async def _medir_atraso(pool, lsn_primario):
+    """0 se a réplica já aplicou tudo que o primário tinha, senão há quanto tempo ela aplicou a última transação"""
+    try:
+        async with pool.connection(timeout=REPLICA_TIMEOUT_CONEXAO) as conn:
+            cur = await conn.execute(
+                """SELECT pg_last_wal_replay_lsn() >= %s::pg_lsn,
+                          EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp())""",
+                (lsn_primario,)
+            )
+            em_dia, atraso = await cur.fetchone()
+    except Exception:
+        return None
+    if em_dia:
+        return 0.0
+    return float(atraso) if atraso is not None else None
+
+async def _medir_atrasos():
+    async with _pool.connection() as conn:
+        cur = await conn.execute("SELECT pg_current_wal_lsn()::text")
+        lsn_primario = (await cur.fetchone())[0]
+    _atraso_replicas[:] = await asyncio.gather(*(_medir_atraso(pool, lsn_primario) for pool in _replicas))
+
+async def _monitorar_replicas():
+    while True:
+        await asyncio.sleep(REPLICA_VERIFICACAO_SEGUNDOS)
+        try:
+            await _medir_atrasos()
+        except Exception:
+            # Sem o primário não há referência: nenhuma réplica é usada até a próxima medição
+            _atraso_replicas[:] = [None] * len(_replicas)
+        limite = time.monotonic() - JANELA_LEITURA_PROPRIA
+        for id_usuario in [u for u, instante in _escritas_recentes.items() if instante < limite]:
+            del _escritas_recentes[id_usuario]
+
+def registrar_escrita(*ids_usuario):
+    """Marca usuários que acabaram de ter dados gravados: as leituras deles ficam no primário por um tempo"""
+    agora = time.monotonic()
+    for id_usuario in ids_usuario:
+        if id_usuario is not None:
+            _escritas_recentes[id_usuario] = agora
+
+def escrita_recente(*ids_usuario):
+    """Algum dos usuários escreveu dentro da janela em que as réplicas podem não ter a escrita"""
+    limite = time.monotonic() - JANELA_LEITURA_PROPRIA
+    return any(_escritas_recentes.get(id_usuario, limite) > limite for id_usuario in ids_usuario)
+
+def _pool_leitura(id_usuario):
+    """Réplica em dia para a leitura (rodízio entre as aceitas) ou None para usar o primário"""
+    if id_usuario is not None and escrita_recente(id_usuario):
+        return None
+    aceitas = [pool for pool, atraso in zip(_replicas, _atraso_replicas)
+               if atraso is not None and atraso <= REPLICA_ATRASO_MAX_SEGUNDOS]
+    if not aceitas:
+        return None
+    return aceitas[next(_proxima_replica) % len(aceitas)]
+
+async def aquecer_pool():
+    """Garante DB_POOL_MIN conexões abertas e já usadas antes de o worker receber tráfego"""
+    pool = await iniciar_pool()
+
+    async def usar_conexao():
+        async with get_connection() as conn:
+            await conn.execute("SELECT 1")
+
+    # Retiradas simultâneas: cada uma pega uma conexão diferente
+    await asyncio.gather(*(usar_conexao() for _ in range(pool.min_size)))
+
+async def criar_particoes_futuras():
+    """Partições dos próximos anos de Transacao e Venda (sem efeito antes do particionar.py)"""
+    async with get_connection() as conn:
+        cur = await conn.execute("SELECT to_regprocedure('fn_criar_particoes_futuras(integer)') IS NOT NULL")
+        if (await cur.fetchone())[0]:
+            await conn.execute("SELECT fn_Criar_Particoes_Futuras(%s)", (PARTICOES_ANOS_FUTUROS,))
+        await conn.commit()
+
+async def fechar_pool():
+    """Fecha todas as conexões do pool (chamado no shutdown da API)"""
+    global _pool, _monitor
+    if _monitor is not None:
+        _monitor.cancel()
+        _monitor = None
+    for pool in _replicas:
+        await pool.close()
+    _replicas.clear()
+    _atraso_replicas.clear()
+    if _pool is not None:
+        await _pool.close()
+        _pool = None
+
+@asynccontextmanager
+async def get_connection(somente_leitura=False, id_usuario=None):
+    """Empresta uma conexão do pool e a devolve ao final, mesmo se o handler lançar exceção.
+    `somente_leitura`: pode ser atendida por uma réplica; `id_usuario`: dono dos dados lidos,
+    para a leitura voltar ao primário logo depois de uma escrita dele."""
+    try:
+        pool = await iniciar_pool()
+        inicio = time.perf_counter()
+        replica = _pool_leitura(id_usuario) if somente_leitura and _replicas else None
+        conn = None
+        if replica is not None:
+            try:
+                conn = await replica.getconn(timeout=REPLICA_TIMEOUT_CONEXAO)
+                pool = replica
+            except Exception:
+                # Réplica sem conexão disponível: sai do rodízio até a próxima medição
+                _atraso_replicas[_replicas.index(replica)] = None
+        if conn is None:
+            conn = await pool.getconn()
+        if somente_leitura:
+            estatisticas_leituras["replica" if pool is not _pool else "primario"] += 1
+        registrar_espera_conexao(time.perf_counter() - inicio)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Erro na conexão com o banco: {str(e)}")
+    try:
+        yield conn
+    except BaseException:
+        # Handler falhou: transação não finalizada é desfeita antes de devolver a conexão
+        await _encerrar_transacao(conn, confirmar=False)
+        raise
+    else:
+        # Os CRUDs confirmam as escritas explicitamente; o que sobra aberto aqui são leituras.
+        # Elas terminam com COMMIT (equivalente para leitura) porque o ROLLBACK faz o psycopg
+        # descartar os prepared statements da conexão
+        await _encerrar_transacao(conn, confirmar=True)
+    finally:
+        await pool.putconn(conn)
+
+async def _encerrar_transacao(conn, confirmar):
+    if conn.closed:
+        return
+    status = conn.info.transaction_status
+    if status == TransactionStatus.IDLE:
+        return
+    try:
+        if confirmar and status == TransactionStatus.INTRANS:
+            await conn.commit()
+        else:
+            await conn.rollback()
+    except psycopg.Error:
+        pass
+
+async def buscar(query, params, prepare=None, todos=False):
+    """Leitura por chave (fetchone, ou fetchall com `todos`) em uma réplica. Sem resultado na réplica,
+    confirma no primário: o registro pode ter acabado de ser criado e ainda não ter chegado lá."""
+    async with get_connection(somente_leitura=True) as conn, conn.cursor() as cur:
+        await cur.execute(query, params, prepare=prepare)
+        resultado = await (cur.fetchall() if todos else cur.fetchone())
+        # Conexões de réplica são read-only (ver _configurar_conexao_replica)
+        da_replica = conn.read_only
+    if resultado or not da_replica:
+        return resultado
+    async with get_connection() as conn, conn.cursor() as cur:
+        await cur.execute(query, params, prepare=prepare)
+        return await (cur.fetchall() if todos else cur.fetchone())
+
+def estatisticas_pool():
+    """Situação atual do pool (conexões abertas, livres e requisições esperando)"""
+    if _pool is None:
+        return {}
+    return _pool.get_stats()
+
+def estatisticas_replicas():
+    """Atraso de cada réplica e leituras atendidas por réplica/primário"""
+    return {"atrasos": list(_atraso_replicas), "leituras": dict(estatisticas_leituras)}
@@ -0,0 +1,101 @@
+# Atualização parcial (PATCH) e exclusão (DELETE) compartilhadas pelos Crud_*
+# O PATCH é um único comando SQL: a existência do registro, as restrições informadas e o UPDATE
+# acontecem juntos, sem a janela entre um SELECT de verificação e a escrita, e a linha resultante
+# volta via RETURNING. O DELETE também, exceto pelas linhas dependentes, removidas antes.
+
+import psycopg
+from psycopg import sql
+from fastapi import HTTPException
+
+def _colunas(modelo):
+    return list(modelo.model_fields)
+
+async def atualizar_parcial(conn, tabela, chave, id_registro, valores, editaveis, modelo,
+                            nao_encontrado, restricoes=None):
+    """UPDATE de `valores` (só colunas em `editaveis`) e retorno da linha no formato de `modelo`.
+    `restricoes`: {coluna: (valor esperado no registro atual, mensagem de 400)}"""
+    if not valores:
+        raise HTTPException(400, "Nenhum campo informado para atualização")
+    invalidos = set(valores) - set(editaveis)
+    if invalidos:
+        raise HTTPException(400, f"Campos não editáveis: {', '.join(sorted(invalidos))}")
+
+    # Restrições sobre o registro atual (ex.: dono): verdadeiras se ele não existir, para o 404 prevalecer
+    restricoes = list((restricoes or {}).items())
+    verificacoes = [sql.SQL("NOT EXISTS (SELECT 1 FROM {t} WHERE {k} = %(_id)s AND {c} IS DISTINCT FROM {v}) AS {n}").format(
+        t=sql.Identifier(tabela), k=sql.Identifier(chave), c=sql.Identifier(coluna),
+        v=sql.Placeholder(f"_r_{coluna}"), n=sql.Identifier(f"_ok_r_{coluna}"))
+        for coluna, _ in restricoes]
+    nomes_verificacoes = [f"_ok_r_{coluna}" for coluna, _ in restricoes]
+    mensagens = [(400, mensagem) for _, (_, mensagem) in restricoes]
+    condicao = sql.SQL(" AND ").join(
+        [sql.SQL("(SELECT {} FROM validacao)").format(sql.Identifier(nome)) for nome in nomes_verificacoes]
+        or [sql.SQL("true")])
+
+    comando = sql.SQL(
+        """WITH validacao AS (
+               SELECT EXISTS (SELECT 1 FROM {tabela} WHERE {chave} = %(_id)s) AS _existe{verificacoes}
+           ),
+           atualizada AS (
+               UPDATE {tabela} SET {atribuicoes}
+               WHERE {chave} = %(_id)s AND {condicao}
+               RETURNING true AS _atualizada, {retorno}
+           )
+           SELECT validacao.*, atualizada.* FROM validacao LEFT JOIN atualizada ON true"""
+    ).format(
+        tabela=sql.Identifier(tabela),
+        chave=sql.Identifier(chave),
+        verificacoes=sql.SQL("").join(sql.SQL(", ") + v for v in verificacoes),
+        atribuicoes=sql.SQL(", ").join(
+            sql.SQL("{} = {}").format(sql.Identifier(c), sql.Placeholder(c)) for c in valores),
+        condicao=condicao,
+        retorno=sql.SQL(", ").join(map(sql.Identifier, _colunas(modelo)))
+    )
+
+    async with conn.cursor() as cur:
+        try:
+            await cur.execute(comando, {**valores, "_id": id_registro,
+                                        **{f"_r_{coluna}": valor for coluna, (valor, _) in restricoes}})
+            row = await cur.fetchone()
+            await conn.commit()
+        except psycopg.Error as e:
+            await conn.rollback()
+            raise HTTPException(400, f"Erro ao atualizar: {e}")
+
+    existe, *oks = row[:1 + len(mensagens)]
+    atualizada = row[1 + len(mensagens):]
+    if not existe:
+        raise HTTPException(404, nao_encontrado)
+    for ok, (status, mensagem) in zip(oks, mensagens):
+        if not ok:
+            raise HTTPException(status, mensagem)
+    if atualizada[0] is None:
+        # Removido por outra transação entre a leitura e o UPDATE
+        raise HTTPException(404, nao_encontrado)
+    return dict(zip(_colunas(modelo), atualizada[1:]))
+
+async def deletar(conn, tabela, chave, id_registro, nao_encontrado, dependentes=()):
+    """DELETE do registro, antes das linhas em `dependentes` ([(tabela, coluna)]), na mesma transação.
+    Cada tabela em seu comando: triggers das dependentes ainda enxergam o registro principal.
+    Retorna o id_usuario dono do registro; 404 se nada foi removido."""
+    comandos = [sql.SQL("DELETE FROM {} WHERE {} = %(_id)s").format(sql.Identifier(t), sql.Identifier(c))
+                for t, c in dependentes]
+    comando = sql.SQL("DELETE FROM {tabela} WHERE {chave} = %(_id)s RETURNING id_usuario").format(
+        tabela=sql.Identifier(tabela),
+        chave=sql.Identifier(chave)
+    )
+
+    async with conn.cursor() as cur:
+        try:
+            for comando_dependente in comandos:
+                await cur.execute(comando_dependente, {"_id": id_registro})
+            await cur.execute(comando, {"_id": id_registro})
+            row = await cur.fetchone()
+        except psycopg.Error as e:
+            await conn.rollback()
+            raise HTTPException(400, f"Erro ao deletar: {e}")
+        if row is None:
+            await conn.rollback()
+            raise HTTPException(404, nao_encontrado)
+        await conn.commit()
+    return row[0]
@@ -0,0 +1,85 @@
+# Exportação em streaming (CSV / NDJSON) a partir de cursores nomeados do servidor
+# As linhas são buscadas em lotes de TAMANHO_LOTE e enviadas ao cliente em pedaços,
+# então o uso de memória é constante independente de quantas linhas são exportadas.
+# A conexão do pool fica emprestada enquanto a resposta está sendo enviada.
+
+import csv
+import io
+import json
+import uuid
+from datetime import date
+from decimal import Decimal
+from fastapi import HTTPException
+from fastapi.responses import StreamingResponse
+from database import get_connection
+
+TAMANHO_LOTE = 2000      # linhas por FETCH do cursor nomeado
+LINHAS_POR_PEDACO = 500  # linhas por pedaço enviado na resposta
+
+FORMATOS = {
+    "csv": "text/csv; charset=utf-8",
+    "ndjson": "application/x-ndjson"
+}
+
+async def consultar_em_streaming(sql, params, id_usuario=None):
+    """Executa a consulta em um cursor do servidor (em uma réplica, se houver) e devolve as linhas aos poucos"""
+    async with get_connection(somente_leitura=True, id_usuario=id_usuario) as conn:
+        async with conn.cursor(name=f"exportacao_{uuid.uuid4().hex}") as cur:
+            cur.itersize = TAMANHO_LOTE
+            await cur.execute(sql, params)
+            async for row in cur:
+                yield row
+
+def _valor_json(valor):
+    # Decimal vira string para não perder precisão
+    if isinstance(valor, Decimal):
+        return str(valor)
+    if isinstance(valor, date):
+        return valor.isoformat()
+    raise TypeError(f"Tipo não serializável: {type(valor).__name__}")
+
+async def _gerar_csv(colunas, registros):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(colunas)
+    n = 0
+    async for registro in registros:
+        writer.writerow([registro[c] for c in colunas])
+        n += 1
+        if n % LINHAS_POR_PEDACO == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+async def _gerar_ndjson(registros):
+    pedaco = []
+    async for registro in registros:
+        pedaco.append(json.dumps(registro, default=_valor_json, ensure_ascii=False))
+        if len(pedaco) == LINHAS_POR_PEDACO:
+            yield "\n".join(pedaco) + "\n"
+            pedaco = []
+    if pedaco:
+        yield "\n".join(pedaco) + "\n"
+
+def resposta_exportacao(formato, nome_arquivo, colunas_csv, registros):
+    """Monta a StreamingResponse no formato pedido; `registros` é um gerador assíncrono de dicts"""
+    if formato not in FORMATOS:
+        raise HTTPException(400, "Formato deve ser 'csv' ou 'ndjson'")
+    corpo = _gerar_csv(colunas_csv, registros) if formato == "csv" else _gerar_ndjson(registros)
+    return StreamingResponse(
+        corpo,
+        media_type=FORMATOS[formato],
+        headers={"Content-Disposition": f'attachment; filename="{nome_arquivo}.{formato}"'}
+    )
+
+def filtro_periodo(coluna, de, ate):
+    """Condições de intervalo de datas (sem OR/COALESCE, para o índice ser usado)"""
+    condicoes, params = [], []
+    if de is not None:
+        condicoes.append(f"{coluna} >= %s")
+        params.append(de)
+    if ate is not None:
+        condicoes.append(f"{coluna} <= %s")
+        params.append(ate)
+    return "".join(f" AND {c}" for c in condicoes), params
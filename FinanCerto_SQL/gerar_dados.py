@@ -0,0 +1,232 @@
+# Gerador de massa de dados sintética (substitui o PovoandoSistema.sql para testes de desempenho)
+#
+# Gera N usuários com distribuições realistas: número de transações por usuário com cauda longa
+# (poucos usuários concentram a maior parte do volume), categorias de Entrada/Saída, catálogos de
+# produtos e vendas com cestas de vários itens. Os dados são carregados com COPY, em paralelo
+# por faixas de usuários quando --workers > 1.
+#
+# A saída é determinística para a mesma --seed (e o mesmo estado inicial do banco): cada usuário
+# tem seu próprio gerador aleatório e faixas de ids reservadas antes da carga, então o resultado
+# não depende do número de workers nem da ordem em que terminam.
+#
+# Uso (a partir de FinanCerto_SQL/):
+#     python gerar_dados.py --usuarios 10000 --seed 42 --limpar
+#     python gerar_dados.py --usuarios 1000000 --workers 8 --transacoes-media 300
+
+import argparse
+import random
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date, timedelta
+from decimal import Decimal
+import psycopg
+from config import DATABASE_URL
+
+NOMES = ["Ana", "Bruno", "Carla", "Daniel", "Eduarda", "Fábio", "Gabriela", "Heitor", "Isabela", "João",
+         "Karina", "Lucas", "Marina", "Nicolas", "Olívia", "Pedro", "Queila", "Rafael", "Sofia", "Tiago"]
+SOBRENOMES = ["Silva", "Costa", "Dias", "Martins", "Lima", "Pereira", "Souza", "Alves", "Rocha", "Mendes",
+              "Ferreira", "Gomes", "Ribeiro", "Carvalho", "Araújo"]
+NEGOCIOS = ["Doces", "Artesanato", "Consultoria", "Entregas", "Modas", "Reparos", "Design", "Gráfica", "Bijoux", "Serviços"]
+CATEGORIAS_ENTRADA = ["Receita de Vendas", "Venda de Serviços", "Salário", "Rendimentos", "Reembolsos"]
+CATEGORIAS_SAIDA = ["Aluguel", "Fornecedores", "Marketing", "Contas de Consumo", "Transporte", "Impostos",
+                    "Alimentação", "Manutenção", "Assinaturas"]
+PRODUTOS = ["Bolo de Pote", "Brigadeiro", "Colar", "Pulseira", "Camiseta", "Vestido", "Caneca", "Cartão de Visita",
+            "Banner", "Kit Presente", "Salgado", "Torta", "Chaveiro", "Quadro", "Agenda"]
+METODOS_PAGAMENTO = ["Pix", "Dinheiro", "Cartão de Crédito", "Cartão de Débito"]
+
+# Tabelas com ids pré-reservados (tabela, coluna)
+SEQUENCIAS = [("usuario", "id_usuario"), ("categoriatransacao", "id_categoria"), ("transacao", "id_transacao"),
+              ("produto", "id_produto"), ("venda", "id_venda")]
+
+def planejar_usuario(seed, i, parametros):
+    """Quantidades de cada entidade do usuário i (gerador separado do usado para os dados)"""
+    rng = random.Random(f"plano:{seed}:{i}")
+    # Pareto(1.2) tem média 6: normalizado para média 1 e limitado a 100x a média
+    peso = min(rng.paretovariate(1.2) / 6, 100)
+    n_categorias = rng.randint(3, 8)
+    n_transacoes = int(parametros["transacoes_media"] * peso)
+    tem_negocio = rng.random() < parametros["fracao_com_negocio"]
+    n_produtos = rng.randint(3, 40) if tem_negocio else 0
+    n_vendas = int(parametros["vendas_media"] * peso / parametros["fracao_com_negocio"]) if tem_negocio else 0
+    return n_categorias, n_transacoes, n_produtos, n_vendas
+
+def _dinheiro(valor):
+    return Decimal(f"{min(valor, 99_999_999.99):.2f}")
+
+def _geometrica(rng, p, maximo):
+    n = 1
+    while n < maximo and rng.random() > p:
+        n += 1
+    return n
+
+def gerar_faixa(tarefa):
+    """Worker: gera e carrega com COPY os dados de uma faixa contígua de usuários"""
+    seed, primeiro, ultimo, ids, parametros = tarefa
+    id_categoria, id_transacao, id_produto, id_venda = ids
+    inicio = date.fromisoformat(parametros["de"])
+    dias = (date.fromisoformat(parametros["ate"]) - inicio).days
+
+    categorias, transacoes, produtos, vendas, itens = [], [], [], [], []
+    for i in range(primeiro, ultimo):
+        id_usuario = parametros["base_usuario"] + i + 1
+        n_categorias, n_transacoes, n_produtos, n_vendas = planejar_usuario(seed, i, parametros)
+        rng = random.Random(f"dados:{seed}:{i}")
+
+        # Categorias: cerca de 1/3 de Entrada, o resto de Saída
+        n_entrada = max(1, round(n_categorias * 0.35))
+        entradas, saidas = [], []
+        for k in range(n_categorias):
+            tipo = "Entrada" if k < n_entrada else "Saida"
+            nome = rng.choice(CATEGORIAS_ENTRADA if tipo == "Entrada" else CATEGORIAS_SAIDA)
+            categorias.append((id_categoria, nome, tipo, id_usuario))
+            (entradas if tipo == "Entrada" else saidas).append(id_categoria)
+            id_categoria += 1
+
+        # Transações: 30% entradas (valores maiores), 70% saídas
+        for _ in range(n_transacoes):
+            if rng.random() < 0.3:
+                categoria, valor, descricao = rng.choice(entradas), rng.lognormvariate(6.5, 1.0), "Recebimento"
+            else:
+                categoria, valor, descricao = rng.choice(saidas), rng.lognormvariate(4.8, 1.1), "Pagamento"
+            data = inicio + timedelta(days=rng.randint(0, dias))
+            transacoes.append((id_transacao, data, f"{descricao} {id_transacao}", _dinheiro(valor), id_usuario, categoria))
+            id_transacao += 1
+
+        # Catálogo de produtos; a popularidade segue uma lei de Zipf dentro do catálogo
+        catalogo = []
+        for k in range(n_produtos):
+            custo = rng.lognormvariate(2.5, 0.8)
+            preco = custo * rng.uniform(1.2, 2.5)
+            produtos.append((id_produto, f"{rng.choice(PRODUTOS)} {k + 1}", _dinheiro(custo), _dinheiro(preco), id_usuario))
+            catalogo.append((id_produto, _dinheiro(preco)))
+            id_produto += 1
+        pesos = [1 / (k + 1) for k in range(n_produtos)]
+
+        # Vendas com cestas de 1 a 6 itens distintos
+        for _ in range(n_vendas):
+            tamanho = _geometrica(rng, 0.45, min(6, n_produtos))
+            escolhidos = set()
+            while len(escolhidos) < tamanho:
+                escolhidos.add(rng.choices(range(n_produtos), pesos)[0])
+            total = Decimal("0")
+            for k in sorted(escolhidos):
+                produto, preco = catalogo[k]
+                if rng.random() < 0.1:
+                    preco = _dinheiro(float(preco) * 0.9)
+                quantidade = _geometrica(rng, 0.5, 20)
+                itens.append((id_venda, produto, quantidade, preco))
+                total += quantidade * preco
+            data = inicio + timedelta(days=rng.randint(0, dias))
+            vendas.append((id_venda, data, total, rng.choice(METODOS_PAGAMENTO), id_usuario))
+            id_venda += 1
+
+    with psycopg.connect(DATABASE_URL) as conn:
+        with conn.cursor() as cur:
+            for tabela, colunas, linhas in [
+                ("categoriatransacao", "id_categoria, nome_categoria, tipo_categoria, id_usuario", categorias),
+                ("produto", "id_produto, nome_produto, preco_custo, preco_venda, id_usuario", produtos),
+                ("transacao", "id_transacao, data_transacao, descricao, valor, id_usuario, id_categoria", transacoes),
+                ("venda", "id_venda, data_venda, valor_total_venda, metodo_pagamento, id_usuario", vendas),
+                ("venda_produto", "id_venda, id_produto, quantidade, preco_unitario_venda", itens),
+            ]:
+                with cur.copy(f"COPY {tabela} ({colunas}) FROM STDIN") as copy:
+                    for linha in linhas:
+                        copy.write_row(linha)
+    return ultimo - primeiro, len(transacoes), len(vendas)
+
+def carregar_usuarios(conn, seed, n, base_usuario):
+    rng = random.Random(f"usuarios:{seed}")
+    with conn.cursor() as cur:
+        with cur.copy("COPY usuario (id_usuario, nome_usuario, email, senha) FROM STDIN") as copy:
+            for i in range(n):
+                id_usuario = base_usuario + i + 1
+                copy.write_row((id_usuario, f"{rng.choice(NOMES)} {rng.choice(SOBRENOMES)}",
+                                f"usuario{id_usuario}@gerado.financerto", "senha123"))
+        with cur.copy("COPY detalhesusuario (id_usuario, data_nascimento, telefone_contato, cpf, nome_negocio) FROM STDIN") as copy:
+            for i in range(n):
+                id_usuario = base_usuario + i + 1
+                nascimento = date(1950, 1, 1) + timedelta(days=rng.randint(0, 365 * 55))
+                cpf = f"{id_usuario:011d}"
+                copy.write_row((id_usuario, nascimento, f"(11) 9{rng.randint(1000, 9999)}-{rng.randint(1000, 9999)}",
+                                f"{cpf[:3]}.{cpf[3:6]}.{cpf[6:9]}-{cpf[9:]}",
+                                f"{rng.choice(NOMES)} {rng.choice(NEGOCIOS)}"))
+
+def main():
+    parser = argparse.ArgumentParser(description="Gerador de massa de dados sintética do FinanCerto")
+    parser.add_argument("--usuarios", type=int, default=1000)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--transacoes-media", type=float, default=200, help="média de transações por usuário")
+    parser.add_argument("--vendas-media", type=float, default=60, help="média de vendas por usuário")
+    parser.add_argument("--fracao-com-negocio", type=float, default=0.6, help="fração de usuários com produtos/vendas")
+    parser.add_argument("--de", default="2021-01-01", help="data inicial das transações/vendas")
+    parser.add_argument("--ate", default="2024-12-31", help="data final das transações/vendas")
+    parser.add_argument("--workers", type=int, default=1, help="processos de carga em paralelo")
+    parser.add_argument("--usuarios-por-lote", type=int, default=500)
+    parser.add_argument("--limpar", action="store_true", help="apaga todos os dados antes de gerar (ids recomeçam em 1)")
+    args = parser.parse_args()
+
+    inicio = time.perf_counter()
+    parametros = {
+        "transacoes_media": args.transacoes_media,
+        "vendas_media": args.vendas_media,
+        "fracao_com_negocio": args.fracao_com_negocio,
+        "de": args.de,
+        "ate": args.ate
+    }
+
+    with psycopg.connect(DATABASE_URL) as conn:
+        if args.limpar:
+            conn.execute("TRUNCATE usuario RESTART IDENTITY CASCADE")
+        bases = {tabela: conn.execute(f"SELECT COALESCE(MAX({coluna}), 0) FROM {tabela}").fetchone()[0]
+                 for tabela, coluna in SEQUENCIAS}
+        parametros["base_usuario"] = bases["usuario"]
+
+        # Planeja todos os usuários para reservar as faixas de ids de cada lote
+        tarefas = []
+        proximo = [bases["categoriatransacao"] + 1, bases["transacao"] + 1, bases["produto"] + 1, bases["venda"] + 1]
+        for primeiro in range(0, args.usuarios, args.usuarios_por_lote):
+            ultimo = min(primeiro + args.usuarios_por_lote, args.usuarios)
+            tarefas.append((args.seed, primeiro, ultimo, tuple(proximo), parametros))
+            for i in range(primeiro, ultimo):
+                n_categorias, n_transacoes, n_produtos, n_vendas = planejar_usuario(args.seed, i, parametros)
+                proximo[0] += n_categorias
+                proximo[1] += n_transacoes
+                proximo[2] += n_produtos
+                proximo[3] += n_vendas
+
+        # Avança as sequências para que inserções da API durante a carga não colidam com os ids reservados
+        finais = dict(zip(["usuario", "categoriatransacao", "transacao", "produto", "venda"],
+                          [bases["usuario"] + args.usuarios] + [p - 1 for p in proximo]))
+        for tabela, coluna in SEQUENCIAS:
+            if finais[tabela] > 0:
+                conn.execute("SELECT setval(pg_get_serial_sequence(%s, %s), %s)", (tabela, coluna, finais[tabela]))
+
+        carregar_usuarios(conn, args.seed, args.usuarios, bases["usuario"])
+        conn.commit()
+    print(f"{args.usuarios} usuários carregados; gerando {len(tarefas)} lote(s) com {args.workers} worker(s)")
+
+    total_usuarios = total_transacoes = total_vendas = 0
+    if args.workers > 1:
+        with ProcessPoolExecutor(max_workers=args.workers) as executor:
+            resultados = executor.map(gerar_faixa, tarefas)
+            for usuarios, transacoes, vendas in resultados:
+                total_usuarios += usuarios
+                total_transacoes += transacoes
+                total_vendas += vendas
+                print(f"  {total_usuarios}/{args.usuarios} usuários", end="\r")
+    else:
+        for tarefa in tarefas:
+            usuarios, transacoes, vendas = gerar_faixa(tarefa)
+            total_usuarios += usuarios
+            total_transacoes += transacoes
+            total_vendas += vendas
+            print(f"  {total_usuarios}/{args.usuarios} usuários", end="\r")
+
+    with psycopg.connect(DATABASE_URL, autocommit=True) as conn:
+        conn.execute("ANALYZE")
+    print(f"\n{total_transacoes} transações e {total_vendas} vendas geradas em {time.perf_counter() - inicio:.1f}s")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
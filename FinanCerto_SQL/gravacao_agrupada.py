@@ -0,0 +1,163 @@
+# Gravação agrupada (group commit) para os POST de criação em horário de pico
+# Com GRAVACAO_AGRUPADA ligado, criar_transacao, criar_produto e criar_venda não fazem o próprio
+# COMMIT: enfileiram a operação e esperam. Gravadores em segundo plano juntam até
+# GRAVACAO_AGRUPADA_MAX_LOTE operações (ou o que chegar em GRAVACAO_AGRUPADA_INTERVALO_MS) e as
+# executam em uma única transação, pagando um flush do WAL por lote em vez de um por requisição.
+# Cada requisição só recebe a resposta depois do COMMIT do seu lote.
+#
+# Fila limitada (GRAVACAO_AGRUPADA_MAX_FILA): cheia, o handler espera uma vaga (back-pressure).
+# No shutdown a fila é fechada para novas operações e esvaziada antes do pool ser fechado.
+
+import asyncio
+import time
+from fastapi import HTTPException
+from psycopg.pq import TransactionStatus
+from database import get_connection
+from config import (GRAVACAO_AGRUPADA_MAX_LOTE, GRAVACAO_AGRUPADA_INTERVALO_MS,
+                    GRAVACAO_AGRUPADA_MAX_FILA, GRAVACAO_AGRUPADA_GRAVADORES)
+
+_fila = None
+_gravadores = []
+_aceitando = False
+estatisticas = {"lotes": 0, "operacoes": 0, "lotes_repetidos": 0}
+
+class FilaEncerrada(RuntimeError):
+    pass
+
+async def iniciar():
+    """Cria a fila e os gravadores (chamado no startup da API quando GRAVACAO_AGRUPADA está ligado)"""
+    global _fila, _aceitando
+    if _fila is None:
+        _fila = asyncio.Queue(maxsize=GRAVACAO_AGRUPADA_MAX_FILA)
+        _gravadores.extend(asyncio.create_task(_gravador()) for _ in range(GRAVACAO_AGRUPADA_GRAVADORES))
+        _aceitando = True
+
+async def parar():
+    """Para de aceitar operações, grava tudo que ainda está na fila e encerra os gravadores"""
+    global _fila, _aceitando
+    if _fila is None:
+        return
+    _aceitando = False
+    for _ in _gravadores:
+        await _fila.put(None)
+    await asyncio.gather(*_gravadores)
+    _gravadores.clear()
+    _fila = None
+
+def ativa():
+    return _aceitando
+
+def tamanho_fila():
+    return _fila.qsize() if _fila is not None else 0
+
+async def executar(operacao):
+    """Enfileira `operacao(cur)` (uma corrotina que só executa comandos, sem commit) e devolve
+    o seu resultado depois do COMMIT do lote. Exceções da operação voltam para quem chamou.
+    Validações devem lançar HTTPException antes de qualquer escrita."""
+    if not _aceitando:
+        raise FilaEncerrada("Gravação agrupada encerrada")
+    futuro = asyncio.get_running_loop().create_future()
+    await _fila.put((operacao, futuro))
+    return await futuro
+
+async def gravar(operacao, mensagem_erro):
+    """Executa `operacao(cur)` e confirma: pela fila quando a gravação agrupada está ativa, senão
+    em uma transação própria. Erros do banco viram HTTPException(400, "<mensagem_erro>: <erro>")."""
+    if ativa():
+        try:
+            return await executar(operacao)
+        except HTTPException:
+            raise
+        except FilaEncerrada as e:
+            raise HTTPException(503, str(e))
+        except Exception as e:
+            raise HTTPException(400, f"{mensagem_erro}: {e}")
+
+    async with get_connection() as conn, conn.cursor() as cur:
+        try:
+            resultado = await operacao(cur)
+            await conn.commit()
+        except HTTPException:
+            await conn.rollback()
+            raise
+        except Exception as e:
+            await conn.rollback()
+            raise HTTPException(400, f"{mensagem_erro}: {e}")
+    return resultado
+
+async def _proximo_lote():
+    """Espera a primeira operação e junta as que chegarem até o lote encher ou o prazo vencer.
+    Devolve (lote, encerrar)."""
+    item = await _fila.get()
+    if item is None:
+        return [], True
+    lote = [item]
+    prazo = time.monotonic() + GRAVACAO_AGRUPADA_INTERVALO_MS / 1000
+    while len(lote) < GRAVACAO_AGRUPADA_MAX_LOTE:
+        # Primeiro o que já está na fila, sem ceder o event loop
+        try:
+            item = _fila.get_nowait()
+        except asyncio.QueueEmpty:
+            restante = prazo - time.monotonic()
+            if restante <= 0:
+                break
+            try:
+                item = await asyncio.wait_for(_fila.get(), restante)
+            except asyncio.TimeoutError:
+                break
+        if item is None:
+            return lote, True
+        lote.append(item)
+    return lote, False
+
+async def _gravador():
+    # Os sinais de parada entram na fila depois de todas as operações aceitas (inclusive as que
+    # esperavam vaga), então ao receber um deles não há mais nada pendente antes dele
+    encerrar = False
+    while not encerrar:
+        lote, encerrar = await _proximo_lote()
+        if lote:
+            await _gravar_lote(lote)
+
+async def _gravar_lote(lote):
+    resultados = [None] * len(lote)
+    erros = [None] * len(lote)
+    try:
+        async with get_connection() as conn, conn.cursor() as cur:
+            try:
+                # Caminho normal: todas as operações seguidas e um único COMMIT
+                for i, (operacao, _) in enumerate(lote):
+                    try:
+                        resultados[i] = await operacao(cur)
+                    except HTTPException as e:
+                        # Validação recusada antes de escrever: só essa operação fica de fora
+                        if conn.info.transaction_status == TransactionStatus.INERROR:
+                            raise
+                        erros[i] = e
+                await conn.commit()
+            except Exception:
+                # Alguma operação falhou e a transação inteira foi perdida: repete o lote com um
+                # savepoint por operação, para que só a que falhou receba o erro
+                await conn.rollback()
+                estatisticas["lotes_repetidos"] += 1
+                resultados, erros = [None] * len(lote), [None] * len(lote)
+                async with conn.transaction():
+                    for i, (operacao, _) in enumerate(lote):
+                        try:
+                            async with conn.transaction():
+                                resultados[i] = await operacao(cur)
+                        except Exception as e:
+                            resultados[i], erros[i] = None, e
+    except Exception as e:
+        # Conexão perdida ou COMMIT da repetição recusado: nada do lote foi gravado
+        erros = [e] * len(lote)
+
+    estatisticas["lotes"] += 1
+    estatisticas["operacoes"] += len(lote)
+    for (_, futuro), resultado, erro in zip(lote, resultados, erros):
+        if futuro.done():
+            continue
+        if erro is not None:
+            futuro.set_exception(erro)
+        else:
+            futuro.set_result(resultado)
@@ -1,6 +1,14 @@
-from fastapi import FastAPI
+from contextlib import asynccontextmanager
+from typing import Literal
+from fastapi import FastAPI, Query, Response
 import uvicorn
 
+from database import aquecer_pool, criar_particoes_futuras, fechar_pool, estatisticas_pool, estatisticas_replicas
+from metricas import MiddlewareMetricas, renderizar, CONTENT_TYPE
+from consultas_lentas import piores_comandos
+from config import GRAVACAO_AGRUPADA, REPLICA_ATRASO_MAX_SEGUNDOS
+import gravacao_agrupada
+
 # Importar todos os roteadores dos CRUDs
 from Crud_Usuario import router as usuarios_router
 from Crud_DetalhesUsuario import router as detalhes_router
@@ -10,13 +18,30 @@ from Crud_Produto import router as produtos_router
 from Crud_Venda import router as vendas_router
 from Crud_Relatorio import router as relatorios_router
 
+# Pool de conexões criado e aquecido no startup (antes de o worker aceitar requisições) e fechado
+# no shutdown da API (a fila de gravação agrupada é esvaziada antes, enquanto ainda há conexões).
+# O startup também garante as partições anuais dos próximos anos (ver particionar.py)
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await aquecer_pool()
+    await criar_particoes_futuras()
+    if GRAVACAO_AGRUPADA:
+        await gravacao_agrupada.iniciar()
+    yield
+    await gravacao_agrupada.parar()
+    await fechar_pool()
+
 # Inicializar FastAPI
 app = FastAPI(
     title="FinanCerto API", 
     description="API para sistema de gestão financeira", 
-    version="3.0.0"
+    version="3.0.0",
+    lifespan=lifespan
 )
 
+# Latência, tempo de banco e contagem de comandos SQL de todas as rotas
+app.add_middleware(MiddlewareMetricas)
+
 # Registrar todos os roteadores
 app.include_router(usuarios_router)
 app.include_router(detalhes_router)
@@ -35,5 +60,31 @@ async def root():
         "description": "API modularizada com CRUDs separados"
     }
 
+# Métricas no formato do Prometheus
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    pool = estatisticas_pool()
+    replicas = estatisticas_replicas()
+    gauges = {
+        "financerto_pool_conexoes": ("Conexões abertas no pool", pool.get("pool_size", 0)),
+        "financerto_pool_conexoes_livres": ("Conexões livres no pool", pool.get("pool_available", 0)),
+        "financerto_pool_requisicoes_esperando": ("Pedidos aguardando uma conexão", pool.get("requests_waiting", 0)),
+        "financerto_gravacao_fila": ("Gravações aguardando o próximo lote", gravacao_agrupada.tamanho_fila()),
+        "financerto_gravacao_lotes": ("Lotes gravados pela gravação agrupada", gravacao_agrupada.estatisticas["lotes"]),
+        "financerto_gravacao_operacoes": ("Operações gravadas pela gravação agrupada", gravacao_agrupada.estatisticas["operacoes"]),
+        "financerto_replicas_em_uso": ("Réplicas com atraso aceitável para leitura",
+                                       sum(a is not None and a <= REPLICA_ATRASO_MAX_SEGUNDOS for a in replicas["atrasos"])),
+        "financerto_leituras_replica": ("Leituras atendidas por réplicas", replicas["leituras"]["replica"]),
+        "financerto_leituras_primario": ("Leituras que aceitavam réplica e foram ao primário", replicas["leituras"]["primario"])
+    }
+    return Response(renderizar(gauges), media_type=CONTENT_TYPE)
+
+# Comandos SQL mais lentos desde o início do processo (detalhes completos no log de consultas lentas)
+@app.get("/admin/consultas-lentas")
+async def consultas_lentas(limit: int = Query(10, ge=1, le=100),
+                           ordenar_por: Literal["tempo_total", "tempo_max", "ocorrencias"] = "tempo_total"):
+    return piores_comandos(limit, ordenar_por)
+
+# Desenvolvimento: um processo só (produção com vários workers: python servidor.py)
 if __name__ == "__main__":
     uvicorn.run(app, host="0.0.0.0", port=8001)
@@ -0,0 +1,155 @@
+# Métricas por endpoint no formato de texto do Prometheus (exposto em GET /metrics no main.py)
+# Implementação própria e enxuta, pensada para ficar ligada em produção: cada requisição custa
+# alguns incrementos em dicionários e um bisect por histograma, sem locks (um event loop por processo).
+# Com vários workers cada processo tem seus próprios contadores.
+#
+# O middleware abre um "estado da requisição" em uma ContextVar; a camada de dados (database.py)
+# soma nele o tempo de espera por conexão, o tempo de banco, o número de comandos SQL e de linhas.
+
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+BUCKETS_LATENCIA = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+_requisicao_atual = ContextVar("metricas_requisicao", default=None)
+
+class Histograma:
+    def __init__(self, nome, ajuda, buckets=BUCKETS_LATENCIA):
+        self.nome = nome
+        self.ajuda = ajuda
+        self.buckets = buckets
+        self.series = {}   # labels -> [contagens por bucket..., soma, total]
+
+    def observar(self, labels, valor):
+        serie = self.series.get(labels)
+        if serie is None:
+            serie = self.series[labels] = [0] * (len(self.buckets) + 2)
+        indice = bisect_left(self.buckets, valor)
+        if indice < len(self.buckets):
+            serie[indice] += 1
+        serie[-2] += valor
+        serie[-1] += 1
+
+    def renderizar(self, linhas):
+        linhas.append(f"# HELP {self.nome} {self.ajuda}")
+        linhas.append(f"# TYPE {self.nome} histogram")
+        for labels, serie in self.series.items():
+            acumulado = 0
+            for limite, contagem in zip(self.buckets, serie):
+                acumulado += contagem
+                linhas.append(f'{self.nome}_bucket{_labels(labels, le=limite)} {acumulado}')
+            linhas.append(f'{self.nome}_bucket{_labels(labels, le="+Inf")} {serie[-1]}')
+            linhas.append(f"{self.nome}_sum{_labels(labels)} {serie[-2]}")
+            linhas.append(f"{self.nome}_count{_labels(labels)} {serie[-1]}")
+
+class Contador:
+    def __init__(self, nome, ajuda):
+        self.nome = nome
+        self.ajuda = ajuda
+        self.series = {}
+
+    def incrementar(self, labels, valor=1):
+        self.series[labels] = self.series.get(labels, 0) + valor
+
+    def renderizar(self, linhas):
+        linhas.append(f"# HELP {self.nome} {self.ajuda}")
+        linhas.append(f"# TYPE {self.nome} counter")
+        for labels, valor in self.series.items():
+            linhas.append(f"{self.nome}{_labels(labels)} {valor}")
+
+def _labels(labels, **extra):
+    pares = list(labels) + [(k, v) for k, v in extra.items()]
+    if not pares:
+        return ""
+    return "{" + ",".join(f'{k}="{v}"' for k, v in pares) + "}"
+
+requisicoes = Contador("financerto_requisicoes_total", "Requisições atendidas por rota e status")
+erros = Contador("financerto_erros_total", "Requisições com erro (status >= 500 ou exceção)")
+latencia = Histograma("financerto_requisicao_duracao_segundos", "Latência das requisições por rota")
+tempo_db = Histograma("financerto_db_duracao_segundos", "Tempo gasto no banco por requisição")
+espera_conexao = Histograma("financerto_db_espera_conexao_segundos", "Tempo de espera por conexão do pool por requisição")
+consultas_db = Contador("financerto_db_comandos_total", "Comandos SQL executados por rota")
+linhas_db = Contador("financerto_db_linhas_total", "Linhas retornadas/afetadas pelos comandos SQL por rota")
+em_andamento = {"valor": 0}
+
+def _rota(scope):
+    return getattr(scope.get("route"), "path", "nao_mapeada")
+
+def rota_atual():
+    """Template da rota da requisição em andamento (None fora de uma requisição)"""
+    estado = _requisicao_atual.get()
+    return _rota(estado["scope"]) if estado is not None else None
+
+def registrar_consulta(duracao, linhas):
+    """Chamado pela camada de dados a cada comando SQL"""
+    estado = _requisicao_atual.get()
+    if estado is not None:
+        estado["consultas"] += 1
+        estado["tempo_db"] += duracao
+        if linhas > 0:
+            estado["linhas"] += linhas
+
+def registrar_espera_conexao(duracao):
+    """Chamado pela camada de dados ao retirar uma conexão do pool"""
+    estado = _requisicao_atual.get()
+    if estado is not None:
+        estado["espera_conexao"] += duracao
+
+class MiddlewareMetricas:
+    """Middleware ASGI puro (mais barato que BaseHTTPMiddleware) que mede todas as rotas"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        estado = {"consultas": 0, "tempo_db": 0.0, "linhas": 0, "espera_conexao": 0.0, "status": 500, "scope": scope}
+        token = _requisicao_atual.set(estado)
+
+        async def enviar(mensagem):
+            if mensagem["type"] == "http.response.start":
+                estado["status"] = mensagem["status"]
+            await send(mensagem)
+
+        em_andamento["valor"] += 1
+        inicio = time.perf_counter()
+        try:
+            await self.app(scope, receive, enviar)
+        except Exception:
+            estado["status"] = 500
+            raise
+        finally:
+            duracao = time.perf_counter() - inicio
+            em_andamento["valor"] -= 1
+            _requisicao_atual.reset(token)
+            # Rota como template (/transacoes/{transacao_id}) para não explodir a cardinalidade
+            rota = _rota(scope)
+            labels = (("metodo", scope["method"]), ("rota", rota))
+            requisicoes.incrementar(labels + (("status", estado["status"]),))
+            if estado["status"] >= 500:
+                erros.incrementar(labels)
+            latencia.observar(labels, duracao)
+            if estado["consultas"]:
+                tempo_db.observar(labels, estado["tempo_db"])
+                espera_conexao.observar(labels, estado["espera_conexao"])
+                consultas_db.incrementar(labels, estado["consultas"])
+                linhas_db.incrementar(labels, estado["linhas"])
+
+def renderizar(gauges_extras=None):
+    """Texto de exposição do Prometheus; `gauges_extras` = {nome: (ajuda, valor)}"""
+    linhas = [
+        "# HELP financerto_requisicoes_em_andamento Requisições sendo atendidas agora",
+        "# TYPE financerto_requisicoes_em_andamento gauge",
+        f"financerto_requisicoes_em_andamento {em_andamento['valor']}"
+    ]
+    for nome, (ajuda, valor) in (gauges_extras or {}).items():
+        linhas += [f"# HELP {nome} {ajuda}", f"# TYPE {nome} gauge", f"{nome} {valor}"]
+    for metrica in (requisicoes, erros, latencia, tempo_db, espera_conexao, consultas_db, linhas_db):
+        metrica.renderizar(linhas)
+    return "\n".join(linhas) + "\n"
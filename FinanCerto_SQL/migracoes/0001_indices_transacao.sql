@@ -0,0 +1,13 @@
+-- Índices de acesso de Transacao
+-- listar_transacoes_usuario (OFFSET e cursor): WHERE ID_Usuario = ? ORDER BY Data_Transacao DESC, ID_Transacao DESC
+CREATE INDEX IF NOT EXISTS idx_transacao_usuario_data
+    ON Transacao (ID_Usuario, Data_Transacao DESC, ID_Transacao DESC);
+
+-- Chave estrangeira para CategoriaTransacao: joins da view Resumo_Financeiro,
+-- trigger de troca de tipo de categoria e exclusão de categorias
+CREATE INDEX IF NOT EXISTS idx_transacao_categoria
+    ON Transacao (ID_Categoria);
+
+-- listar_categorias_usuario: WHERE ID_Usuario = ?
+CREATE INDEX IF NOT EXISTS idx_categoriatransacao_usuario
+    ON CategoriaTransacao (ID_Usuario);
@@ -0,0 +1,13 @@
+-- Índices de acesso de Venda, Produto e Venda_Produto
+-- listar_vendas_usuario (OFFSET e cursor) e relatório de vendas: WHERE ID_Usuario = ? ORDER BY Data_Venda DESC, ID_Venda DESC
+CREATE INDEX IF NOT EXISTS idx_venda_usuario_data
+    ON Venda (ID_Usuario, Data_Venda DESC, ID_Venda DESC);
+
+-- listar_produtos_usuario e views Lucro_Produtos / Produtos_Mais_Vendidos filtradas por usuário
+CREATE INDEX IF NOT EXISTS idx_produto_usuario
+    ON Produto (ID_Usuario, ID_Produto);
+
+-- Chave estrangeira para Produto (a chave primária só cobre buscas por ID_Venda):
+-- joins das views de produtos e exclusão de produtos
+CREATE INDEX IF NOT EXISTS idx_venda_produto_produto
+    ON Venda_Produto (ID_Produto);
@@ -0,0 +1,111 @@
+-- Fluxo de caixa diário por usuário e tipo de categoria
+-- Base do relatório /relatorios/fluxo-caixa: um gráfico de um ano lê no máximo 365 x 2 linhas
+-- por usuário, independente de quantas transações existem. Mantido por triggers por comando,
+-- como o Saldo_Usuario (conferência/reconstrução: python resumo_saldo.py verificar | reconstruir)
+
+CREATE TABLE IF NOT EXISTS Fluxo_Caixa_Diario (
+    ID_Usuario INT NOT NULL,
+    Dia DATE NOT NULL,
+    Tipo_Categoria VARCHAR(7) NOT NULL,
+    Total NUMERIC NOT NULL DEFAULT 0,
+    Quantidade INT NOT NULL DEFAULT 0,
+    PRIMARY KEY (ID_Usuario, Dia, Tipo_Categoria),
+    FOREIGN KEY (ID_Usuario) REFERENCES Usuario(ID_Usuario) ON DELETE CASCADE
+);
+
+-- Aplica as diferenças de um comando inteiro em Transacao (triggers por comando,
+-- então um lote de milhares de linhas gera um único UPSERT agrupado por usuário/dia/tipo)
+CREATE OR REPLACE FUNCTION fn_Fluxo_Caixa_Transacao() RETURNS TRIGGER AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        INSERT INTO Fluxo_Caixa_Diario (ID_Usuario, Dia, Tipo_Categoria, Total, Quantidade)
+        SELECT d.ID_Usuario, d.Data_Transacao, c.Tipo_Categoria, SUM(d.Valor), SUM(d.Quantidade)
+        FROM (SELECT ID_Usuario, Data_Transacao, ID_Categoria, Valor, 1 AS Quantidade FROM Novas) d
+        JOIN CategoriaTransacao c ON c.ID_Categoria = d.ID_Categoria
+        WHERE d.ID_Usuario IS NOT NULL AND c.Tipo_Categoria IS NOT NULL
+        GROUP BY d.ID_Usuario, d.Data_Transacao, c.Tipo_Categoria
+        ON CONFLICT (ID_Usuario, Dia, Tipo_Categoria) DO UPDATE
+        SET Total = Fluxo_Caixa_Diario.Total + EXCLUDED.Total,
+            Quantidade = Fluxo_Caixa_Diario.Quantidade + EXCLUDED.Quantidade;
+    ELSIF TG_OP = 'DELETE' THEN
+        INSERT INTO Fluxo_Caixa_Diario (ID_Usuario, Dia, Tipo_Categoria, Total, Quantidade)
+        SELECT d.ID_Usuario, d.Data_Transacao, c.Tipo_Categoria, SUM(d.Valor), SUM(d.Quantidade)
+        FROM (SELECT ID_Usuario, Data_Transacao, ID_Categoria, -Valor AS Valor, -1 AS Quantidade FROM Antigas) d
+        JOIN CategoriaTransacao c ON c.ID_Categoria = d.ID_Categoria
+        WHERE d.ID_Usuario IS NOT NULL AND c.Tipo_Categoria IS NOT NULL
+        GROUP BY d.ID_Usuario, d.Data_Transacao, c.Tipo_Categoria
+        ON CONFLICT (ID_Usuario, Dia, Tipo_Categoria) DO UPDATE
+        SET Total = Fluxo_Caixa_Diario.Total + EXCLUDED.Total,
+            Quantidade = Fluxo_Caixa_Diario.Quantidade + EXCLUDED.Quantidade;
+    ELSE
+        -- UPDATE: retira a versão antiga da linha e soma a nova (cobre troca de valor, data e categoria)
+        INSERT INTO Fluxo_Caixa_Diario (ID_Usuario, Dia, Tipo_Categoria, Total, Quantidade)
+        SELECT d.ID_Usuario, d.Data_Transacao, c.Tipo_Categoria, SUM(d.Valor), SUM(d.Quantidade)
+        FROM (
+            SELECT ID_Usuario, Data_Transacao, ID_Categoria, Valor, 1 AS Quantidade FROM Novas
+            UNION ALL
+            SELECT ID_Usuario, Data_Transacao, ID_Categoria, -Valor, -1 FROM Antigas
+        ) d
+        JOIN CategoriaTransacao c ON c.ID_Categoria = d.ID_Categoria
+        WHERE d.ID_Usuario IS NOT NULL AND c.Tipo_Categoria IS NOT NULL
+        GROUP BY d.ID_Usuario, d.Data_Transacao, c.Tipo_Categoria
+        ON CONFLICT (ID_Usuario, Dia, Tipo_Categoria) DO UPDATE
+        SET Total = Fluxo_Caixa_Diario.Total + EXCLUDED.Total,
+            Quantidade = Fluxo_Caixa_Diario.Quantidade + EXCLUDED.Quantidade;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Troca de tipo de uma categoria: as transações dela saem de um tipo e entram no outro
+CREATE OR REPLACE FUNCTION fn_Fluxo_Caixa_Categoria() RETURNS TRIGGER AS $$
+BEGIN
+    INSERT INTO Fluxo_Caixa_Diario (ID_Usuario, Dia, Tipo_Categoria, Total, Quantidade)
+    SELECT t.ID_Usuario, t.Data_Transacao, x.Tipo_Categoria, SUM(x.Sinal * t.Valor), SUM(x.Sinal)
+    FROM Antigas a
+    JOIN Novas n ON n.ID_Categoria = a.ID_Categoria
+    JOIN Transacao t ON t.ID_Categoria = n.ID_Categoria
+    CROSS JOIN LATERAL (VALUES (a.Tipo_Categoria, -1), (n.Tipo_Categoria, 1)) AS x(Tipo_Categoria, Sinal)
+    WHERE a.Tipo_Categoria IS DISTINCT FROM n.Tipo_Categoria
+      AND x.Tipo_Categoria IS NOT NULL
+      AND t.ID_Usuario IS NOT NULL
+    GROUP BY t.ID_Usuario, t.Data_Transacao, x.Tipo_Categoria
+    ON CONFLICT (ID_Usuario, Dia, Tipo_Categoria) DO UPDATE
+    SET Total = Fluxo_Caixa_Diario.Total + EXCLUDED.Total,
+        Quantidade = Fluxo_Caixa_Diario.Quantidade + EXCLUDED.Quantidade;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_Fluxo_Caixa_Insert ON Transacao;
+CREATE TRIGGER trg_Fluxo_Caixa_Insert
+    AFTER INSERT ON Transacao
+    REFERENCING NEW TABLE AS Novas
+    FOR EACH STATEMENT EXECUTE FUNCTION fn_Fluxo_Caixa_Transacao();
+
+DROP TRIGGER IF EXISTS trg_Fluxo_Caixa_Update ON Transacao;
+CREATE TRIGGER trg_Fluxo_Caixa_Update
+    AFTER UPDATE ON Transacao
+    REFERENCING OLD TABLE AS Antigas NEW TABLE AS Novas
+    FOR EACH STATEMENT EXECUTE FUNCTION fn_Fluxo_Caixa_Transacao();
+
+DROP TRIGGER IF EXISTS trg_Fluxo_Caixa_Delete ON Transacao;
+CREATE TRIGGER trg_Fluxo_Caixa_Delete
+    AFTER DELETE ON Transacao
+    REFERENCING OLD TABLE AS Antigas
+    FOR EACH STATEMENT EXECUTE FUNCTION fn_Fluxo_Caixa_Transacao();
+
+DROP TRIGGER IF EXISTS trg_Fluxo_Caixa_Categoria ON CategoriaTransacao;
+CREATE TRIGGER trg_Fluxo_Caixa_Categoria
+    AFTER UPDATE ON CategoriaTransacao
+    REFERENCING OLD TABLE AS Antigas NEW TABLE AS Novas
+    FOR EACH STATEMENT EXECUTE FUNCTION fn_Fluxo_Caixa_Categoria();
+
+-- Carga inicial a partir do histórico existente
+TRUNCATE Fluxo_Caixa_Diario;
+INSERT INTO Fluxo_Caixa_Diario (ID_Usuario, Dia, Tipo_Categoria, Total, Quantidade)
+SELECT t.ID_Usuario, t.Data_Transacao, c.Tipo_Categoria, SUM(t.Valor), COUNT(*)
+FROM Transacao t
+JOIN CategoriaTransacao c ON c.ID_Categoria = t.ID_Categoria
+WHERE t.ID_Usuario IS NOT NULL AND c.Tipo_Categoria IS NOT NULL
+GROUP BY t.ID_Usuario, t.Data_Transacao, c.Tipo_Categoria;
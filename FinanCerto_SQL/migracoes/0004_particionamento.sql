@@ -0,0 +1,124 @@
+-- Particionamento anual de Transacao (Data_Transacao) e Venda (Data_Venda)
+-- A conversão das tabelas é feita online pelo particionar.py; aqui ficam as funções que ele e a API usam.
+-- Sem a conversão as funções não fazem nada (tabelas comuns são ignoradas).
+
+-- Espelha em <tabela>_nova as alterações feitas na tabela original enquanto a cópia em lotes roda.
+-- TG_ARGV[0] = tabela de destino, TG_ARGV[1] = coluna de id. O UPDATE vira DELETE + INSERT porque
+-- a linha pode mudar de partição (ou ainda não ter sido copiada).
+CREATE OR REPLACE FUNCTION fn_Particionamento_Espelho() RETURNS TRIGGER AS $$
+BEGIN
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        EXECUTE format('DELETE FROM %I WHERE %I = ($1).%I', TG_ARGV[0], TG_ARGV[1], TG_ARGV[1]) USING OLD;
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        EXECUTE format('INSERT INTO %I SELECT ($1).* ON CONFLICT DO NOTHING', TG_ARGV[0]) USING NEW;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Cria as partições anuais <tabela>_<ano> de p_ano_inicio a p_ano_fim que ainda não existem.
+-- Linhas desses anos que tenham caído na partição padrão (<tabela>_padrao) são movidas para a nova.
+-- A partição é criada fora da tabela e anexada com ATTACH, que não bloqueia as leituras e escritas.
+CREATE OR REPLACE FUNCTION fn_Criar_Particoes_Anuais(p_tabela TEXT, p_ano_inicio INT, p_ano_fim INT) RETURNS INT AS $$
+DECLARE
+    v_coluna TEXT;
+    v_padrao TEXT;
+    v_particao TEXT;
+    v_inicio DATE;
+    v_fim DATE;
+    v_criadas INT := 0;
+BEGIN
+    SELECT a.attname INTO v_coluna
+    FROM pg_partitioned_table p
+    JOIN pg_attribute a ON a.attrelid = p.partrelid AND a.attnum = p.partattrs[0]
+    WHERE p.partrelid = to_regclass(p_tabela);
+    IF v_coluna IS NULL THEN
+        RETURN 0;
+    END IF;
+
+    -- Vários workers da API chamam no startup: um de cada vez
+    PERFORM pg_advisory_xact_lock(hashtext('fn_Criar_Particoes_Anuais'), hashtext(p_tabela));
+
+    SELECT c.relname INTO v_padrao
+    FROM pg_inherits i
+    JOIN pg_class c ON c.oid = i.inhrelid
+    WHERE i.inhparent = to_regclass(p_tabela) AND pg_get_expr(c.relpartbound, c.oid) = 'DEFAULT';
+
+    FOR v_ano IN p_ano_inicio .. p_ano_fim LOOP
+        v_particao := p_tabela || '_' || v_ano;
+        CONTINUE WHEN to_regclass(v_particao) IS NOT NULL;
+        v_inicio := make_date(v_ano, 1, 1);
+        v_fim := make_date(v_ano + 1, 1, 1);
+
+        EXECUTE format('CREATE TABLE %I (LIKE %I INCLUDING DEFAULTS INCLUDING CONSTRAINTS)', v_particao, p_tabela);
+        -- A restrição de faixa evita que o ATTACH precise varrer a partição para validá-la
+        EXECUTE format('ALTER TABLE %I ADD CONSTRAINT %I CHECK (%I IS NOT NULL AND %I >= %L AND %I < %L)',
+                       v_particao, v_particao || '_faixa', v_coluna, v_coluna, v_inicio, v_coluna, v_fim);
+        IF v_padrao IS NOT NULL THEN
+            EXECUTE format('WITH movidas AS (DELETE FROM %I WHERE %I >= %L AND %I < %L RETURNING *)
+                            INSERT INTO %I SELECT * FROM movidas',
+                           v_padrao, v_coluna, v_inicio, v_coluna, v_fim, v_particao);
+        END IF;
+        EXECUTE format('ALTER TABLE %I ATTACH PARTITION %I FOR VALUES FROM (%L) TO (%L)',
+                       p_tabela, v_particao, v_inicio, v_fim);
+        EXECUTE format('ALTER TABLE %I DROP CONSTRAINT %I', v_particao, v_particao || '_faixa');
+        v_criadas := v_criadas + 1;
+    END LOOP;
+    RETURN v_criadas;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Partições do ano corrente até p_anos_a_frente anos adiante para as tabelas já particionadas
+-- (chamada pela API no startup e por "python particionar.py manter")
+CREATE OR REPLACE FUNCTION fn_Criar_Particoes_Futuras(p_anos_a_frente INT) RETURNS INT AS $$
+DECLARE
+    v_ano INT := EXTRACT(YEAR FROM current_date);
+BEGIN
+    RETURN fn_Criar_Particoes_Anuais('transacao', v_ano, v_ano + p_anos_a_frente)
+         + fn_Criar_Particoes_Anuais('venda', v_ano, v_ano + p_anos_a_frente);
+END;
+$$ LANGUAGE plpgsql;
+
+-- Chave estrangeira Venda_Produto -> Venda depois do particionamento: uma FK para tabela particionada
+-- precisa incluir a chave de partição (Data_Venda), que Venda_Produto não tem. Os triggers abaixo
+-- fazem a mesma verificação, por comando, e travam as vendas referenciadas como a FK faria.
+CREATE OR REPLACE FUNCTION fn_Venda_Produto_Venda_Existe() RETURNS TRIGGER AS $$
+DECLARE
+    v_faltante INT;
+BEGIN
+    PERFORM 1 FROM Venda v
+    WHERE v.ID_Venda IN (SELECT ID_Venda FROM Novas)
+    FOR KEY SHARE OF v;
+
+    SELECT n.ID_Venda INTO v_faltante
+    FROM (SELECT DISTINCT ID_Venda FROM Novas WHERE ID_Venda IS NOT NULL) n
+    WHERE NOT EXISTS (SELECT 1 FROM Venda v WHERE v.ID_Venda = n.ID_Venda)
+    LIMIT 1;
+    IF v_faltante IS NOT NULL THEN
+        RAISE EXCEPTION 'insert or update on table "venda_produto" violates foreign key constraint "venda_produto_id_venda_fkey"'
+            USING ERRCODE = 'foreign_key_violation',
+                  DETAIL = format('Key (id_venda)=(%s) is not present in table "venda".', v_faltante);
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION fn_Venda_Sem_Itens() RETURNS TRIGGER AS $$
+DECLARE
+    v_referenciada INT;
+BEGIN
+    SELECT vp.ID_Venda INTO v_referenciada
+    FROM Venda_Produto vp
+    WHERE vp.ID_Venda IN (SELECT ID_Venda FROM Antigas)
+      AND NOT EXISTS (SELECT 1 FROM Venda v WHERE v.ID_Venda = vp.ID_Venda)
+    LIMIT 1
+    FOR KEY SHARE OF vp;
+    IF v_referenciada IS NOT NULL THEN
+        RAISE EXCEPTION 'update or delete on table "venda" violates foreign key constraint "venda_produto_id_venda_fkey" on table "venda_produto"'
+            USING ERRCODE = 'foreign_key_violation',
+                  DETAIL = format('Key (id_venda)=(%s) is still referenced from table "venda_produto".', v_referenciada);
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
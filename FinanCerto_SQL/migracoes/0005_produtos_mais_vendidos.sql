@@ -0,0 +1,160 @@
+-- Quantidade vendida por produto, mantida incrementalmente
+-- Base do relatório /relatorios/produtos-mais-vendidos: em vez de agrupar todo o histórico de
+-- Venda_Produto a cada chamada (view Produtos_Mais_Vendidos), o ranking lê as primeiras linhas
+-- de um índice ordenado por quantidade. Produto_Vendas_Diario guarda a mesma contagem por dia
+-- da venda, para as janelas de tempo (ex.: últimos 30 dias).
+-- O usuário é o dono do produto, como na view. Mantidas por triggers por comando, como o
+-- Saldo_Usuario (conferência/reconstrução: python resumo_saldo.py verificar | reconstruir)
+
+CREATE TABLE IF NOT EXISTS Produto_Vendas (
+    ID_Produto INT PRIMARY KEY,
+    ID_Usuario INT NOT NULL,
+    Quantidade BIGINT NOT NULL DEFAULT 0,
+    FOREIGN KEY (ID_Produto) REFERENCES Produto(ID_Produto) ON DELETE CASCADE
+);
+
+-- Ranking do usuário: Index Scan das primeiras `limit` entradas
+CREATE INDEX IF NOT EXISTS idx_produto_vendas_ranking
+    ON Produto_Vendas (ID_Usuario, Quantidade DESC, ID_Produto);
+
+CREATE TABLE IF NOT EXISTS Produto_Vendas_Diario (
+    ID_Usuario INT NOT NULL,
+    Dia DATE NOT NULL,
+    ID_Produto INT NOT NULL,
+    Quantidade BIGINT NOT NULL DEFAULT 0,
+    PRIMARY KEY (ID_Usuario, Dia, ID_Produto),
+    FOREIGN KEY (ID_Produto) REFERENCES Produto(ID_Produto) ON DELETE CASCADE
+);
+
+-- Aplica as diferenças de um comando inteiro em Venda_Produto (triggers por comando, então um
+-- lote de vendas gera um UPSERT agrupado por produto e outro por produto/dia da venda).
+-- O dia vem da Venda, que precisa existir: na exclusão, os itens saem em um comando anterior ao
+-- da venda (como em edicao.deletar), não no mesmo WITH ... DELETE
+CREATE OR REPLACE FUNCTION fn_Produto_Vendas_Item() RETURNS TRIGGER AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        WITH itens AS (
+            SELECT p.ID_Usuario, v.Data_Venda, d.ID_Produto, SUM(d.Quantidade) AS Quantidade
+            FROM (SELECT ID_Venda, ID_Produto, Quantidade FROM Novas) d
+            JOIN Produto p ON p.ID_Produto = d.ID_Produto
+            JOIN Venda v ON v.ID_Venda = d.ID_Venda
+            WHERE p.ID_Usuario IS NOT NULL
+            GROUP BY p.ID_Usuario, v.Data_Venda, d.ID_Produto
+        ),
+        total AS (
+            INSERT INTO Produto_Vendas (ID_Produto, ID_Usuario, Quantidade)
+            SELECT ID_Produto, ID_Usuario, SUM(Quantidade) FROM itens GROUP BY ID_Produto, ID_Usuario
+            ON CONFLICT (ID_Produto) DO UPDATE
+            SET Quantidade = Produto_Vendas.Quantidade + EXCLUDED.Quantidade
+        )
+        INSERT INTO Produto_Vendas_Diario (ID_Usuario, Dia, ID_Produto, Quantidade)
+        SELECT ID_Usuario, Data_Venda, ID_Produto, Quantidade FROM itens
+        ON CONFLICT (ID_Usuario, Dia, ID_Produto) DO UPDATE
+        SET Quantidade = Produto_Vendas_Diario.Quantidade + EXCLUDED.Quantidade;
+    ELSIF TG_OP = 'DELETE' THEN
+        WITH itens AS (
+            SELECT p.ID_Usuario, v.Data_Venda, d.ID_Produto, SUM(d.Quantidade) AS Quantidade
+            FROM (SELECT ID_Venda, ID_Produto, -Quantidade AS Quantidade FROM Antigas) d
+            JOIN Produto p ON p.ID_Produto = d.ID_Produto
+            JOIN Venda v ON v.ID_Venda = d.ID_Venda
+            WHERE p.ID_Usuario IS NOT NULL
+            GROUP BY p.ID_Usuario, v.Data_Venda, d.ID_Produto
+        ),
+        total AS (
+            INSERT INTO Produto_Vendas (ID_Produto, ID_Usuario, Quantidade)
+            SELECT ID_Produto, ID_Usuario, SUM(Quantidade) FROM itens GROUP BY ID_Produto, ID_Usuario
+            ON CONFLICT (ID_Produto) DO UPDATE
+            SET Quantidade = Produto_Vendas.Quantidade + EXCLUDED.Quantidade
+        )
+        INSERT INTO Produto_Vendas_Diario (ID_Usuario, Dia, ID_Produto, Quantidade)
+        SELECT ID_Usuario, Data_Venda, ID_Produto, Quantidade FROM itens
+        ON CONFLICT (ID_Usuario, Dia, ID_Produto) DO UPDATE
+        SET Quantidade = Produto_Vendas_Diario.Quantidade + EXCLUDED.Quantidade;
+    ELSE
+        -- UPDATE: retira a versão antiga do item e soma a nova (cobre troca de quantidade, produto e venda)
+        WITH itens AS (
+            SELECT p.ID_Usuario, v.Data_Venda, d.ID_Produto, SUM(d.Quantidade) AS Quantidade
+            FROM (
+                SELECT ID_Venda, ID_Produto, Quantidade FROM Novas
+                UNION ALL
+                SELECT ID_Venda, ID_Produto, -Quantidade FROM Antigas
+            ) d
+            JOIN Produto p ON p.ID_Produto = d.ID_Produto
+            JOIN Venda v ON v.ID_Venda = d.ID_Venda
+            WHERE p.ID_Usuario IS NOT NULL
+            GROUP BY p.ID_Usuario, v.Data_Venda, d.ID_Produto
+        ),
+        total AS (
+            INSERT INTO Produto_Vendas (ID_Produto, ID_Usuario, Quantidade)
+            SELECT ID_Produto, ID_Usuario, SUM(Quantidade) FROM itens GROUP BY ID_Produto, ID_Usuario
+            ON CONFLICT (ID_Produto) DO UPDATE
+            SET Quantidade = Produto_Vendas.Quantidade + EXCLUDED.Quantidade
+        )
+        INSERT INTO Produto_Vendas_Diario (ID_Usuario, Dia, ID_Produto, Quantidade)
+        SELECT ID_Usuario, Data_Venda, ID_Produto, Quantidade FROM itens
+        ON CONFLICT (ID_Usuario, Dia, ID_Produto) DO UPDATE
+        SET Quantidade = Produto_Vendas_Diario.Quantidade + EXCLUDED.Quantidade;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Troca da data de uma venda: os itens dela saem de um dia e entram no outro
+CREATE OR REPLACE FUNCTION fn_Produto_Vendas_Data() RETURNS TRIGGER AS $$
+BEGIN
+    INSERT INTO Produto_Vendas_Diario (ID_Usuario, Dia, ID_Produto, Quantidade)
+    SELECT p.ID_Usuario, x.Dia, vp.ID_Produto, SUM(x.Sinal * vp.Quantidade)
+    FROM Antigas a
+    JOIN Novas n ON n.ID_Venda = a.ID_Venda
+    JOIN Venda_Produto vp ON vp.ID_Venda = n.ID_Venda
+    JOIN Produto p ON p.ID_Produto = vp.ID_Produto
+    CROSS JOIN LATERAL (VALUES (a.Data_Venda, -1), (n.Data_Venda, 1)) AS x(Dia, Sinal)
+    WHERE a.Data_Venda IS DISTINCT FROM n.Data_Venda
+      AND p.ID_Usuario IS NOT NULL
+    GROUP BY p.ID_Usuario, x.Dia, vp.ID_Produto
+    ON CONFLICT (ID_Usuario, Dia, ID_Produto) DO UPDATE
+    SET Quantidade = Produto_Vendas_Diario.Quantidade + EXCLUDED.Quantidade;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_Produto_Vendas_Insert ON Venda_Produto;
+CREATE TRIGGER trg_Produto_Vendas_Insert
+    AFTER INSERT ON Venda_Produto
+    REFERENCING NEW TABLE AS Novas
+    FOR EACH STATEMENT EXECUTE FUNCTION fn_Produto_Vendas_Item();
+
+DROP TRIGGER IF EXISTS trg_Produto_Vendas_Update ON Venda_Produto;
+CREATE TRIGGER trg_Produto_Vendas_Update
+    AFTER UPDATE ON Venda_Produto
+    REFERENCING OLD TABLE AS Antigas NEW TABLE AS Novas
+    FOR EACH STATEMENT EXECUTE FUNCTION fn_Produto_Vendas_Item();
+
+DROP TRIGGER IF EXISTS trg_Produto_Vendas_Delete ON Venda_Produto;
+CREATE TRIGGER trg_Produto_Vendas_Delete
+    AFTER DELETE ON Venda_Produto
+    REFERENCING OLD TABLE AS Antigas
+    FOR EACH STATEMENT EXECUTE FUNCTION fn_Produto_Vendas_Item();
+
+DROP TRIGGER IF EXISTS trg_Produto_Vendas_Data ON Venda;
+CREATE TRIGGER trg_Produto_Vendas_Data
+    AFTER UPDATE ON Venda
+    REFERENCING OLD TABLE AS Antigas NEW TABLE AS Novas
+    FOR EACH STATEMENT EXECUTE FUNCTION fn_Produto_Vendas_Data();
+
+-- Carga inicial a partir do histórico existente
+TRUNCATE Produto_Vendas, Produto_Vendas_Diario;
+INSERT INTO Produto_Vendas (ID_Produto, ID_Usuario, Quantidade)
+SELECT p.ID_Produto, p.ID_Usuario, SUM(vp.Quantidade)
+FROM Venda_Produto vp
+JOIN Produto p ON p.ID_Produto = vp.ID_Produto
+WHERE p.ID_Usuario IS NOT NULL
+GROUP BY p.ID_Produto, p.ID_Usuario;
+
+INSERT INTO Produto_Vendas_Diario (ID_Usuario, Dia, ID_Produto, Quantidade)
+SELECT p.ID_Usuario, v.Data_Venda, vp.ID_Produto, SUM(vp.Quantidade)
+FROM Venda_Produto vp
+JOIN Produto p ON p.ID_Produto = vp.ID_Produto
+JOIN Venda v ON v.ID_Venda = vp.ID_Venda
+WHERE p.ID_Usuario IS NOT NULL
+GROUP BY p.ID_Usuario, v.Data_Venda, vp.ID_Produto;
@@ -0,0 +1,85 @@
+# Migrações versionadas do esquema
+#
+# Os scripts ficam em migracoes/ com o nome NNNN_descricao.sql e são aplicados em ordem,
+# cada um em sua própria transação, sendo registrados na tabela Schema_Migracoes.
+# Os scripts devem ser idempotentes (IF NOT EXISTS / CREATE OR REPLACE).
+#
+# Uso (a partir de FinanCerto_SQL/):
+#     python migrar.py aplicar     # aplica as migrações pendentes
+#     python migrar.py status      # lista migrações aplicadas e pendentes
+
+import argparse
+import os
+import re
+import sys
+import psycopg
+from config import DATABASE_URL
+
+PASTA_MIGRACOES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "migracoes")
+
+# Chave do advisory lock que impede duas execuções simultâneas do migrador
+CHAVE_LOCK = 7_310_001
+
+def listar_migracoes():
+    """Retorna [(versao, nome_arquivo)] ordenado pela versão"""
+    migracoes = []
+    for nome in os.listdir(PASTA_MIGRACOES):
+        m = re.match(r"^(\d{4})_.+\.sql$", nome)
+        if m:
+            migracoes.append((int(m.group(1)), nome))
+    migracoes.sort()
+    versoes = [v for v, _ in migracoes]
+    if len(versoes) != len(set(versoes)):
+        raise SystemExit("Versões de migração duplicadas em migracoes/")
+    return migracoes
+
+def preparar(conn):
+    conn.execute(
+        """CREATE TABLE IF NOT EXISTS schema_migracoes (
+               versao INT PRIMARY KEY,
+               nome VARCHAR(255) NOT NULL,
+               aplicada_em TIMESTAMP NOT NULL DEFAULT now()
+           )"""
+    )
+    conn.commit()
+
+def aplicadas(conn):
+    return {row[0] for row in conn.execute("SELECT versao FROM schema_migracoes").fetchall()}
+
+def aplicar(conn):
+    conn.execute("SELECT pg_advisory_lock(%s)", (CHAVE_LOCK,))
+    conn.commit()
+    try:
+        feitas = aplicadas(conn)
+        pendentes = [(v, n) for v, n in listar_migracoes() if v not in feitas]
+        for versao, nome in pendentes:
+            with open(os.path.join(PASTA_MIGRACOES, nome), encoding="utf-8") as f:
+                sql = f.read()
+            with conn.transaction():
+                conn.execute(sql)
+                conn.execute("INSERT INTO schema_migracoes (versao, nome) VALUES (%s, %s)", (versao, nome))
+            print(f"aplicada {nome}")
+        print(f"{len(pendentes)} migração(ões) aplicada(s)")
+    finally:
+        conn.execute("SELECT pg_advisory_unlock(%s)", (CHAVE_LOCK,))
+        conn.commit()
+    return 0
+
+def status(conn):
+    feitas = aplicadas(conn)
+    conn.commit()
+    for versao, nome in listar_migracoes():
+        print(f"{'aplicada' if versao in feitas else 'pendente'}  {nome}")
+    return 0
+
+def main():
+    parser = argparse.ArgumentParser(description="Migrações versionadas do esquema FinanCerto")
+    parser.add_argument("comando", nargs="?", default="aplicar", choices=["aplicar", "status"])
+    args = parser.parse_args()
+
+    with psycopg.connect(DATABASE_URL) as conn:
+        preparar(conn)
+        return {"aplicar": aplicar, "status": status}[args.comando](conn)
+
+if __name__ == "__main__":
+    sys.exit(main())
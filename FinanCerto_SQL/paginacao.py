@@ -0,0 +1,32 @@
+# Paginação por cursor (keyset) compartilhada pelas listagens
+# O cursor é opaco para o cliente: base64 dos valores da chave de ordenação da última linha da página.
+# Com ele a próxima página é buscada com WHERE (chave) < / > (cursor), sem OFFSET, então
+# a página N custa o mesmo que a primeira e não "pula" linhas quando há inserções concorrentes.
+
+import base64
+import json
+from datetime import date
+from fastapi import HTTPException
+
+# Cabeçalho de resposta com o cursor da próxima página (ausente na última página)
+CABECALHO_CURSOR = "X-Proximo-Cursor"
+
+def codificar_cursor(*valores):
+    dados = json.dumps([v.isoformat() if isinstance(v, date) else v for v in valores])
+    return base64.urlsafe_b64encode(dados.encode()).decode().rstrip("=")
+
+def decodificar_cursor(cursor, *tipos):
+    """Converte o cursor de volta nos valores da chave, aplicando um conversor por posição"""
+    try:
+        valores = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        if not isinstance(valores, list) or len(valores) != len(tipos):
+            raise ValueError(cursor)
+        return [tipo(valor) for tipo, valor in zip(tipos, valores)]
+    except (ValueError, TypeError):
+        raise HTTPException(400, "Cursor inválido")
+
+def definir_proximo_cursor(response, rows, limit, *posicoes):
+    """Publica o cursor da próxima página a partir das colunas `posicoes` da última linha"""
+    if rows and len(rows) == limit:
+        ultima = rows[-1]
+        response.headers[CABECALHO_CURSOR] = codificar_cursor(*(ultima[i] for i in posicoes))
@@ -0,0 +1,284 @@
+# Conversão online de Transacao e Venda em tabelas particionadas por ano (Data_Transacao / Data_Venda)
+# Requer a migração 0004_particionamento.sql. Passos, para cada tabela (a API pode continuar no ar):
+#
+#   preparar  cria <tabela>_nova particionada (mesmas colunas, sequência, índices e chaves), as partições
+#             anuais do primeiro ano com dados até PARTICOES_ANOS_FUTUROS à frente, a partição padrão e
+#             um trigger na tabela original que espelha na nova tudo que for gravado a partir daí
+#   copiar    copia as linhas existentes em lotes por faixa de id, cada lote em sua transação
+#             (as linhas do lote ficam travadas FOR SHARE só durante a cópia dele); pode ser repetido
+#   trocar    em uma transação curta: trava a original, confere contagem e soma dos ids, troca os nomes,
+#             recria triggers (saldo, fluxo de caixa) e views dependentes na nova e, em Venda, troca a
+#             chave estrangeira de Venda_Produto pelos triggers de integridade da migração 0004
+#   limpar    apaga a tabela original (<tabela>_antiga), mantida até aqui para voltar atrás
+#
+# Uso (a partir de FinanCerto_SQL/):
+#     python particionar.py executar transacao      # preparar + copiar + trocar
+#     python particionar.py copiar venda --lote 20000 --pausa 0.05
+#     python particionar.py status
+#     python particionar.py manter                  # partições futuras (a API também cria no startup)
+
+import argparse
+import sys
+import time
+from datetime import date
+import psycopg
+from psycopg import sql
+from config import DATABASE_URL, PARTICOES_ANOS_FUTUROS
+
+TABELAS = {
+    "transacao": {"data": "data_transacao", "id": "id_transacao"},
+    "venda": {"data": "data_venda", "id": "id_venda"},
+}
+
+# Views e triggers são recriados pelo nome; o espelho é da conversão e não vai para a tabela nova
+TRIGGER_ESPELHO = "trg_particionamento_espelho"
+
+def particionada(conn, tabela):
+    return conn.execute(
+        "SELECT EXISTS (SELECT 1 FROM pg_partitioned_table WHERE partrelid = to_regclass(%s))", (tabela,)
+    ).fetchone()[0]
+
+def existe(conn, nome):
+    return conn.execute("SELECT to_regclass(%s) IS NOT NULL", (nome,)).fetchone()[0]
+
+def preparar(conn, tabela):
+    cfg = TABELAS[tabela]
+    nova = f"{tabela}_nova"
+    if particionada(conn, tabela):
+        print(f"{tabela} já é particionada")
+        return
+    if existe(conn, nova):
+        print(f"{nova} já existe (preparar já foi executado)")
+        return
+
+    with conn.transaction():
+        # Mesmas colunas e defaults (inclusive o nextval da sequência do SERIAL, que passa a ser compartilhada)
+        conn.execute(sql.SQL("CREATE TABLE {} (LIKE {} INCLUDING DEFAULTS INCLUDING CONSTRAINTS) PARTITION BY RANGE ({})").format(
+            sql.Identifier(nova), sql.Identifier(tabela), sql.Identifier(cfg["data"])))
+        # A chave primária de uma tabela particionada precisa conter a chave de partição
+        conn.execute(sql.SQL("ALTER TABLE {} ADD PRIMARY KEY ({}, {})").format(
+            sql.Identifier(nova), sql.Identifier(cfg["id"]), sql.Identifier(cfg["data"])))
+        # Chaves estrangeiras para outras tabelas (Usuario, CategoriaTransacao)
+        for definicao, in conn.execute(
+            "SELECT pg_get_constraintdef(oid) FROM pg_constraint WHERE conrelid = %s::regclass AND contype = 'f'", (tabela,)
+        ).fetchall():
+            conn.execute(sql.SQL("ALTER TABLE {} ADD {}").format(sql.Identifier(nova), sql.SQL(definicao)))
+        # Demais índices (migrações 0001/0002), com sufixo _nova até a troca
+        for nome, definicao in conn.execute(
+            """SELECT i.relname, pg_get_indexdef(i.oid)
+               FROM pg_index x JOIN pg_class i ON i.oid = x.indexrelid
+               WHERE x.indrelid = %s::regclass AND NOT x.indisprimary""", (tabela,)
+        ).fetchall():
+            definicao = definicao.replace(f"INDEX {nome} ON ", f"INDEX {nome}_nova ON ", 1)
+            definicao = definicao.replace(f" ON public.{tabela} ", f" ON public.{nova} ", 1)
+            conn.execute(definicao)
+
+        ano_inicial = conn.execute(sql.SQL("SELECT EXTRACT(YEAR FROM MIN({}))::int FROM {}").format(
+            sql.Identifier(cfg["data"]), sql.Identifier(tabela))).fetchone()[0]
+        ano_atual = date.today().year
+        criar_particoes(conn, nova, tabela, min(ano_inicial or ano_atual, ano_atual), ano_atual + PARTICOES_ANOS_FUTUROS)
+        # Datas fora das partições anuais (muito antigas ou muito à frente) não falham o INSERT
+        conn.execute(sql.SQL("CREATE TABLE {} PARTITION OF {} DEFAULT").format(
+            sql.Identifier(f"{tabela}_padrao"), sql.Identifier(nova)))
+
+        conn.execute(sql.SQL(
+            """CREATE TRIGGER {} AFTER INSERT OR UPDATE OR DELETE ON {}
+               FOR EACH ROW EXECUTE FUNCTION fn_Particionamento_Espelho({}, {})""").format(
+            sql.Identifier(TRIGGER_ESPELHO), sql.Identifier(tabela), sql.Literal(nova), sql.Literal(cfg["id"])))
+    print(f"{nova} criada; gravações em {tabela} já são espelhadas nela")
+
+def criar_particoes(conn, tabela_destino, prefixo, ano_inicio, ano_fim):
+    """Partições anuais <prefixo>_<ano> (com o nome final, que não muda na troca)"""
+    for ano in range(ano_inicio, ano_fim + 1):
+        conn.execute(sql.SQL("CREATE TABLE {} PARTITION OF {} FOR VALUES FROM ({}) TO ({})").format(
+            sql.Identifier(f"{prefixo}_{ano}"), sql.Identifier(tabela_destino),
+            sql.Literal(date(ano, 1, 1)), sql.Literal(date(ano + 1, 1, 1))))
+
+def copiar(conn, tabela, lote, pausa):
+    cfg = TABELAS[tabela]
+    nova = f"{tabela}_nova"
+    if not existe(conn, nova):
+        raise SystemExit(f"{nova} não existe: rode 'preparar' antes")
+    menor, maior = conn.execute(sql.SQL("SELECT MIN({id}), MAX({id}) FROM {t}").format(
+        id=sql.Identifier(cfg["id"]), t=sql.Identifier(tabela))).fetchone()
+    conn.commit()
+    if menor is None:
+        print(f"{tabela} vazia")
+        return
+
+    # Linhas gravadas depois do 'preparar' chegam pelo espelho; ON CONFLICT deixa a cópia repetível.
+    # O FOR SHARE faz um UPDATE concorrente esperar o lote terminar, e o espelho então substitui a cópia
+    comando = sql.SQL(
+        """INSERT INTO {nova}
+           SELECT * FROM (SELECT * FROM {t} WHERE {id} >= %s AND {id} < %s FOR SHARE) lote
+           ON CONFLICT DO NOTHING"""
+    ).format(nova=sql.Identifier(nova), t=sql.Identifier(tabela), id=sql.Identifier(cfg["id"]))
+    inicio = time.perf_counter()
+    copiadas = 0
+    for faixa in range(menor, maior + 1, lote):
+        with conn.transaction():
+            copiadas += conn.execute(comando, (faixa, faixa + lote)).rowcount
+        if pausa:
+            time.sleep(pausa)
+        feito = min(faixa + lote, maior + 1) - menor
+        print(f"\r{tabela}: ids até {faixa + lote - 1} ({feito / (maior + 1 - menor):.0%}), "
+              f"{copiadas} linha(s) copiada(s)", end="", flush=True)
+    print(f"\n{tabela}: cópia concluída em {time.perf_counter() - inicio:.1f}s")
+
+def trocar(conn, tabela, timeout_lock):
+    cfg = TABELAS[tabela]
+    nova, antiga = f"{tabela}_nova", f"{tabela}_antiga"
+    if not existe(conn, nova):
+        raise SystemExit(f"{nova} não existe: rode 'preparar' e 'copiar' antes")
+
+    with conn.transaction():
+        # Espera curta pelo lock: se a tabela estiver ocupada, falha em vez de enfileirar a API inteira atrás
+        conn.execute(sql.SQL("SET LOCAL lock_timeout = {}").format(sql.Literal(f"{timeout_lock}s")))
+        conn.execute(sql.SQL("LOCK TABLE {}, {} IN ACCESS EXCLUSIVE MODE").format(
+            sql.Identifier(tabela), sql.Identifier(nova)))
+
+        conferencia = sql.SQL("SELECT COUNT(*), COALESCE(SUM({}), 0) FROM {}")
+        original = conn.execute(conferencia.format(sql.Identifier(cfg["id"]), sql.Identifier(tabela))).fetchone()
+        copia = conn.execute(conferencia.format(sql.Identifier(cfg["id"]), sql.Identifier(nova))).fetchone()
+        if original != copia:
+            raise SystemExit(f"{tabela}: {original[0]} linha(s) na original e {copia[0]} na nova; rode 'copiar' de novo")
+
+        # Definições capturadas antes dos renomes: o texto aponta para "<tabela>", que passará a ser a nova
+        views = conn.execute(
+            """SELECT DISTINCT v.oid::regclass::text, pg_get_viewdef(v.oid)
+               FROM pg_depend d
+               JOIN pg_rewrite r ON r.oid = d.objid
+               JOIN pg_class v ON v.oid = r.ev_class
+               WHERE d.refobjid = %s::regclass AND v.oid <> d.refobjid""", (tabela,)
+        ).fetchall()
+        triggers = conn.execute(
+            """SELECT tgname, pg_get_triggerdef(oid) FROM pg_trigger
+               WHERE tgrelid = %s::regclass AND NOT tgisinternal AND tgname <> %s""", (tabela, TRIGGER_ESPELHO)
+        ).fetchall()
+        referencias = conn.execute(
+            "SELECT conname, conrelid::regclass::text FROM pg_constraint WHERE confrelid = %s::regclass AND contype = 'f'",
+            (tabela,)
+        ).fetchall()
+        if any(origem != "venda_produto" for _, origem in referencias):
+            raise SystemExit(f"Chaves estrangeiras para {tabela} sem tratamento: {referencias}")
+
+        # Chave estrangeira de Venda_Produto: substituída pelos triggers de integridade (migração 0004)
+        for nome, origem in referencias:
+            conn.execute(sql.SQL("ALTER TABLE {} DROP CONSTRAINT {}").format(sql.Identifier(origem), sql.Identifier(nome)))
+
+        # Nomes: original -> _antiga, nova -> nome original (tabela, índices, restrições)
+        conn.execute(sql.SQL("DROP TRIGGER {} ON {}").format(sql.Identifier(TRIGGER_ESPELHO), sql.Identifier(tabela)))
+        for nome, in conn.execute(
+            "SELECT conname FROM pg_constraint WHERE conrelid = %s::regclass AND contype IN ('p', 'f')", (tabela,)
+        ).fetchall():
+            conn.execute(sql.SQL("ALTER TABLE {} RENAME CONSTRAINT {} TO {}").format(
+                sql.Identifier(tabela), sql.Identifier(nome), sql.Identifier(nome.replace(tabela, antiga, 1))))
+        for nome, in conn.execute(
+            """SELECT i.relname FROM pg_index x JOIN pg_class i ON i.oid = x.indexrelid
+               WHERE x.indrelid = %s::regclass AND NOT x.indisprimary""", (tabela,)
+        ).fetchall():
+            conn.execute(sql.SQL("ALTER INDEX {} RENAME TO {}").format(sql.Identifier(nome), sql.Identifier(f"{nome}_antiga")))
+        conn.execute(sql.SQL("ALTER TABLE {} RENAME TO {}").format(sql.Identifier(tabela), sql.Identifier(antiga)))
+
+        conn.execute(sql.SQL("ALTER TABLE {} RENAME TO {}").format(sql.Identifier(nova), sql.Identifier(tabela)))
+        for nome, in conn.execute(
+            "SELECT conname FROM pg_constraint WHERE conrelid = %s::regclass AND contype IN ('p', 'f')", (tabela,)
+        ).fetchall():
+            conn.execute(sql.SQL("ALTER TABLE {} RENAME CONSTRAINT {} TO {}").format(
+                sql.Identifier(tabela), sql.Identifier(nome), sql.Identifier(nome.replace(nova, tabela, 1))))
+        for nome, in conn.execute(
+            """SELECT i.relname FROM pg_index x JOIN pg_class i ON i.oid = x.indexrelid
+               WHERE x.indrelid = %s::regclass AND NOT x.indisprimary AND i.relname LIKE '%%\\_nova'""", (tabela,)
+        ).fetchall():
+            conn.execute(sql.SQL("ALTER INDEX {} RENAME TO {}").format(sql.Identifier(nome), sql.Identifier(nome[:-len("_nova")])))
+
+        # A sequência do SERIAL pertencia à coluna da original: sem isso o DROP da antiga a levaria junto
+        sequencia = conn.execute("SELECT pg_get_serial_sequence(%s, %s)", (antiga, cfg["id"])).fetchone()[0]
+        if sequencia:
+            conn.execute(sql.SQL("ALTER SEQUENCE {} OWNED BY {}.{}").format(
+                sql.SQL(sequencia), sql.Identifier(tabela), sql.Identifier(cfg["id"])))
+
+        # Triggers (Saldo_Usuario, Fluxo_Caixa_Diario) saem da antiga e vão para a nova
+        for nome, definicao in triggers:
+            conn.execute(sql.SQL("DROP TRIGGER {} ON {}").format(sql.Identifier(nome), sql.Identifier(antiga)))
+            conn.execute(definicao)
+        for nome, definicao in views:
+            conn.execute(sql.SQL("CREATE OR REPLACE VIEW {} AS {}").format(sql.SQL(nome), sql.SQL(definicao)))
+
+        if referencias:
+            conn.execute(
+                """CREATE TRIGGER trg_Venda_Produto_Venda_Insert
+                       AFTER INSERT ON Venda_Produto REFERENCING NEW TABLE AS Novas
+                       FOR EACH STATEMENT EXECUTE FUNCTION fn_Venda_Produto_Venda_Existe();
+                   CREATE TRIGGER trg_Venda_Produto_Venda_Update
+                       AFTER UPDATE ON Venda_Produto REFERENCING NEW TABLE AS Novas
+                       FOR EACH STATEMENT EXECUTE FUNCTION fn_Venda_Produto_Venda_Existe();
+                   CREATE TRIGGER trg_Venda_Sem_Itens
+                       AFTER DELETE ON Venda REFERENCING OLD TABLE AS Antigas
+                       FOR EACH STATEMENT EXECUTE FUNCTION fn_Venda_Sem_Itens();"""
+            )
+    conn.execute(sql.SQL("ANALYZE {}").format(sql.Identifier(tabela)))
+    conn.commit()
+    print(f"{tabela} agora é particionada; a original ficou em {antiga} ('limpar' apaga)")
+
+def limpar(conn, tabela):
+    antiga = f"{tabela}_antiga"
+    if not existe(conn, antiga):
+        print(f"{antiga} não existe")
+        return
+    with conn.transaction():
+        conn.execute(sql.SQL("DROP TABLE {}").format(sql.Identifier(antiga)))
+    print(f"{antiga} apagada")
+
+def manter(conn):
+    criadas = conn.execute("SELECT fn_Criar_Particoes_Futuras(%s)", (PARTICOES_ANOS_FUTUROS,)).fetchone()[0]
+    conn.commit()
+    print(f"{criadas} partição(ões) criada(s)")
+
+def status(conn):
+    for tabela in TABELAS:
+        if not particionada(conn, tabela):
+            etapa = "preparada, aguardando cópia/troca" if existe(conn, f"{tabela}_nova") else "não particionada"
+            print(f"{tabela}: {etapa}")
+            continue
+        print(f"{tabela}: particionada{' (original em ' + tabela + '_antiga)' if existe(conn, tabela + '_antiga') else ''}")
+        for nome, faixa, linhas in conn.execute(
+            """SELECT c.relname, pg_get_expr(c.relpartbound, c.oid), c.reltuples::bigint
+               FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid
+               WHERE i.inhparent = %s::regclass ORDER BY c.relname""", (tabela,)
+        ).fetchall():
+            print(f"  {nome:<20} {faixa:<60} ~{max(linhas, 0)} linha(s)")
+    conn.commit()
+
+def main():
+    parser = argparse.ArgumentParser(description="Particionamento anual de Transacao e Venda")
+    sub = parser.add_subparsers(dest="comando", required=True)
+    for nome in ("preparar", "copiar", "trocar", "executar", "limpar"):
+        p = sub.add_parser(nome)
+        p.add_argument("tabela", choices=list(TABELAS))
+        if nome in ("copiar", "executar"):
+            p.add_argument("--lote", type=int, default=10000, help="ids por lote da cópia")
+            p.add_argument("--pausa", type=float, default=0.0, help="segundos entre lotes (alivia a carga)")
+        if nome in ("trocar", "executar"):
+            p.add_argument("--timeout-lock", type=float, default=5.0, help="espera máxima pelo lock da troca")
+    sub.add_parser("manter")
+    sub.add_parser("status")
+    args = parser.parse_args()
+
+    with psycopg.connect(DATABASE_URL) as conn:
+        if args.comando in ("preparar", "executar"):
+            preparar(conn, args.tabela)
+        if args.comando in ("copiar", "executar"):
+            copiar(conn, args.tabela, args.lote, args.pausa)
+        if args.comando in ("trocar", "executar"):
+            trocar(conn, args.tabela, args.timeout_lock)
+        if args.comando == "limpar":
+            limpar(conn, args.tabela)
+        if args.comando == "manter":
+            manter(conn)
+        if args.comando == "status":
+            status(conn)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,160 @@
+# Manutenção das tabelas de resumo mantidas por triggers: Saldo_Usuario (ver SaldoUsuario.sql),
+# Fluxo_Caixa_Diario (migração 0003_fluxo_caixa_diario.sql) e Produto_Vendas / Produto_Vendas_Diario
+# (migração 0005_produtos_mais_vendidos.sql)
+#
+# Uso (a partir de FinanCerto_SQL/):
+#     python resumo_saldo.py instalar      # cria tabela e triggers do saldo e faz a carga inicial
+#     python resumo_saldo.py verificar     # compara os resumos com o recálculo a partir das transações e vendas
+#     python resumo_saldo.py reconstruir   # recalcula os resumos a partir das transações e vendas
+
+import argparse
+import os
+import sys
+import psycopg
+from config import DATABASE_URL
+
+SCRIPT_SQL = os.path.join(os.path.dirname(os.path.abspath(__file__)), "SaldoUsuario.sql")
+
+CONSULTA_DIVERGENCIAS = """
+    SELECT r.id_usuario,
+           r.total_entradas, COALESCE(s.total_entradas, 0),
+           r.total_saidas, COALESCE(s.total_saidas, 0)
+    FROM resumo_financeiro r
+    LEFT JOIN saldo_usuario s ON s.id_usuario = r.id_usuario
+    WHERE r.total_entradas <> COALESCE(s.total_entradas, 0)
+       OR r.total_saidas <> COALESCE(s.total_saidas, 0)
+    ORDER BY r.id_usuario
+"""
+
+# Fluxo diário recalculado das transações, comparado com a tabela (linhas zeradas contam como ausentes)
+CONSULTA_DIVERGENCIAS_FLUXO = """
+    WITH calculado AS (
+        SELECT t.id_usuario, t.data_transacao AS dia, c.tipo_categoria,
+               SUM(t.valor) AS total, COUNT(*) AS quantidade
+        FROM transacao t
+        JOIN categoriatransacao c ON c.id_categoria = t.id_categoria
+        WHERE t.id_usuario IS NOT NULL AND c.tipo_categoria IS NOT NULL
+        GROUP BY t.id_usuario, t.data_transacao, c.tipo_categoria
+    ),
+    resumo AS (
+        SELECT id_usuario, dia, tipo_categoria, total, quantidade
+        FROM fluxo_caixa_diario WHERE quantidade <> 0 OR total <> 0
+    )
+    SELECT COALESCE(c.id_usuario, r.id_usuario), COALESCE(c.dia, r.dia),
+           COALESCE(c.tipo_categoria, r.tipo_categoria),
+           COALESCE(c.total, 0), COALESCE(r.total, 0)
+    FROM calculado c
+    FULL JOIN resumo r USING (id_usuario, dia, tipo_categoria)
+    WHERE c.total IS DISTINCT FROM r.total OR c.quantidade IS DISTINCT FROM r.quantidade
+    ORDER BY 1, 2, 3
+"""
+
+# Quantidades vendidas recalculadas dos itens, comparadas com os contadores (zerados contam como ausentes)
+CONSULTA_DIVERGENCIAS_PRODUTOS = """
+    WITH calculado AS (
+        SELECT p.id_usuario, v.data_venda AS dia, vp.id_produto, SUM(vp.quantidade) AS quantidade
+        FROM venda_produto vp
+        JOIN produto p ON p.id_produto = vp.id_produto
+        JOIN venda v ON v.id_venda = vp.id_venda
+        WHERE p.id_usuario IS NOT NULL
+        GROUP BY p.id_usuario, v.data_venda, vp.id_produto
+    ),
+    diario AS (
+        SELECT id_usuario, dia, id_produto, quantidade FROM produto_vendas_diario WHERE quantidade <> 0
+    ),
+    total AS (
+        SELECT id_usuario, id_produto, SUM(quantidade) AS quantidade FROM calculado GROUP BY id_usuario, id_produto
+    )
+    SELECT COALESCE(c.id_usuario, d.id_usuario), COALESCE(c.id_produto, d.id_produto), COALESCE(c.dia, d.dia),
+           COALESCE(c.quantidade, 0), COALESCE(d.quantidade, 0)
+    FROM calculado c
+    FULL JOIN diario d USING (id_usuario, dia, id_produto)
+    WHERE c.quantidade IS DISTINCT FROM d.quantidade
+    UNION ALL
+    SELECT COALESCE(t.id_usuario, pv.id_usuario), COALESCE(t.id_produto, pv.id_produto), NULL,
+           COALESCE(t.quantidade, 0), COALESCE(pv.quantidade, 0)
+    FROM total t
+    FULL JOIN (SELECT * FROM produto_vendas WHERE quantidade <> 0) pv USING (id_produto)
+    WHERE t.quantidade IS DISTINCT FROM pv.quantidade OR t.id_usuario IS DISTINCT FROM pv.id_usuario
+    ORDER BY 1, 2, 3
+"""
+
+def instalar(conn):
+    with open(SCRIPT_SQL, encoding="utf-8") as f:
+        conn.execute(f.read())
+    conn.commit()
+    print("Saldo_Usuario instalado")
+    return 0
+
+def verificar(conn):
+    divergencias = conn.execute(CONSULTA_DIVERGENCIAS).fetchall()
+    for id_usuario, ent_view, ent_resumo, sai_view, sai_resumo in divergencias:
+        print(f"usuário {id_usuario}: entradas view={ent_view} resumo={ent_resumo} | "
+              f"saídas view={sai_view} resumo={sai_resumo}")
+    print(f"{len(divergencias)} usuário(s) divergente(s)")
+
+    divergencias_fluxo = conn.execute(CONSULTA_DIVERGENCIAS_FLUXO).fetchall()
+    for id_usuario, dia, tipo, total_calculado, total_resumo in divergencias_fluxo:
+        print(f"usuário {id_usuario} em {dia} ({tipo}): calculado={total_calculado} resumo={total_resumo}")
+    print(f"{len(divergencias_fluxo)} dia(s) divergente(s) no fluxo de caixa")
+
+    divergencias_produtos = conn.execute(CONSULTA_DIVERGENCIAS_PRODUTOS).fetchall()
+    for id_usuario, id_produto, dia, calculado, contador in divergencias_produtos:
+        print(f"usuário {id_usuario}, produto {id_produto} {'em ' + str(dia) if dia else '(total)'}: "
+              f"calculado={calculado} contador={contador}")
+    print(f"{len(divergencias_produtos)} contador(es) de produtos vendidos divergente(s)")
+    return 1 if divergencias or divergencias_fluxo or divergencias_produtos else 0
+
+def reconstruir(conn):
+    with conn.transaction():
+        # Bloqueia escritas em transações/categorias enquanto o resumo é recalculado
+        conn.execute("LOCK TABLE transacao, categoriatransacao IN SHARE MODE")
+        conn.execute("DELETE FROM saldo_usuario")
+        conn.execute(
+            """INSERT INTO saldo_usuario (id_usuario, total_entradas, total_saidas)
+               SELECT id_usuario, total_entradas, total_saidas FROM resumo_financeiro"""
+        )
+        conn.execute("DELETE FROM fluxo_caixa_diario")
+        conn.execute(
+            """INSERT INTO fluxo_caixa_diario (id_usuario, dia, tipo_categoria, total, quantidade)
+               SELECT t.id_usuario, t.data_transacao, c.tipo_categoria, SUM(t.valor), COUNT(*)
+               FROM transacao t
+               JOIN categoriatransacao c ON c.id_categoria = t.id_categoria
+               WHERE t.id_usuario IS NOT NULL AND c.tipo_categoria IS NOT NULL
+               GROUP BY t.id_usuario, t.data_transacao, c.tipo_categoria"""
+        )
+    with conn.transaction():
+        conn.execute("LOCK TABLE venda, venda_produto, produto IN SHARE MODE")
+        conn.execute("DELETE FROM produto_vendas")
+        conn.execute(
+            """INSERT INTO produto_vendas (id_produto, id_usuario, quantidade)
+               SELECT p.id_produto, p.id_usuario, SUM(vp.quantidade)
+               FROM venda_produto vp
+               JOIN produto p ON p.id_produto = vp.id_produto
+               WHERE p.id_usuario IS NOT NULL
+               GROUP BY p.id_produto, p.id_usuario"""
+        )
+        conn.execute("DELETE FROM produto_vendas_diario")
+        conn.execute(
+            """INSERT INTO produto_vendas_diario (id_usuario, dia, id_produto, quantidade)
+               SELECT p.id_usuario, v.data_venda, vp.id_produto, SUM(vp.quantidade)
+               FROM venda_produto vp
+               JOIN produto p ON p.id_produto = vp.id_produto
+               JOIN venda v ON v.id_venda = vp.id_venda
+               WHERE p.id_usuario IS NOT NULL
+               GROUP BY p.id_usuario, v.data_venda, vp.id_produto"""
+        )
+    print("Saldo_Usuario, Fluxo_Caixa_Diario e contadores de produtos vendidos reconstruídos")
+    return verificar(conn)
+
+def main():
+    parser = argparse.ArgumentParser(description="Manutenção dos resumos incrementais (saldo, fluxo de caixa e produtos vendidos)")
+    parser.add_argument("comando", choices=["instalar", "verificar", "reconstruir"])
+    args = parser.parse_args()
+
+    comandos = {"instalar": instalar, "verificar": verificar, "reconstruir": reconstruir}
+    with psycopg.connect(DATABASE_URL) as conn:
+        return comandos[args.comando](conn)
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,37 @@
+# Caminho rápido de serialização das listagens
+# Por padrão o FastAPI monta um modelo Pydantic por linha, valida de novo contra o response_model
+# e codifica Decimal/date pelo encoder genérico; com milhares de linhas isso custa mais que a consulta.
+# Com RESPOSTAS_LISTA_RAPIDAS as linhas viram JSON direto (orjson, se instalado), no mesmo formato:
+# mesma ordem de campos do modelo, datas ISO e Decimal como string, sem perder precisão.
+
+import json
+from datetime import date
+from decimal import Decimal
+from fastapi import Response
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+def _padrao(valor):
+    if isinstance(valor, Decimal):
+        return str(valor)
+    if isinstance(valor, date):
+        # Só usado sem orjson, que já serializa datas em ISO
+        return valor.isoformat()
+    raise TypeError(f"Tipo não serializável: {type(valor).__name__}")
+
+def para_json(registros):
+    if orjson is not None:
+        return orjson.dumps(registros, default=_padrao)
+    return json.dumps(registros, default=_padrao, ensure_ascii=False, separators=(",", ":"),
+                      allow_nan=False).encode("utf-8")
+
+def resposta_lista(modelo, colunas, rows, origem=None):
+    """Resposta JSON das linhas `rows` (colunas na ordem de `colunas`) no formato do `modelo`.
+    Cabeçalhos já definidos em `origem` (ex.: cursor da próxima página) são mantidos."""
+    posicoes = [(nome, colunas.index(nome)) for nome in modelo.model_fields]
+    corpo = para_json([{nome: row[i] for nome, i in posicoes} for row in rows])
+    cabecalhos = {k: v for k, v in origem.headers.items() if k != "content-length"} if origem else None
+    return Response(corpo, media_type="application/json", headers=cabecalhos)
@@ -0,0 +1,71 @@
+# Entrada de produção da API: vários processos uvicorn atrás da mesma porta
+# O `python main.py` continua sendo o modo de desenvolvimento (um processo só).
+#
+# Antes de subir os workers consulta o Postgres e divide as conexões disponíveis entre eles:
+#   disponíveis = max_connections - superuser_reserved_connections - já em uso - DB_CONEXOES_RESERVADAS
+#   por worker  = min(DB_POOL_MAX, disponíveis // workers)
+# O tamanho chega aos workers pelas variáveis de ambiente lidas no config.py.
+#
+# Cada worker só começa a aceitar conexões depois do startup do lifespan (main.py), que abre o pool
+# e aquece as conexões. No SIGTERM/SIGINT o uvicorn para de aceitar, espera as requisições em
+# andamento (até API_TIMEOUT_ENCERRAMENTO segundos) e roda o shutdown: fila de gravação agrupada
+# esvaziada e pool fechado.
+#
+# Uso (a partir de FinanCerto_SQL/):
+#     python servidor.py --workers 4
+
+import argparse
+import os
+
+import psycopg
+import uvicorn
+
+from config import (DATABASE_URL, DB_POOL_MIN, DB_POOL_MAX, DB_CONEXOES_RESERVADAS,
+                    API_HOST, API_PORTA, API_WORKERS, API_TIMEOUT_ENCERRAMENTO)
+
+def conexoes_disponiveis():
+    """Conexões que a API pode abrir no Postgres sem esgotar o max_connections"""
+    with psycopg.connect(DATABASE_URL) as conn:
+        maximo = int(conn.execute("SHOW max_connections").fetchone()[0])
+        superusuario = int(conn.execute("SHOW superuser_reserved_connections").fetchone()[0])
+        # Outros clientes já conectados (outra instância da API, relatórios, psql), sem contar esta
+        em_uso = conn.execute(
+            "SELECT count(*) FROM pg_stat_activity WHERE backend_type = 'client backend' AND pid <> pg_backend_pid()"
+        ).fetchone()[0]
+    return maximo - superusuario - em_uso - DB_CONEXOES_RESERVADAS
+
+def tamanho_pool(workers, disponiveis):
+    """(min, max) do pool de cada worker"""
+    por_worker = disponiveis // workers
+    if por_worker < 1:
+        raise SystemExit(f"Postgres sem conexões para {workers} workers ({disponiveis} disponíveis): "
+                         f"reduza --workers ou aumente max_connections")
+    maximo = min(DB_POOL_MAX, por_worker)
+    return min(DB_POOL_MIN, maximo), maximo
+
+def main():
+    parser = argparse.ArgumentParser(description="Servidor de produção da API FinanCerto")
+    parser.add_argument("--workers", type=int, default=API_WORKERS, help="processos (0 = um por núcleo)")
+    parser.add_argument("--host", default=API_HOST)
+    parser.add_argument("--porta", type=int, default=API_PORTA)
+    args = parser.parse_args()
+
+    workers = args.workers or os.cpu_count() or 1
+    pool_min, pool_max = tamanho_pool(workers, conexoes_disponiveis())
+    os.environ["FINANCERTO_DB_POOL_MIN"] = str(pool_min)
+    os.environ["FINANCERTO_DB_POOL_MAX"] = str(pool_max)
+    print(f"{workers} worker(s), pool de {pool_min}-{pool_max} conexões por worker "
+          f"(até {workers * pool_max} no total)", flush=True)
+
+    uvicorn.run(
+        "main:app",
+        app_dir=os.path.dirname(os.path.abspath(__file__)),
+        host=args.host,
+        port=args.porta,
+        workers=workers,
+        timeout_graceful_shutdown=API_TIMEOUT_ENCERRAMENTO,
+        access_log=False
+    )
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,199 @@
+# Verificação dos planos de execução das consultas da API
+#
+# Roda EXPLAIN em cada consulta por usuário dos endpoints e falha (exit 1) se alguma
+# delas usar Seq Scan em uma tabela grande, indicando índice ausente ou regressão.
+# Com Transacao/Venda particionadas, as partições contam como a tabela e as consultas
+# filtradas por data também precisam ler só as partições do intervalo.
+# Por padrão povoa uma massa sintética grande dentro de uma transação que é desfeita
+# no final, então pode ser executado contra qualquer banco com as migrações aplicadas.
+#
+# Uso (a partir de FinanCerto_SQL/):
+#     python verificar_planos.py                   # povoa massa temporária e verifica
+#     python verificar_planos.py --usuarios 5000   # massa temporária maior
+#     python verificar_planos.py --sem-povoar      # usa os dados já existentes no banco
+
+import argparse
+import json
+import sys
+import psycopg
+from config import DATABASE_URL
+
+# Tabelas que crescem com o uso: nelas Seq Scan em consulta por usuário é regressão
+TABELAS_GRANDES = {"transacao", "venda", "venda_produto", "produto", "categoriatransacao", "fluxo_caixa_diario",
+                   "produto_vendas", "produto_vendas_diario"}
+
+# (endpoint, consulta) com os mesmos formatos usados nos Crud_*.py; %(u)s é um id de usuário
+CONSULTAS = [
+    ("GET /transacoes/usuario/{id}",
+     """SELECT id_transacao, data_transacao, descricao, valor, id_usuario, id_categoria
+        FROM transacao WHERE id_usuario = %(u)s ORDER BY data_transacao DESC, id_transacao DESC OFFSET 0 LIMIT 100"""),
+    ("GET /transacoes/usuario/{id}?cursor",
+     """SELECT id_transacao, data_transacao, descricao, valor, id_usuario, id_categoria
+        FROM transacao WHERE id_usuario = %(u)s AND data_transacao <= '2100-01-01'::date AND (data_transacao, id_transacao) < ('2100-01-01'::date, 0)
+        ORDER BY data_transacao DESC, id_transacao DESC LIMIT 100"""),
+    ("GET /vendas/usuario/{id}",
+     """SELECT id_venda, data_venda, valor_total_venda, metodo_pagamento, id_usuario
+        FROM venda WHERE id_usuario = %(u)s ORDER BY data_venda DESC, id_venda DESC OFFSET 0 LIMIT 100"""),
+    ("GET /vendas/usuario/{id}?cursor",
+     """SELECT id_venda, data_venda, valor_total_venda, metodo_pagamento, id_usuario
+        FROM venda WHERE id_usuario = %(u)s AND data_venda <= '2100-01-01'::date AND (data_venda, id_venda) < ('2100-01-01'::date, 0)
+        ORDER BY data_venda DESC, id_venda DESC LIMIT 100"""),
+    ("GET /transacoes/usuario/{id}?de&ate",
+     """SELECT id_transacao, data_transacao, descricao, valor, id_usuario, id_categoria
+        FROM transacao WHERE id_usuario = %(u)s AND data_transacao >= '2023-01-01' AND data_transacao <= '2023-12-31'
+        ORDER BY data_transacao DESC, id_transacao DESC OFFSET 0 LIMIT 100"""),
+    ("GET /vendas/usuario/{id}?de&ate",
+     """SELECT id_venda, data_venda, valor_total_venda, metodo_pagamento, id_usuario
+        FROM venda WHERE id_usuario = %(u)s AND data_venda >= '2023-01-01' AND data_venda <= '2023-12-31'
+        ORDER BY data_venda DESC, id_venda DESC OFFSET 0 LIMIT 100"""),
+    ("GET /produtos/usuario/{id}",
+     """SELECT id_produto, nome_produto, preco_custo, preco_venda, id_usuario
+        FROM produto WHERE id_usuario = %(u)s ORDER BY id_produto OFFSET 0 LIMIT 100"""),
+    ("GET /categorias/usuario/{id}",
+     """SELECT id_categoria, nome_categoria, tipo_categoria, id_usuario
+        FROM categoriatransacao WHERE id_usuario = %(u)s"""),
+    ("GET /relatorios/vendas/{id}",
+     """SELECT COUNT(*), COALESCE(SUM(valor_total_venda), 0) FROM venda WHERE id_usuario = %(u)s"""),
+    ("GET /relatorios/lucro/{id}",
+     """SELECT SUM(lucro_total) FROM lucro_produtos WHERE id_usuario = %(u)s"""),
+    ("GET /relatorios/produtos-mais-vendidos/{id}",
+     """SELECT pv.id_produto, p.nome_produto, pv.quantidade
+        FROM produto_vendas pv JOIN produto p ON p.id_produto = pv.id_produto
+        WHERE pv.id_usuario = %(u)s AND pv.quantidade > 0
+        ORDER BY pv.quantidade DESC, pv.id_produto LIMIT 10"""),
+    ("GET /relatorios/produtos-mais-vendidos/{id}?dias",
+     """SELECT d.id_produto, p.nome_produto, d.quantidade
+        FROM (SELECT id_produto, SUM(quantidade) AS quantidade FROM produto_vendas_diario
+              WHERE id_usuario = %(u)s AND dia > current_date - 30 AND dia <= current_date
+              GROUP BY id_produto) d
+        JOIN produto p ON p.id_produto = d.id_produto
+        WHERE d.quantidade > 0
+        ORDER BY d.quantidade DESC, d.id_produto LIMIT 10"""),
+    ("POST /relatorios/lote (vendas)",
+     """SELECT id_usuario, COUNT(*), COALESCE(SUM(valor_total_venda), 0) FROM venda
+        WHERE id_usuario = ANY(ARRAY[%(u)s, %(u)s - 1, %(u)s - 2]) GROUP BY id_usuario"""),
+    ("POST /relatorios/lote (lucro)",
+     """SELECT id_usuario, SUM(lucro_total) FROM lucro_produtos
+        WHERE id_usuario = ANY(ARRAY[%(u)s, %(u)s - 1, %(u)s - 2]) GROUP BY id_usuario"""),
+    ("GET /relatorios/fluxo-caixa/{id}",
+     """SELECT date_trunc('month', dia)::date, SUM(total) FILTER (WHERE tipo_categoria = 'Entrada'),
+               SUM(total) FILTER (WHERE tipo_categoria = 'Saida')
+        FROM fluxo_caixa_diario WHERE id_usuario = %(u)s AND dia BETWEEN '2021-01-01' AND '2021-12-31'
+        GROUP BY 1"""),
+]
+
+# Consultas com filtro de data que, com Transacao/Venda particionadas (particionar.py), devem ler
+# no máximo este número de partições (o intervalo cabe em um ano)
+PODA_PARTICOES = {
+    "GET /transacoes/usuario/{id}?de&ate": 1,
+    "GET /vendas/usuario/{id}?de&ate": 1,
+}
+
+def povoar(conn, usuarios):
+    """Massa sintética: por usuário 4 categorias, 100 transações, 10 produtos, 20 vendas de 3 itens"""
+    conn.execute(
+        """INSERT INTO usuario (nome_usuario, email, senha)
+           SELECT 'Plano ' || g, 'plano' || g || '@verificacao.local', 'x' FROM generate_series(1, %s) g""",
+        (usuarios,)
+    )
+    conn.execute("CREATE TEMP TABLE plano_usuarios ON COMMIT DROP AS SELECT id_usuario FROM usuario WHERE email LIKE '%@verificacao.local'")
+    conn.execute(
+        """INSERT INTO categoriatransacao (nome_categoria, tipo_categoria, id_usuario)
+           SELECT 'Categoria ' || g, CASE WHEN g % 2 = 0 THEN 'Entrada' ELSE 'Saida' END, u.id_usuario
+           FROM plano_usuarios u, generate_series(1, 4) g"""
+    )
+    conn.execute(
+        """INSERT INTO transacao (data_transacao, descricao, valor, id_usuario, id_categoria)
+           SELECT DATE '2020-01-01' + (g * 7 + c.id_categoria) % 1500, 'Transação ' || g, (g % 500) + 0.5,
+                  c.id_usuario, c.id_categoria
+           FROM categoriatransacao c
+           JOIN plano_usuarios u ON u.id_usuario = c.id_usuario, generate_series(1, 25) g"""
+    )
+    conn.execute(
+        """INSERT INTO produto (nome_produto, preco_custo, preco_venda, id_usuario)
+           SELECT 'Produto ' || g, g, g * 2, u.id_usuario FROM plano_usuarios u, generate_series(1, 10) g"""
+    )
+    conn.execute(
+        """INSERT INTO venda (data_venda, valor_total_venda, metodo_pagamento, id_usuario)
+           SELECT DATE '2020-01-01' + (g * 13 + u.id_usuario) % 1500, 0, 'Pix', u.id_usuario
+           FROM plano_usuarios u, generate_series(1, 20) g"""
+    )
+    conn.execute(
+        """INSERT INTO venda_produto (id_venda, id_produto, quantidade, preco_unitario_venda)
+           SELECT v.id_venda, p.id_produto, 1 + v.id_venda % 5, p.preco_venda
+           FROM venda v
+           JOIN plano_usuarios u ON u.id_usuario = v.id_usuario
+           CROSS JOIN LATERAL (
+               SELECT id_produto, preco_venda FROM produto
+               WHERE id_usuario = v.id_usuario ORDER BY (id_produto + v.id_venda) % 10 LIMIT 3
+           ) p"""
+    )
+    for tabela in ["usuario"] + sorted(TABELAS_GRANDES):
+        conn.execute(f"ANALYZE {tabela}")
+    return conn.execute("SELECT max(id_usuario) FROM plano_usuarios").fetchone()[0]
+
+def particoes(conn):
+    """{partição: tabela particionada} para as tabelas já convertidas pelo particionar.py.
+    Partições de até uma página (anos futuros, ainda vazios) ficam de fora: nelas o Seq Scan é o plano certo"""
+    return dict(conn.execute(
+        """SELECT i.inhrelid::regclass::text, i.inhparent::regclass::text
+           FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid
+           WHERE c.relpages > 1"""
+    ).fetchall())
+
+def relacoes_lidas(plano, pais):
+    """Percorre o plano JSON e retorna [(tipo do nó, relação)]; partições viram (nó, tabela, partição)"""
+    encontradas = []
+    pendentes = [plano]
+    while pendentes:
+        no = pendentes.pop()
+        if "Relation Name" in no:
+            nome = no["Relation Name"]
+            encontradas.append((no["Node Type"], pais.get(nome, nome), nome))
+        pendentes.extend(no.get("Plans", []))
+    return encontradas
+
+def varreduras_sequenciais(lidas):
+    """Tabelas grandes (ou partições delas) lidas com Seq Scan"""
+    return [nome for tipo, tabela, nome in lidas if tipo == "Seq Scan" and tabela in TABELAS_GRANDES]
+
+def verificar(conn, id_usuario):
+    falhas = 0
+    pais = particoes(conn)
+    for endpoint, sql in CONSULTAS:
+        resultado = conn.execute("EXPLAIN (FORMAT JSON) " + sql, {"u": id_usuario}).fetchone()[0]
+        plano = resultado[0]["Plan"] if isinstance(resultado, list) else json.loads(resultado)[0]["Plan"]
+        lidas = relacoes_lidas(plano, pais)
+        seq = varreduras_sequenciais(lidas)
+        lidas_particoes = sorted({nome for _, tabela, nome in lidas if nome != tabela})
+        if seq:
+            falhas += 1
+            print(f"FALHA {endpoint}: Seq Scan em {', '.join(sorted(set(seq)))}")
+        elif lidas_particoes and len(lidas_particoes) > PODA_PARTICOES.get(endpoint, len(lidas_particoes)):
+            falhas += 1
+            print(f"FALHA {endpoint}: sem poda de partições ({', '.join(lidas_particoes)})")
+        else:
+            print(f"ok    {endpoint}")
+    print(f"{falhas} consulta(s) com Seq Scan em tabela grande ou sem poda de partições")
+    return 1 if falhas else 0
+
+def main():
+    parser = argparse.ArgumentParser(description="Falha se consultas da API regredirem para Seq Scan")
+    parser.add_argument("--usuarios", type=int, default=2000, help="usuários da massa temporária")
+    parser.add_argument("--sem-povoar", action="store_true", help="usar os dados existentes no banco")
+    parser.add_argument("--usuario", type=int, default=None, help="id de usuário usado nas consultas")
+    args = parser.parse_args()
+
+    with psycopg.connect(DATABASE_URL) as conn:
+        try:
+            if args.sem_povoar:
+                id_usuario = args.usuario or conn.execute("SELECT min(id_usuario) FROM usuario").fetchone()[0]
+            else:
+                id_usuario = args.usuario or povoar(conn, args.usuarios)
+            return verificar(conn, id_usuario)
+        finally:
+            # A massa temporária nunca é gravada
+            conn.rollback()
+
+if __name__ == "__main__":
+    sys.exit(main())